@@ -1,15 +1,21 @@
+import asyncio
 from abc import ABC, abstractmethod
 from datetime import datetime
 from typing import Optional
 
+from backend.core.llm_client import run_sync
+from backend.core.request_trace import capture
 from backend.services.history_service import log_interaction
 
+# Logged in place of a file path when the image arrived as in-memory bytes
+UPLOADED_IMAGE_REF = "upload://memory"
+
 
 class AgriAgentBase(ABC):
     name: str = "AgriAgentBase"
 
     @abstractmethod
-    def handle_query(
+    async def ahandle_query(
         self,
         query: Optional[str] = None,
         image_path: Optional[str] = None,
@@ -20,6 +26,10 @@ class AgriAgentBase(ABC):
     ) -> str:
         pass
 
+    def handle_query(self, *args, **kwargs) -> str:
+        """Blocking wrapper around ahandle_query for scripts and sync callers."""
+        return run_sync(self.ahandle_query(*args, **kwargs))
+
 
     @staticmethod
     def _normalize_query(q: Optional[str]) -> str:
@@ -61,6 +71,10 @@ class AgriAgentBase(ABC):
         if meta:
             entry["meta"] = meta
 
+        # Inside a routed request the output goes into its single trace record
+        if capture(self.name, {"image_path": image_path, "meta": meta}):
+            return
+
         try:
             log_interaction(entry)
         except Exception:
@@ -86,3 +100,19 @@ class AgriAgentBase(ABC):
         )
 
         return safe_response
+
+    async def arespond_and_record(
+        self,
+        query,
+        response,
+        image_path=None,
+        meta: Optional[dict] = None,
+    ):
+        """Async respond_and_record - runs off the event loop, since the block queue policy may wait."""
+        return await asyncio.to_thread(
+            self.respond_and_record,
+            query,
+            response,
+            image_path,
+            meta,
+        )
@@ -1,9 +1,42 @@
-from typing import Any, Dict, List
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 
-from backend.services.text_service import query_groq_text
+from backend.services.text_service import aquery_groq_text, astream_groq_text
 from backend.agents.agri_agent_base import AgriAgentBase
+from backend.core.config import settings
+from backend.core.deadline import DeadlineExceeded, record_cut
+from backend.core.llm_client import FORMATTER
 from backend.core.langchain_prompts import FORMATTER_PROMPT
 
+# Values for settings.FORMATTER_FAST_PATH / the "format_path" reported per response
+FORMAT_PATH_LLM = "llm"
+FORMAT_PATH_PASSTHROUGH = "passthrough"
+FORMAT_PATH_NORMALIZE = "normalize"
+
+_BULLET_RE = re.compile(r"^(\s*)[•●▪*]\s+", re.MULTILINE)
+_HEADING_RE = re.compile(r"([^\n])\n(#{1,6} )")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def normalize_markdown(text: str) -> str:
+    """
+    Cheap local markdown clean-up used instead of the LLM formatting pass:
+    unify bullets, trim trailing spaces, keep headings on their own paragraph.
+    """
+    text = str(text or "").replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(line.rstrip() for line in text.split("\n"))
+    text = _BULLET_RE.sub(r"\1- ", text)
+    text = _HEADING_RE.sub(r"\1\n\n\2", text)
+    text = _BLANK_LINES_RE.sub("\n\n", text)
+    return text.strip()
+
+
+def _fast_path_mode() -> str:
+    mode = str(settings.FORMATTER_FAST_PATH or "").strip().lower()
+    if mode in (FORMAT_PATH_PASSTHROUGH, FORMAT_PATH_NORMALIZE):
+        return mode
+    return FORMAT_PATH_LLM
+
 
 class FormatterAgent(AgriAgentBase):
     """
@@ -14,11 +47,16 @@ class FormatterAgent(AgriAgentBase):
     - Role-aware ordering
     - Zero hallucination surface
     - LLM used strictly for formatting
+    - Single-agent results skip the LLM when FORMATTER_FAST_PATH is enabled
+    - kwargs["skip_llm"] (request deadline nearly spent) merges the results locally
+
+    The path taken is written to kwargs["trace"]["format_path"] when a trace dict is passed;
+    a formatting pass cut by the deadline is added to kwargs["trace"]["cut_stages"].
     """
 
     name = "FormatterAgent"
 
-    def handle_query(
+    async def ahandle_query(
         self,
         payload: Any = None,
         image_path: str = None,
@@ -31,28 +69,34 @@ class FormatterAgent(AgriAgentBase):
         if isinstance(payload, str):
             clean_text = payload.strip()
             if not clean_text:
-                return self.respond_and_record(
+                return await self.arespond_and_record(
                     "", "No content available to format.", image_path
                 )
 
-            return self._format_text(
+            if isinstance(kwargs.get("trace"), dict):
+                kwargs["trace"]["format_path"] = FORMAT_PATH_LLM
+
+            return await self._format_text(
                 user_query="",
                 ordered_blocks=[clean_text],
+                contents=[clean_text],
                 image_path=image_path,
                 meta=None,
                 request_id=request_id,
                 session_id=session_id,
+                on_token=kwargs.get("on_token"),
+                trace=kwargs.get("trace"),
             )
 
         if not isinstance(payload, dict):
-            return self.respond_and_record("", str(payload), image_path)
+            return await self.arespond_and_record("", str(payload), image_path)
 
         user_query: str = str(payload.get("user_query", "")).strip()
         agent_results: List[Dict[str, str]] = payload.get("agent_results", [])
         routing_mode: str = str(payload.get("routing_mode", "unknown"))
 
         if not agent_results:
-            return self.respond_and_record(
+            return await self.arespond_and_record(
                 user_query, "No agent responses were generated.", image_path
             )
 
@@ -70,6 +114,7 @@ class FormatterAgent(AgriAgentBase):
         )
 
         ordered_blocks: List[str] = []
+        contents: List[str] = []
         role_log: List[Dict[str, str]] = []
 
         for item in agent_results_sorted:
@@ -82,13 +127,14 @@ class FormatterAgent(AgriAgentBase):
                 ordered_blocks.append(
                     f"[{role.upper()} | {agent}]\n{content}"
                 )
+                contents.append(content)
                 role_log.append({
                     "agent": agent,
                     "role": role,
                 })
 
         if not ordered_blocks:
-            return self.respond_and_record(
+            return await self.arespond_and_record(
                 user_query, "Agent responses were empty.", image_path
             )
 
@@ -98,24 +144,88 @@ class FormatterAgent(AgriAgentBase):
             "agent_count": len(role_log),
         }
 
-        return self._format_text(
+        mode = _fast_path_mode()
+        if len(contents) == 1 and mode != FORMAT_PATH_LLM:
+            return await self._fast_path(
+                user_query=user_query,
+                content=contents[0],
+                mode=mode,
+                image_path=image_path,
+                meta=meta,
+                trace=kwargs.get("trace"),
+                on_token=kwargs.get("on_token"),
+            )
+
+        # Only a formatter LLM call that was actually due counts as cut by the deadline
+        if kwargs.get("skip_llm"):
+            record_cut(kwargs.get("trace"), "formatter")
+            return await self._fast_path(
+                user_query=user_query,
+                content="\n\n".join(contents),
+                mode=FORMAT_PATH_NORMALIZE,
+                image_path=image_path,
+                meta=meta,
+                trace=kwargs.get("trace"),
+                on_token=kwargs.get("on_token"),
+            )
+
+        if isinstance(kwargs.get("trace"), dict):
+            kwargs["trace"]["format_path"] = FORMAT_PATH_LLM
+
+        return await self._format_text(
             user_query=user_query,
             ordered_blocks=ordered_blocks,
+            contents=contents,
             image_path=image_path,
             meta=meta,
             request_id=request_id,
             session_id=session_id,
+            on_token=kwargs.get("on_token"),
+            trace=kwargs.get("trace"),
         )
 
-    def _format_text(
+    async def _fast_path(
+        self,
+        user_query: str,
+        content: str,
+        mode: str,
+        image_path: str = None,
+        meta: Dict[str, Any] = None,
+        trace: Optional[Dict[str, Any]] = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+    ) -> str:
+        """Return a single agent's output without the LLM formatting round trip."""
+        formatted = normalize_markdown(content) if mode == FORMAT_PATH_NORMALIZE else content.strip()
+
+        if isinstance(trace, dict):
+            trace["format_path"] = mode
+        if on_token is not None:
+            await on_token(formatted)
+
+        return await self.arespond_and_record(
+            query=user_query,
+            response=formatted,
+            image_path=image_path,
+            meta={**(meta or {}), "format_path": mode},
+        )
+
+    async def _format_text(
         self,
         user_query: str,
         ordered_blocks: List[str],
+        contents: Optional[List[str]] = None,
         image_path: str = None,
         meta: Dict[str, Any] = None,
         request_id: str = None,
         session_id: str = None,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+        trace: Optional[Dict[str, Any]] = None,
     ) -> str:
+        """
+        Synthesize the ordered blocks via the LLM.
+        When on_token is given, tokens are streamed to it as they are generated.
+        If the request deadline runs out, the contents are merged locally instead.
+        """
 
         combined_content = "\n\n".join(ordered_blocks)
 
@@ -128,18 +238,34 @@ class FormatterAgent(AgriAgentBase):
         user_content = prompt_msgs[1].content if len(prompt_msgs) > 1 else combined_content
 
         try:
-            formatted, _ = query_groq_text(
-                user_content,
-                system_msg=system_content if system_content else None,
-                request_id=request_id,
-                session_id=session_id,
-            )
+            if on_token is not None:
+                formatted, _ = await astream_groq_text(
+                    user_content,
+                    on_token=on_token,
+                    system_msg=system_content if system_content else None,
+                    request_id=request_id,
+                    session_id=session_id,
+                    site=FORMATTER,
+                )
+            else:
+                formatted, _ = await aquery_groq_text(
+                    user_content,
+                    system_msg=system_content if system_content else None,
+                    request_id=request_id,
+                    session_id=session_id,
+                    site=FORMATTER,
+                )
+        except DeadlineExceeded:
+            record_cut(trace, "formatter")
+            if isinstance(trace, dict):
+                trace["format_path"] = FORMAT_PATH_NORMALIZE
+            formatted = normalize_markdown("\n\n".join(contents or ordered_blocks))
         except Exception:
             formatted = combined_content
 
         formatted = str(formatted).strip()
 
-        return self.respond_and_record(
+        return await self.arespond_and_record(
             query=user_query,
             response=formatted,
             image_path=image_path,
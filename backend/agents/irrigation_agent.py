@@ -1,5 +1,6 @@
-from backend.services.text_service import query_groq_text
+from backend.services.text_service import aquery_groq_text
 from backend.agents.agri_agent_base import AgriAgentBase
+from backend.core.deadline import DeadlineExceeded
 from backend.core.prompt_loader import get_prompt
 
 
@@ -11,7 +12,7 @@ class IrrigationAgent(AgriAgentBase):
 
     name = "IrrigationAgent"
 
-    def handle_query(
+    async def ahandle_query(
         self,
         query: str = None,
         image_path: str = None,
@@ -29,7 +30,7 @@ class IrrigationAgent(AgriAgentBase):
                 "• How to save water using drip irrigation?\n"
                 "• How should irrigation change during summer?"
             )
-            return self.respond_and_record("", response, image_path)
+            return await self.arespond_and_record("", response, image_path)
 
         clean_query = query.strip()
 
@@ -43,15 +44,17 @@ class IrrigationAgent(AgriAgentBase):
             prompt = f"PREVIOUS CONTEXT: {chat_history or 'None'}\nFARMER QUERY: {clean_query}"
 
         try:
-            resp, _ = query_groq_text(
+            resp, _ = await aquery_groq_text(
                 prompt,
                 request_id=request_id,
                 session_id=session_id,
             )
+        except DeadlineExceeded:
+            raise
         except Exception:
             resp = "Irrigation advice could not be generated at this time."
 
-        return self.respond_and_record(
+        return await self.arespond_and_record(
             query=clean_query,
             response=resp,
             image_path=image_path,
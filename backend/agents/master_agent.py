@@ -1,20 +1,40 @@
 """Master agent - structured output router, ChatPromptTemplate, no regex parsing."""
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import re
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import Optional, Dict, Any, List
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from backend.core.langchain_tools import (
     get_agent_registry,
     NON_ROUTABLE_AGENTS,
     AGENT_DESCRIPTIONS,
 )
-from backend.core.llm_client import get_llm
+from backend.core import deadline
+from backend.core.config import settings
+from backend.core.deadline import DeadlineExceeded, record_cut
+from backend.core.hedging import ahedged
+from backend.core.rate_governor import estimate_tokens
+from backend.core.llm_client import ROUTER, get_cascade, get_llm, run_sync
 from backend.core.memory_manager import get_chat_history, add_message_to_history, format_history_for_prompt
 from backend.core.router_schema import RouterOutput, AgentScore
 from backend.core.langchain_prompts import ROUTER_PROMPT
+from backend.core.intent_classifier import IntentClassifier, build_training_samples
+from backend.core.prompt_loader import get_prompt_version
+from backend.core.semantic_cache import SemanticCache, normalize_text
+from backend.core.single_flight import SingleFlight
+from backend.core.request_trace import annotate, clip, trace_scope
+from backend.core.resilience import CircuitOpenError, RetryPolicy, acall_with_cascade
+from backend.core.token_tracker import token_tracker
+from backend.services.history_service import log_interaction
+from backend.services.image_preprocess import prepare_image, read_image_file
+from backend.services.vision_service import ImageData
 
 MAX_QUERY_CHARS = 2000
 MAX_ROUTED_AGENTS = 3
@@ -22,33 +42,345 @@ MAX_ROUTED_AGENTS = 3
 PRIMARY_SCORE_THRESHOLD = 75
 SECONDARY_SCORE_THRESHOLD = 50
 
+# on_event(event_name, data) - receives pipeline progress for streaming clients
+EventCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
+
+async def _emit(on_event: Optional[EventCallback], event: str, data: Dict[str, Any]) -> None:
+    if on_event is None:
+        return
+    try:
+        await on_event(event, data)
+    except Exception as e:
+        print(f"[ROUTER] Event callback failed for '{event}': {e}")
+
 
 def route_query(
     query: Optional[str] = None,
     image_path: Optional[str] = None,
     session_id: Optional[str] = None,
     request_id: Optional[str] = None,
-) -> str:
+    image_bytes: Optional[ImageData] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """Blocking wrapper around aroute_query for scripts and sync callers."""
+    return run_sync(
+        aroute_query(
+            query=query,
+            image_path=image_path,
+            session_id=session_id,
+            request_id=request_id,
+            image_bytes=image_bytes,
+        )
+    )
 
-    registry = get_agent_registry()
+
+async def aroute_query(
+    query: Optional[str] = None,
+    image_path: Optional[str] = None,
+    session_id: Optional[str] = None,
+    request_id: Optional[str] = None,
+    on_event: Optional[EventCallback] = None,
+    image_bytes: Optional[ImageData] = None,
+    chat_history: Optional[List[Dict[str, str]]] = None,
+    save_history: bool = True,
+) -> Tuple[str, Dict[str, Any]]:
+    """
+    Route a query through the agents and the formatter.
+    The image, if any, is either a file at image_path or in-memory image_bytes.
+    Returns (response, meta); meta reports "format_path", "cache_hit" and,
+    for image queries, the preprocessing stats under "image". Under a request
+    deadline (core.deadline) late stages are cut and listed in "cut_stages".
+    If on_event is given it receives "routed", "agent_done" (with the agent's output) and "token" events.
+    Callers that keep the session's history themselves (the WebSocket chat)
+    pass it as chat_history and save_history=False to skip the memory
+    round trips; they then own writing the turn back.
+    Each answered request writes one trace record to the interaction log
+    (routing, every agent's output and latency, formatter path, tokens);
+    the agents themselves do not log while it is being assembled.
+    """
 
     clean_query = str(query or "").strip()
+    has_image = bool(image_path) or image_bytes is not None
 
     if clean_query and len(clean_query) > MAX_QUERY_CHARS:
-        return "Your question is too long. Please shorten it."
+        return "Your question is too long. Please shorten it.", {"format_path": "none", "cache_hit": False}
+
+    if not clean_query and not has_image:
+        return "Please ask an agriculture-related question.", {"format_path": "none", "cache_hit": False}
+
+    started = time.perf_counter()
+    image_stats = None
+    if has_image:
+        image_bytes, image_stats = await asyncio.to_thread(_prepare_upload, image_path, image_bytes)
+
+    if chat_history is None:
+        chat_history = await asyncio.to_thread(get_chat_history, session_id)
+    chat_history_str = format_history_for_prompt(chat_history)
+    remember = bool(session_id and save_history)
+    if remember:
+        # Saved up front so the question stays in the session even if answering it fails
+        await asyncio.to_thread(add_message_to_history, session_id, "user", clean_query or "Uploaded an image")
+
+    # Answer cache covers text-only queries; image answers depend on the upload
+    answer_cache = _get_answer_cache() if not has_image else None
+    partition = _cache_partition(chat_history_str)
+    vector = None
+    if answer_cache is not None:
+        cached, vector = await asyncio.to_thread(answer_cache.lookup, clean_query, partition)
+        if cached is not None:
+            response = str(cached.get("response", ""))
+            await _emit(on_event, "routed", {"routing_mode": "cache", "agents": []})
+            await _emit(on_event, "token", {"text": response})
+            if remember:
+                await asyncio.to_thread(add_message_to_history, session_id, "assistant", response)
+            await _write_trace(_trace_record(
+                {"routing_mode": "cache", "format_path": cached.get("format_path", "none")},
+                clean_query, image_path, response, request_id, session_id, started, cache_hit=True,
+            ))
+            return response, {"format_path": cached.get("format_path", "none"), "cache_hit": True}
+
+    own_trace: Dict[str, Any] = {}
+
+    async def _pipeline() -> Tuple[str, Dict[str, Any]]:
+        return await _run_pipeline(
+            clean_query=clean_query,
+            image_path=image_path,
+            image_bytes=image_bytes,
+            chat_history_str=chat_history_str,
+            request_id=request_id,
+            session_id=session_id,
+            on_event=on_event,
+            trace=own_trace,
+        )
+
+    pipeline_started = time.perf_counter()
+    shared = False
+    with trace_scope(own_trace):
+        if settings.SINGLE_FLIGHT_ENABLED:
+            flight_key = await asyncio.to_thread(
+                _route_flight_key, clean_query, image_path, chat_history_str, image_bytes
+            )
+            (response, trace), shared = await _ROUTE_FLIGHT.do(
+                flight_key, _pipeline, shareable=_shareable_outcome
+            )
+        else:
+            response, trace = await _pipeline()
+
+    if shared:
+        # Another caller ran the pipeline (and streamed to its own listener)
+        token_tracker.copy_coalesced(trace.get("request_id"), request_id)
+        await _emit(on_event, "routed", {"routing_mode": "coalesced", "agents": []})
+        await _emit(on_event, "token", {"text": response})
+
+    degraded = bool(trace.get("cut_stages"))
+    if answer_cache is not None and not shared and not degraded and _is_cacheable(response):
+        answer_cache.record_miss_latency((time.perf_counter() - pipeline_started) * 1000)
+        await asyncio.to_thread(
+            answer_cache.store,
+            clean_query,
+            {"response": response, "format_path": trace.get("format_path", "none")},
+            partition,
+            vector,
+        )
+
+    if remember:
+        await asyncio.to_thread(add_message_to_history, session_id, "assistant", response)
+
+    # A coalesced follower ran nothing itself; the leader's record has the details
+    record_trace = {"routing_mode": "coalesced", "cut_stages": trace.get("cut_stages", [])} if shared else trace
+    await _write_trace(_trace_record(
+        record_trace, clean_query, image_path, response, request_id, session_id, started,
+        image_stats=image_stats,
+    ))
+
+    meta = _response_meta(trace)
+    if image_stats is not None:
+        meta["image"] = image_stats
+    return response, meta
+
+
+def _trace_record(
+    trace: Dict[str, Any],
+    clean_query: str,
+    image_path: Optional[str],
+    response: str,
+    request_id: Optional[str],
+    session_id: Optional[str],
+    started: float,
+    cache_hit: bool = False,
+    image_stats: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """
+    The request's single interaction-log record. "agent" is the primary agent
+    and "agents" every agent that ran, so usage metrics and the intent
+    classifier's training data read it like the old per-agent entries.
+    """
+    captured = trace.get("captured", {})
+    runs = trace.get("agent_runs", {})
+    cut = set(trace.get("cut_stages", []))
+
+    agent_results = []
+    for item in trace.get("routing", []):
+        name = item["agent"]
+        result = {"agent": name, "role": item["role"], "score": item.get("score", 0), **runs.get(name, {})}
+        if name not in runs and f"agent:{name}" in cut:
+            result["cut"] = True
+        if captured.get(name, {}).get("meta"):
+            result["meta"] = captured[name]["meta"]
+        agent_results.append(result)
+
+    image_ref = image_path or next(
+        (c["image_path"] for c in captured.values() if c.get("image_path")), None
+    )
+    if clean_query and image_ref:
+        query_type = "multimodal"
+    elif image_ref:
+        query_type = "image"
+    else:
+        query_type = "text"
+
+    record: Dict[str, Any] = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "request_id": request_id,
+        "session_id": session_id,
+        "query": clean_query,
+        "type": query_type,
+        "routing_mode": trace.get("routing_mode", "none"),
+        "router_source": trace.get("router_source"),
+        "routing": [{"agent": r["agent"], "role": r["role"], "score": r.get("score", 0)} for r in trace.get("routing", [])],
+        "agents": [r["agent"] for r in agent_results if r["agent"] in runs],
+        "agent_results": agent_results,
+        "formatter": {"format_path": trace.get("format_path", "none"), "latency_ms": trace.get("formatter_ms")},
+        "response": clip(response),
+        "latency_ms": int((time.perf_counter() - started) * 1000),
+        "cache_hit": cache_hit,
+        "tokens": token_tracker.get_request_summary(request_id) if request_id else None,
+    }
+    primary = next((r["agent"] for r in agent_results if r["role"] == "primary"), None)
+    if primary:
+        record["agent"] = primary
+    if image_ref:
+        record["image_path"] = image_ref
+    if image_stats is not None:
+        record["image"] = image_stats
+    if trace.get("cut_stages"):
+        record["cut_stages"] = list(trace["cut_stages"])
+    return record
+
+
+async def _write_trace(record: Dict[str, Any]) -> None:
+    try:
+        await asyncio.to_thread(log_interaction, record)
+    except Exception as e:
+        print(f"[ROUTER] Failed to log request trace: {e}")
+
+
+def _record_run(
+    trace: Dict[str, Any],
+    agent: str,
+    started: float,
+    output: Any = None,
+    error: Optional[BaseException] = None,
+) -> None:
+    """Keep an agent's output (or failure) and latency for the request's trace record."""
+    run: Dict[str, Any] = {"latency_ms": int((time.perf_counter() - started) * 1000)}
+    if error is not None:
+        run["error"] = str(error) or type(error).__name__
+    else:
+        run["response"] = clip(output)
+    trace.setdefault("agent_runs", {})[agent] = run
+
+
+def _prepare_upload(
+    image_path: Optional[str],
+    image_bytes: Optional[ImageData],
+) -> Tuple[Optional[ImageData], Optional[Dict[str, Any]]]:
+    """Load (if only a path was given) and preprocess the image once per request."""
+    if image_bytes is None:
+        image_bytes = read_image_file(image_path)
+        if image_bytes is None:
+            return None, None  # vision service reports the missing file
+    return prepare_image(image_bytes)
+
 
-    chat_history_list = get_chat_history(session_id)
-    chat_history_str = format_history_for_prompt(chat_history_list)
+_ROUTE_FLIGHT = SingleFlight("route_query")
+
+
+def _shareable_outcome(outcome: Tuple[str, Dict[str, Any]]) -> bool:
+    """Deadline-degraded answers depend on the leader's budget; followers run their own pipeline."""
+    response, trace = outcome
+    return not trace.get("cut_stages") and response != DEADLINE_MSG
+
+
+def _route_flight_key(
+    clean_query: str,
+    image_path: Optional[str],
+    chat_history_str: str,
+    image_bytes: Optional[ImageData] = None,
+) -> str:
+    """Identical normalised query + conversation + image bytes -> same computation."""
+    h = hashlib.sha256()
+    for part in (get_prompt_version(), settings.TEXT_MODEL_NAME, normalize_text(clean_query), chat_history_str):
+        h.update(part.encode("utf-8"))
+        h.update(b"\x1f")
+    if image_bytes is not None:
+        h.update(image_bytes)
+    elif image_path:
+        with open(image_path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+async def _run_pipeline(
+    clean_query: str,
+    image_path: Optional[str],
+    chat_history_str: str,
+    request_id: Optional[str],
+    session_id: Optional[str],
+    on_event: Optional[EventCallback] = None,
+    image_bytes: Optional[ImageData] = None,
+    trace: Optional[Dict[str, Any]] = None,
+) -> Tuple[str, Dict[str, Any]]:
+    """Router -> agents -> formatter. Returns (formatted_response, trace)."""
+
+    registry = get_agent_registry()
+    has_image = bool(image_path) or image_bytes is not None
+    image_kw = {"image_path": image_path, "image_bytes": image_bytes}
 
     agent_kw = {"request_id": request_id, "session_id": session_id}
 
-    if image_path and not clean_query:
-        pest_output = registry["PestAgent"].handle_query(
-            query="",
-            image_path=image_path,
-            chat_history=chat_history_str,
-            **agent_kw,
-        )
+    async def _on_token(text: str) -> None:
+        await _emit(on_event, "token", {"text": text})
+
+    trace = trace if trace is not None else {}
+    trace["request_id"] = request_id  # lets coalesced followers report this run's tokens
+    formatter_kw = {**agent_kw, "on_token": _on_token if on_event else None, "trace": trace}
+    # Seconds kept back for the formatter; with less left it merges locally
+    reserve = settings.DEADLINE_FORMATTER_RESERVE_SECONDS
+
+    if has_image and not clean_query:
+        trace["routing_mode"] = "image_only"
+        trace["routing"] = [{"agent": "PestAgent", "role": "primary", "score": 100}]
+        await _emit(on_event, "routed", {
+            "routing_mode": "image_only",
+            "agents": [{"agent": "PestAgent", "role": "primary", "score": 100}],
+        })
+
+        agent_started = time.perf_counter()
+        try:
+            pest_output = await deadline.await_within(
+                registry["PestAgent"].ahandle_query(
+                    query="",
+                    **image_kw,
+                    chat_history=chat_history_str,
+                    **agent_kw,
+                ),
+                stage="PestAgent",
+            )
+        except DeadlineExceeded:
+            record_cut(trace, "agent:PestAgent")
+            return DEADLINE_MSG, trace
+        _record_run(trace, "PestAgent", agent_started, pest_output)
 
         payload = {
             "user_query": "Image-based diagnosis",
@@ -62,31 +394,34 @@ def route_query(
                 }
             ],
         }
+        await _emit(on_event, "agent_done", {"agent": "PestAgent", "role": "primary", "content": pest_output})
 
-        if session_id:
-            add_message_to_history(session_id, "user", "Uploaded an image")
-
-        response = registry["FormatterAgent"].handle_query(payload, **agent_kw)
-
-        if session_id:
-            add_message_to_history(session_id, "assistant", response)
-
-        return response
+        formatter_started = time.perf_counter()
+        response = await registry["FormatterAgent"].ahandle_query(
+            payload, **formatter_kw, skip_llm=not deadline.has_time(reserve)
+        )
+        trace["formatter_ms"] = int((time.perf_counter() - formatter_started) * 1000)
 
-    if not clean_query:
-        return "Please ask an agriculture-related question."
+        return response, trace
 
-    routed = llm_route_with_scores(
-        clean_query, registry, chat_history_str, request_id, session_id
-    )
+    try:
+        routed = await deadline.await_within(
+            allm_route_with_scores(clean_query, registry, chat_history_str, request_id, session_id),
+            stage="router",
+            reserve=reserve,
+        )
+    except DeadlineExceeded:
+        record_cut(trace, "router")
+        routed = []
 
     if not routed:
+        trace["router_source"] = "default"
         routed = [{"agent": "CropAgent", "role": "primary", "score": 0}]
 
     if not any(r["role"] == "primary" for r in routed):
         routed[0]["role"] = "primary"
 
-    if image_path:
+    if has_image:
         pest_in_route = any(r["agent"] == "PestAgent" for r in routed)
         if not pest_in_route:
             routed.append({"agent": "PestAgent", "role": "supporting", "score": 100})
@@ -94,56 +429,70 @@ def route_query(
     final_execution_list = routed[:MAX_ROUTED_AGENTS]
 
     # Ensure PestAgent is included when image present; replace lowest-priority slot if needed
-    if image_path and final_execution_list and not any(r["agent"] == "PestAgent" for r in final_execution_list):
+    if has_image and final_execution_list and not any(r["agent"] == "PestAgent" for r in final_execution_list):
         final_execution_list[-1] = {"agent": "PestAgent", "role": "supporting", "score": 100}
 
-    # Run agents in parallel for faster multi-agent flows
-    def _run_agent(idx_and_item) -> tuple[int, Optional[Dict[str, Any]]]:
-        idx, item = idx_and_item
+    trace["routing_mode"] = "multimodal" if has_image else "text_only"
+    trace["routing"] = [dict(item) for item in final_execution_list]
+    await _emit(on_event, "routed", {
+        "routing_mode": trace["routing_mode"],
+        "agents": final_execution_list,
+    })
+
+    # Run agents concurrently on the event loop for faster multi-agent flows
+    async def _run_agent(item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         agent_name = item["agent"]
         role = item["role"]
         score = item.get("score", 0)
         if agent_name not in registry:
-            return (idx, None)
-        if agent_name == "PestAgent" and image_path:
-            output = registry[agent_name].handle_query(
-                query=clean_query,
-                image_path=image_path,
-                chat_history=chat_history_str,
-                **agent_kw,
-            )
-        else:
-            output = registry[agent_name].handle_query(
-                query=clean_query,
-                chat_history=chat_history_str,
-                **agent_kw,
-            )
-        return (idx, {"agent": agent_name, "role": role, "score": score, "content": output})
-
-    agent_results_by_idx: Dict[int, Dict[str, Any]] = {}
-    with ThreadPoolExecutor(max_workers=MAX_ROUTED_AGENTS) as executor:
-        tasks = [(i, item) for i, item in enumerate(final_execution_list)]
-        futures = {executor.submit(_run_agent, t): t[0] for t in tasks}
-        for future in as_completed(futures):
-            try:
-                idx, result = future.result()
-                if result is not None:
-                    agent_results_by_idx[idx] = result
-            except Exception as e:
-                print(f"[ROUTER] Agent execution failed: {e}")
-    agent_results = [agent_results_by_idx[i] for i in range(len(final_execution_list)) if i in agent_results_by_idx]
+            return None
+        agent_started = time.perf_counter()
+        try:
+            if agent_name == "PestAgent" and has_image:
+                output = await registry[agent_name].ahandle_query(
+                    query=clean_query,
+                    **image_kw,
+                    chat_history=chat_history_str,
+                    **agent_kw,
+                )
+            else:
+                output = await registry[agent_name].ahandle_query(
+                    query=clean_query,
+                    chat_history=chat_history_str,
+                    **agent_kw,
+                )
+        except (asyncio.CancelledError, DeadlineExceeded):
+            raise
+        except Exception as e:
+            _record_run(trace, agent_name, agent_started, error=e)
+            raise
+        _record_run(trace, agent_name, agent_started, output)
+        await _emit(on_event, "agent_done", {"agent": agent_name, "role": role, "content": output})
+        return {"agent": agent_name, "role": role, "score": score, "content": output}
+
+    outcomes = await _gather_agents(final_execution_list, _run_agent, trace, reserve)
+    agent_results = []
+    for outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            print(f"[ROUTER] Agent execution failed: {outcome}")
+            continue
+        if outcome is not None:
+            agent_results.append(outcome)
+
+    if not agent_results and trace.get("cut_stages"):
+        return DEADLINE_MSG, trace
 
     payload = {
         "user_query": clean_query,
-        "routing_mode": "multimodal" if image_path else "text_only",
+        "routing_mode": "multimodal" if has_image else "text_only",
         "agent_results": agent_results,
     }
 
-    formatted_response = registry["FormatterAgent"].handle_query(payload, **agent_kw)
-
-    if session_id:
-        add_message_to_history(session_id, "user", clean_query)
-        add_message_to_history(session_id, "assistant", formatted_response)
+    formatter_started = time.perf_counter()
+    formatted_response = await registry["FormatterAgent"].ahandle_query(
+        payload, **formatter_kw, skip_llm=not deadline.has_time(reserve)
+    )
+    trace["formatter_ms"] = int((time.perf_counter() - formatter_started) * 1000)
 
     score_summary = ", ".join(
         f"{res['agent']}: {res['score']}" for res in agent_results if "score" in res
@@ -151,7 +500,86 @@ def route_query(
     if score_summary:
         print(f"\n[ROUTER CONFIDENCE] {score_summary}\n")
 
-    return formatted_response
+    return formatted_response, trace
+
+
+async def _gather_agents(
+    items: List[Dict[str, Any]],
+    run: Callable[[Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]],
+    trace: Dict[str, Any],
+    reserve: float,
+) -> List[Any]:
+    """
+    Run the routed agents concurrently within the request deadline.
+    Agents still running when only `reserve` seconds are left are dropped,
+    except the primary, which may use the formatter's reserve (the formatter
+    then merges locally). Returns outcomes in order: result, exception, or
+    None for agents that were cut.
+    """
+    tasks = [asyncio.create_task(run(item)) for item in items]
+    left = deadline.remaining()
+    if left is None:
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    try:
+        await asyncio.wait(tasks, timeout=max(0.0, left - reserve))
+        primary = [t for t, item in zip(tasks, items) if item["role"] == "primary" and not t.done()]
+        if primary:
+            await asyncio.wait(primary, timeout=max(0.0, deadline.remaining() or 0.0))
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    outcomes: List[Any] = []
+    cut = []
+    for task, item in zip(tasks, items):
+        if task.done():
+            outcome = task.exception() or task.result()
+            if isinstance(outcome, DeadlineExceeded):
+                record_cut(trace, f"agent:{item['agent']}")
+                outcome = None
+            outcomes.append(outcome)
+            continue
+        task.cancel()
+        cut.append(task)
+        outcomes.append(None)
+        record_cut(trace, f"agent:{item['agent']}")
+    if cut:
+        await asyncio.gather(*cut, return_exceptions=True)
+        print(f"[ROUTER] Deadline: dropped {len(cut)} agent(s)")
+    return outcomes
+
+
+def _response_meta(trace: Dict[str, Any]) -> Dict[str, Any]:
+    """Per-response metadata surfaced in the API payload."""
+    meta = {"format_path": trace.get("format_path", "none"), "cache_hit": False}
+    if trace.get("cut_stages"):
+        meta["degraded"] = True
+        meta["cut_stages"] = list(trace["cut_stages"])
+    return meta
+
+
+DEADLINE_MSG = (
+    "This request ran out of time before an answer was ready. "
+    "Please try again in a moment."
+)
+
+
+# Fallback texts produced when an LLM call failed - never cache these
+_UNCACHEABLE_MARKERS = (
+    "temporarily unavailable",
+    "could not be generated",
+    "could not be analyzed",
+    "No agent responses were generated",
+    "Agent responses were empty",
+    "ran out of time",
+)
+
+
+def _is_cacheable(response: str) -> bool:
+    text = str(response or "")
+    return bool(text.strip()) and not any(m in text for m in _UNCACHEABLE_MARKERS)
 
 
 def llm_route_with_scores(
@@ -161,27 +589,223 @@ def llm_route_with_scores(
     request_id: Optional[str] = None,
     session_id: Optional[str] = None,
 ) -> List[Dict[str, Any]]:
+    """Blocking wrapper around allm_route_with_scores."""
+    return run_sync(
+        allm_route_with_scores(query, registry, chat_history, request_id, session_id)
+    )
+
+
+_ROUTE_CACHE: Optional[SemanticCache] = None
+
+
+def _get_route_cache() -> Optional[SemanticCache]:
+    """Lazily build the routing cache on top of the RAG MiniLM embeddings."""
+    global _ROUTE_CACHE
+    if not settings.ROUTE_CACHE_ENABLED:
+        return None
+    if _ROUTE_CACHE is None:
+        from backend.services.rag_service import rag_service
+
+        _ROUTE_CACHE = SemanticCache(
+            name="routing",
+            embed_fn=rag_service.embed_query,
+            threshold=settings.ROUTE_CACHE_THRESHOLD,
+            max_entries=settings.ROUTE_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ROUTE_CACHE_TTL_SECONDS,
+        )
+    return _ROUTE_CACHE
+
+
+_ANSWER_CACHE: Optional[SemanticCache] = None
+
+
+def _get_answer_cache() -> Optional[SemanticCache]:
+    """Lazily build the full-answer cache (text-only queries)."""
+    global _ANSWER_CACHE
+    if not settings.ANSWER_CACHE_ENABLED:
+        return None
+    if _ANSWER_CACHE is None:
+        from backend.services.rag_service import rag_service
+
+        _ANSWER_CACHE = SemanticCache(
+            name="answer",
+            embed_fn=rag_service.embed_query,
+            threshold=settings.ANSWER_CACHE_THRESHOLD,
+            max_entries=settings.ANSWER_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+            use_redis=str(settings.ANSWER_CACHE_BACKEND).strip().lower() == "redis",
+        )
+    return _ANSWER_CACHE
+
+
+def _cache_partition(chat_history: str) -> str:
+    """Cached routes/answers depend on prompt version, model and (for follow-ups) the conversation."""
+    history = chat_history or "No previous conversation."
+    digest = hashlib.sha1(history.encode("utf-8")).hexdigest()[:16]
+    return f"{get_prompt_version()}|{settings.TEXT_MODEL_NAME}|{digest}"
+
+
+_INTENT_CLASSIFIER: Optional[IntentClassifier] = None
+_INTENT_LOCK = threading.Lock()
+_INTENT_FAILED = False
+
+# How each routing decision was made: cache | local | llm
+ROUTER_SOURCE_COUNTS: Counter = Counter()
+
+
+def _routed_by(source: str) -> None:
+    """Count a routing decision and note its source in the request's trace record."""
+    ROUTER_SOURCE_COUNTS[source] += 1
+    annotate("router_source", source)
+
+
+def _router_mode() -> str:
+    mode = str(settings.ROUTER_MODE or "").strip().lower()
+    return mode if mode in ("llm", "hybrid", "local") else "llm"
+
+
+def _get_intent_classifier() -> Optional[IntentClassifier]:
+    """Build the local classifier on first use; None if disabled or training failed."""
+    global _INTENT_CLASSIFIER, _INTENT_FAILED
+    if _router_mode() == "llm" or _INTENT_FAILED:
+        return None
+    with _INTENT_LOCK:
+        if _INTENT_CLASSIFIER is None and not _INTENT_FAILED:
+            try:
+                from backend.services.history_service import load_interactions
+                from backend.services.rag_service import rag_service
+
+                routable = [a["name"] for a in AGENT_DESCRIPTIONS if a["name"] not in NON_ROUTABLE_AGENTS]
+                samples = build_training_samples(AGENT_DESCRIPTIONS, load_interactions(), routable)
+                classifier = IntentClassifier(rag_service.embed_documents)
+                classifier.fit(samples)
+                _INTENT_CLASSIFIER = classifier
+                print(f"[ROUTER] Intent classifier ready ({sum(len(v) for v in samples.values())} samples)")
+            except Exception as e:
+                _INTENT_FAILED = True
+                print(f"[ROUTER] Intent classifier unavailable, using LLM router: {e}")
+    return _INTENT_CLASSIFIER
+
+
+def _classify_locally(query: str, chat_history: str = "") -> Optional[RouterOutput]:
+    """
+    Local pre-router. Returns scores when the classifier may decide on its own
+    (always in "local" mode; in "hybrid" mode only for confident, history-free
+    queries since follow-ups like "how do I treat it?" need the conversation), else None.
+    """
+    has_history = bool(chat_history) and chat_history != "No previous conversation."
+    if _router_mode() == "hybrid" and has_history:
+        return None
+    classifier = _get_intent_classifier()
+    if classifier is None:
+        return None
+    try:
+        result, similarity = classifier.classify(query)
+    except Exception as e:
+        print(f"[ROUTER] Intent classification failed: {e}")
+        return None
+    if _router_mode() == "local":
+        return result
+    top = result.agents[0].score if result.agents else 0
+    if top >= PRIMARY_SCORE_THRESHOLD and similarity >= settings.INTENT_MIN_SIMILARITY:
+        return result
+    return None
+
+
+async def allm_route_with_scores(
+    query: str,
+    registry: Dict[str, Any],
+    chat_history: str = "",
+    request_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+
+    cache = _get_route_cache()
+    partition = _cache_partition(chat_history)
+    vector = None
+    if cache is not None:
+        cached, vector = await asyncio.to_thread(cache.lookup, query, partition)
+        if cached is not None:
+            _routed_by("cache")
+            return _select_routes(RouterOutput.model_validate(cached), registry)
+
+    local = await asyncio.to_thread(_classify_locally, query, chat_history)
+    if local is not None:
+        _routed_by("local")
+        return _select_routes(local, registry)
+
+    _routed_by("llm")
+    started = time.perf_counter()
+    result = await _allm_router_output(query, chat_history)
+    if result is None:
+        return []
+
+    if cache is not None and result.agents:
+        cache.record_miss_latency((time.perf_counter() - started) * 1000)
+        await asyncio.to_thread(cache.store, query, result.model_dump(), partition, vector)
+
+    return _select_routes(result, registry)
+
+
+# Routing is latency-critical and has a default route - one attempt, but it feeds the breaker
+_ROUTER_POLICY = RetryPolicy(max_attempts=1)
+
+
+def _router_cost(agent_map: str, chat_history: str, query: str) -> int:
+    """Estimated tokens of one router call (~700 chars of template); the output is a short score list."""
+    return estimate_tokens(agent_map, chat_history, query, output_tokens=150) + 175
+
+
+async def _allm_router_output(query: str, chat_history: str) -> Optional[RouterOutput]:
+    """Ask the LLM router for per-agent scores (structured output, JSON fallback)."""
 
     agent_map = "\n".join(
         f"- {a['name']}: {a['description']}" for a in AGENT_DESCRIPTIONS
     )
 
-    llm = get_llm()
-    structured_llm = llm.with_structured_output(RouterOutput)
+    inputs = {
+        "agent_map": agent_map,
+        "chat_history": chat_history or "No previous conversation.",
+        "query": query,
+    }
+    cost = _router_cost(agent_map, chat_history, query)
+
+    def _score(model: str):
+        chain = ROUTER_PROMPT | get_llm(model).with_structured_output(RouterOutput)
+        return ahedged(lambda: chain.ainvoke(inputs), f"router:{model}", model, cost)
 
     try:
-        chain = ROUTER_PROMPT | structured_llm
-        result: RouterOutput = chain.invoke({
-            "agent_map": agent_map,
-            "chat_history": chat_history or "No previous conversation.",
-            "query": query,
-        })
+        result, _ = await acall_with_cascade(
+            _score,
+            get_cascade(ROUTER),
+            policy=_ROUTER_POLICY,
+            label="ROUTER",
+            cost_tokens=cost,
+        )
+    except CircuitOpenError as e:
+        print(f"[ROUTER] {e}; using default routing")
+        return None
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"Router structured output failed, falling back to JSON parse: {e}")
-        result = _fallback_router_parse(llm, agent_map, chat_history, query)
-        if result is None:
-            return []
+        result = await _fallback_router_parse(agent_map, chat_history, query)
+
+    return result
+
 
+def router_stats() -> Dict[str, Any]:
+    """Routing decision counts by source, plus local classifier state."""
+    classifier = _INTENT_CLASSIFIER
+    return {
+        "mode": _router_mode(),
+        "by_source": dict(ROUTER_SOURCE_COUNTS),
+        "intent_classifier": classifier.stats() if classifier else {"ready": False},
+    }
+
+
+def _select_routes(result: RouterOutput, registry: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Apply score thresholds to router output and assign primary/supporting roles."""
     candidates = []
     seen = set()
 
@@ -221,7 +845,7 @@ def llm_route_with_scores(
     return final_routes
 
 
-def _fallback_router_parse(llm, agent_map: str, chat_history: str, query: str):
+async def _fallback_router_parse(agent_map: str, chat_history: str, query: str):
     """Fallback when structured output fails - parse JSON from raw response."""
     try:
         msgs = ROUTER_PROMPT.format_messages(
@@ -229,7 +853,15 @@ def _fallback_router_parse(llm, agent_map: str, chat_history: str, query: str):
             chat_history=chat_history or "No previous conversation.",
             query=query,
         )
-        raw = llm.invoke(msgs).content
+        cost = _router_cost(agent_map, chat_history, query)
+        response, _ = await acall_with_cascade(
+            lambda model: ahedged(lambda: get_llm(model).ainvoke(msgs), f"router:{model}", model, cost),
+            get_cascade(ROUTER),
+            policy=_ROUTER_POLICY,
+            label="ROUTER",
+            cost_tokens=cost,
+        )
+        raw = response.content
         match = re.search(r"\[.*\]", raw, re.DOTALL)
         if not match:
             return None
@@ -1,6 +1,9 @@
-from backend.services.text_service import query_groq_text
-from backend.services.vision_service import query_groq_image
-from backend.agents.agri_agent_base import AgriAgentBase
+import asyncio
+
+from backend.services.text_service import aquery_groq_text
+from backend.services.vision_service import aquery_groq_image, prescreen_image
+from backend.agents.agri_agent_base import AgriAgentBase, UPLOADED_IMAGE_REF
+from backend.core.deadline import DeadlineExceeded
 from backend.core.prompt_loader import get_prompt
 
 
@@ -8,29 +11,45 @@ class PestAgent(AgriAgentBase):
     """
     PestAgent:
     Handles pest, disease, and visible symptom analysis.
-    Image input ALWAYS takes priority over text.
+    Image input (a file path or in-memory image_bytes) ALWAYS takes priority over text.
     """
 
     name = "PestAgent"
 
-    def handle_query(
+    async def ahandle_query(
         self,
         query: str = None,
         image_path: str = None,
         chat_history: str = None,
         request_id: str = None,
         session_id: str = None,
+        image_bytes=None,
         **kwargs,
     ) -> str:
 
+        if image_bytes is not None and not image_path:
+            image_path = UPLOADED_IMAGE_REF
+
         if not query and not image_path:
             response = (
                 "Please upload a crop image or describe visible symptoms such as "
                 "yellowing, spots, holes, insects, wilting, or abnormal leaf color."
             )
-            return self.respond_and_record("", response, image_path)
+            return await self.arespond_and_record("", response, image_path)
 
         if image_path:
+            screen = None
+            if image_bytes is not None:
+                screen = await asyncio.to_thread(prescreen_image, image_bytes)
+            if screen:
+                # Unusable photo: answer with a retake hint, skip the paid vision call
+                return await self.arespond_and_record(
+                    "Image-based symptom observation",
+                    screen["hint"],
+                    image_path=image_path,
+                    meta={"prescreen": screen},
+                )
+
             try:
                 vision_prompt = get_prompt("pest_agent.vision_prompt")
             except Exception:
@@ -43,16 +62,19 @@ class PestAgent(AgriAgentBase):
                 )
 
             try:
-                result, _ = query_groq_image(
-                    image_path,
+                result, _ = await aquery_groq_image(
+                    None if image_bytes is not None else image_path,
                     vision_prompt,
                     request_id=request_id,
                     session_id=session_id,
+                    image_bytes=image_bytes,
                 )
+            except DeadlineExceeded:
+                raise
             except Exception:
                 result = "The image could not be analyzed clearly."
 
-            return self.respond_and_record(
+            return await self.arespond_and_record(
                 "Image-based symptom observation",
                 result,
                 image_path=image_path,
@@ -70,15 +92,17 @@ class PestAgent(AgriAgentBase):
             text_prompt = f"CONTEXT: {chat_history or 'None'}\nFarmer description: {clean_query}"
 
         try:
-            result, _ = query_groq_text(
+            result, _ = await aquery_groq_text(
                 text_prompt,
                 request_id=request_id,
                 session_id=session_id,
             )
+        except DeadlineExceeded:
+            raise
         except Exception:
             result = "Pest analysis could not be generated at this time."
 
-        return self.respond_and_record(
+        return await self.arespond_and_record(
             clean_query,
             result,
             image_path=image_path,
@@ -4,7 +4,8 @@ from __future__ import annotations
 import unicodedata
 
 from backend.agents.agri_agent_base import AgriAgentBase
-from backend.services.rag_chain import invoke_subsidy_rag_chain
+from backend.core.deadline import DeadlineExceeded
+from backend.services.rag_chain import ainvoke_subsidy_rag_chain
 from backend.core.guardrails import detect_subsidy_hallucination
 
 
@@ -25,7 +26,7 @@ class SubsidyAgent(AgriAgentBase):
         text = text.replace("\x00", "").replace("\u200c", "")
         return text.strip()
 
-    def handle_query(
+    async def ahandle_query(
         self,
         query: str = None,
         image_path: str = None,
@@ -40,17 +41,19 @@ class SubsidyAgent(AgriAgentBase):
                 "Please ask about a specific agricultural subsidy or government scheme. "
                 "For example, drip irrigation subsidy, PM-Kisan eligibility, or equipment support schemes."
             )
-            return self.respond_and_record("", response, image_path)
+            return await self.arespond_and_record("", response, image_path)
 
         query_clean = self._sanitize_query(query)
 
         try:
-            result, retrieved_docs = invoke_subsidy_rag_chain(
+            result, retrieved_docs = await ainvoke_subsidy_rag_chain(
                 query=query_clean,
                 chat_history=chat_history or "None",
                 request_id=request_id,
                 session_id=session_id,
             )
+        except DeadlineExceeded:
+            raise
         except Exception:
             result = "Subsidy information could not be generated at this time."
             retrieved_docs = []
@@ -58,4 +61,4 @@ class SubsidyAgent(AgriAgentBase):
         # Guardrails: verify response is grounded in retrieved docs
         _, safe_result = detect_subsidy_hallucination(result, retrieved_docs)
 
-        return self.respond_and_record(query_clean, safe_result, image_path)
+        return await self.arespond_and_record(query_clean, safe_result, image_path)
@@ -1,5 +1,6 @@
-from backend.services.text_service import query_groq_text
+from backend.services.text_service import aquery_groq_text
 from backend.agents.agri_agent_base import AgriAgentBase
+from backend.core.deadline import DeadlineExceeded
 from backend.core.prompt_loader import get_prompt
 
 
@@ -12,7 +13,7 @@ class YieldAgent(AgriAgentBase):
 
     name = "YieldAgent"
 
-    def handle_query(
+    async def ahandle_query(
         self,
         query: str = None,
         image_path: str = None,
@@ -27,7 +28,7 @@ class YieldAgent(AgriAgentBase):
                 "Please describe the crop and the yield issue you are facing. "
                 "For example, low harvest, poor fruit setting, or reduced grain output."
             )
-            return self.respond_and_record("", response, image_path)
+            return await self.arespond_and_record("", response, image_path)
 
         clean_query = query.strip()
 
@@ -41,15 +42,17 @@ class YieldAgent(AgriAgentBase):
             prompt = f"PREVIOUS CONTEXT: {chat_history or 'None'}\nFarmer question: {clean_query}"
 
         try:
-            result, _ = query_groq_text(
+            result, _ = await aquery_groq_text(
                 prompt,
                 request_id=request_id,
                 session_id=session_id,
             )
+        except DeadlineExceeded:
+            raise
         except Exception:
             result = "Yield analysis could not be generated at this time."
 
-        return self.respond_and_record(
+        return await self.arespond_and_record(
             query=clean_query,
             response=result,
             image_path=image_path,
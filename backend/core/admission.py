@@ -0,0 +1,172 @@
+"""
+Admission control for the /ask endpoints.
+
+Each traffic class (text, image) has a bounded number of in-flight requests
+and a short FIFO wait queue. Requests beyond that are shed immediately with
+429, and queued requests that do not get a slot within the queue timeout get
+503 - both with a Retry-After estimate - instead of piling onto the event
+loop and Groq until everything times out together.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from backend.core.config import settings
+
+TEXT, IMAGE = "text", "image"
+
+
+class AdmissionRejected(Exception):
+    """Request shed by the admission controller."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int) -> None:
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """In-flight limit + bounded FIFO wait queue for one traffic class (one event loop)."""
+
+    def __init__(
+        self,
+        name: str,
+        max_in_flight: int,
+        max_queue: int,
+        queue_timeout: float = 2.0,
+    ) -> None:
+        self.name = name
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._lock = threading.Lock()
+        self._service_ewma = 1.0
+        self._stats = {
+            "admitted": 0,
+            "queued": 0,
+            "shed_queue_full": 0,
+            "shed_queue_timeout": 0,
+            "wait_ms_total": 0.0,
+            "wait_ms_max": 0.0,
+        }
+
+    async def acquire(self) -> float:
+        """Wait for a slot; returns seconds spent queued. Raises AdmissionRejected."""
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._in_flight += 1
+            self._count("admitted")
+            return 0.0
+
+        if len(self._waiters) >= self.max_queue:
+            self._count("shed_queue_full")
+            raise AdmissionRejected(
+                429, f"Too many {self.name} requests in progress. Please retry shortly.", self.retry_after()
+            )
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._count("queued")
+        started = time.monotonic()
+        try:
+            await asyncio.wait({waiter}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # slot was handed over as we were cancelled
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+        waited = time.monotonic() - started
+        if waiter.cancelled():
+            self._count("shed_queue_timeout")
+            raise AdmissionRejected(
+                503, f"Server is busy with {self.name} requests. Please retry shortly.", self.retry_after()
+            )
+
+        self._count("admitted")
+        with self._lock:
+            self._stats["wait_ms_total"] += waited * 1000
+            self._stats["wait_ms_max"] = max(self._stats["wait_ms_max"], waited * 1000)
+        return waited
+
+    def release(self, service_seconds: Optional[float] = None) -> None:
+        """Free a slot, handing it straight to the oldest waiter if there is one."""
+        if service_seconds is not None:
+            self._service_ewma = 0.8 * self._service_ewma + 0.2 * service_seconds
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._in_flight = max(0, self._in_flight - 1)
+
+    def retry_after(self) -> int:
+        """Seconds until the queue ahead is likely drained (at least 1)."""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._service_ewma * backlog / self.max_in_flight))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        admitted_after_wait = stats["queued"] - stats["shed_queue_timeout"]
+        return {
+            "in_flight": self._in_flight,
+            "queue_depth": len(self._waiters),
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout,
+            "admitted": stats["admitted"],
+            "queued": stats["queued"],
+            "shed": stats["shed_queue_full"] + stats["shed_queue_timeout"],
+            "shed_queue_full": stats["shed_queue_full"],
+            "shed_queue_timeout": stats["shed_queue_timeout"],
+            "avg_wait_ms": round(stats["wait_ms_total"] / admitted_after_wait, 1) if admitted_after_wait > 0 else 0.0,
+            "max_wait_ms": round(stats["wait_ms_max"], 1),
+            "avg_service_s": round(self._service_ewma, 3),
+        }
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+
+_CONTROLLERS: Dict[str, AdmissionController] = {}
+_CONTROLLERS_LOCK = threading.Lock()
+
+
+def get_controller(kind: str) -> AdmissionController:
+    """Controller for "text" or "image" traffic, built from settings on first use."""
+    kind = IMAGE if kind == IMAGE else TEXT
+    with _CONTROLLERS_LOCK:
+        controller = _CONTROLLERS.get(kind)
+        if controller is None:
+            if kind == IMAGE:
+                limits = (settings.ADMISSION_IMAGE_MAX_IN_FLIGHT, settings.ADMISSION_IMAGE_MAX_QUEUE)
+            else:
+                limits = (settings.ADMISSION_TEXT_MAX_IN_FLIGHT, settings.ADMISSION_TEXT_MAX_QUEUE)
+            controller = AdmissionController(
+                kind, *limits, queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS
+            )
+            _CONTROLLERS[kind] = controller
+        return controller
+
+
+def admission_stats() -> Dict[str, Any]:
+    """Per-class queue depth, wait times and shed counts, for /metrics/admission."""
+    with _CONTROLLERS_LOCK:
+        controllers = dict(_CONTROLLERS)
+    return {
+        "enabled": settings.ADMISSION_ENABLED,
+        "classes": {name: c.stats() for name, c in controllers.items()},
+    }
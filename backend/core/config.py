@@ -32,6 +32,168 @@ class Settings(BaseSettings):
     # Redis (optional - for persistent chat memory; falls back to in-memory if unset)
     REDIS_URL: str = ""
 
+    # FormatterAgent fast path when only one agent produced output:
+    # "llm" (always call the formatter model), "passthrough" (return as-is),
+    # "normalize" (cheap local markdown clean-up)
+    FORMATTER_FAST_PATH: str = "normalize"
+
+    # Semantic routing cache in front of the LLM router (MiniLM embeddings)
+    ROUTE_CACHE_ENABLED: bool = True
+    ROUTE_CACHE_THRESHOLD: float = 0.93
+    ROUTE_CACHE_MAX_ENTRIES: int = 2000
+    ROUTE_CACHE_TTL_SECONDS: int = 6 * 3600
+
+    # Semantic full-answer cache for text queries; backend "memory" or "redis"
+    # (redis shares exact-text hits across workers)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_BACKEND: str = "redis"
+    ANSWER_CACHE_THRESHOLD: float = 0.96
+    ANSWER_CACHE_MAX_ENTRIES: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 24 * 3600
+
+    # Coalesce identical concurrent requests/LLM calls (Redis lock across workers when REDIS_URL is set)
+    SINGLE_FLIGHT_ENABLED: bool = True
+
+    # Router mode: "llm" (always call the LLM router), "hybrid" (local intent
+    # classifier first, LLM only when it is not confident), "local" (classifier only)
+    ROUTER_MODE: str = "llm"
+    # Minimum cosine similarity to the best agent centroid before the classifier is trusted
+    INTENT_MIN_SIMILARITY: float = 0.35
+
+    # Pooled HTTP clients shared by every ChatGroq instance (HTTP/2 needs the optional 'h2' package)
+    LLM_HTTP2: bool = True
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE: int = 20
+    LLM_HTTP_KEEPALIVE_SECONDS: float = 30.0
+    LLM_HTTP_TIMEOUT_SECONDS: float = 60.0
+
+    # Image preprocessing before vision inference: EXIF orient/strip, downscale, re-encode
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_EDGE: int = 1280
+    IMAGE_FORMAT: str = "jpeg"  # "jpeg" or "webp"
+    IMAGE_QUALITY: int = 85
+
+    # Vision result cache keyed by preprocessed image bytes + prompt + model.
+    # Backend "memory", "redis" or "disk"; VISION_CACHE_PHASH also matches near-duplicate re-encodes
+    VISION_CACHE_ENABLED: bool = True
+    VISION_CACHE_BACKEND: str = "memory"
+    VISION_CACHE_MAX_ENTRIES: int = 500
+    VISION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    VISION_CACHE_DIR: str = ""  # disk backend; defaults to backend/data/vision_cache
+    VISION_CACHE_PHASH: bool = False
+    VISION_CACHE_PHASH_DISTANCE: int = 4
+
+    # Local image quality pre-screen before the vision call (NumPy, a few ms).
+    # Rejected photos get a retake hint instead of a paid vision call.
+    VISION_PRESCREEN_ENABLED: bool = True
+    VISION_MIN_EDGE: int = 160
+    VISION_MIN_LUMINANCE: float = 30.0
+    VISION_MAX_LUMINANCE: float = 240.0
+    VISION_MIN_CONTRAST: float = 6.0
+    VISION_MIN_SHARPNESS: float = 15.0
+
+    # Groq call resilience: full-jitter retries (Retry-After honoured) and a per-model circuit breaker
+    LLM_RETRY_ATTEMPTS: int = 3
+    LLM_RETRY_BASE_DELAY: float = 0.5
+    LLM_RETRY_MAX_DELAY: float = 8.0
+    LLM_RETRY_AFTER_MAX: float = 20.0
+    BREAKER_FAILURE_THRESHOLD: int = 5
+    BREAKER_RECOVERY_SECONDS: float = 30.0
+
+    # Groq rate-limit governor: per-model RPM/TPM token buckets shared via Redis (in-process
+    # fallback); calls wait locally for capacity instead of hitting 429s. A limit of 0 disables it.
+    # Off by default - the limits below are Groq's free tier (~2 requests/minute at ~5 calls each);
+    # set them to your account's tier before enabling
+    GOVERNOR_ENABLED: bool = False
+    GOVERNOR_TEXT_RPM: int = 30
+    GOVERNOR_TEXT_TPM: int = 12000
+    GOVERNOR_VISION_RPM: int = 30
+    GOVERNOR_VISION_TPM: int = 30000
+    GOVERNOR_FALLBACK_RPM: int = 30
+    GOVERNOR_FALLBACK_TPM: int = 6000
+    GOVERNOR_MAX_WAIT_SECONDS: float = 10.0
+    GOVERNOR_EST_OUTPUT_TOKENS: int = 400
+
+    # Request hedging for text/router calls: a duplicate fires once a call is slower than
+    # HEDGE_PERCENTILE of recent latencies; each call earns HEDGE_BUDGET_RATIO of a hedge
+    HEDGE_ENABLED: bool = False
+    HEDGE_PERCENTILE: float = 95.0
+    HEDGE_MIN_DELAY_SECONDS: float = 0.5
+    HEDGE_MIN_SAMPLES: int = 20
+    HEDGE_WINDOW: int = 200
+    HEDGE_BUDGET_RATIO: float = 0.1
+    HEDGE_BUDGET_BURST: float = 5.0
+
+    # Model cascade per call site (router, agent, formatter, rag): CASCADE_<SITE>_MODELS is a
+    # comma-separated list tried in order (empty = TEXT_MODEL_NAME, plus FALLBACK_TEXT_MODEL_NAME
+    # for router/formatter). The next model answers when one has its breaker open, is out of
+    # rate budget, keeps failing, or overruns CASCADE_<SITE>_BUDGET_SECONDS (0 = no budget).
+    CASCADE_ENABLED: bool = True
+    FALLBACK_TEXT_MODEL_NAME: str = "llama-3.1-8b-instant"
+    CASCADE_ROUTER_MODELS: str = ""
+    CASCADE_AGENT_MODELS: str = ""
+    CASCADE_FORMATTER_MODELS: str = ""
+    CASCADE_RAG_MODELS: str = ""
+    CASCADE_ROUTER_BUDGET_SECONDS: float = 3.0
+    CASCADE_AGENT_BUDGET_SECONDS: float = 0.0
+    CASCADE_FORMATTER_BUDGET_SECONDS: float = 6.0
+    CASCADE_RAG_BUDGET_SECONDS: float = 0.0
+
+    # Admission control for /ask: in-flight limit + short wait queue per traffic class.
+    # Beyond that requests get 429 (queue full) or 503 (queue wait timed out) with Retry-After.
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_TEXT_MAX_IN_FLIGHT: int = 32
+    ADMISSION_TEXT_MAX_QUEUE: int = 64
+    ADMISSION_IMAGE_MAX_IN_FLIGHT: int = 8
+    ADMISSION_IMAGE_MAX_QUEUE: int = 16
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0
+
+    # /ask/batch: bulk text queries share one admission slot and run BATCH_CONCURRENCY at a time.
+    # With GOVERNOR_ENABLED off, a batch also starts at most BATCH_QUERIES_PER_MINUTE queries
+    # (each is ~3-5 Groq calls; 6/min fits the free tier's 30 RPM). 0 disables the pacing.
+    BATCH_MAX_ITEMS: int = 500
+    BATCH_CONCURRENCY: int = 4
+    BATCH_QUERIES_PER_MINUTE: int = 6
+
+    # Async jobs (POST /jobs, GET /jobs/{id}): "memory" runs JOB_WORKERS tasks in the API process,
+    # "redis" queues on a Redis stream consumed by `python -m backend.worker` processes
+    JOB_BACKEND: str = "memory"
+    JOB_WORKERS: int = 4
+    JOB_MAX_PENDING: int = 1000
+    # Images wait on disk (memory backend) or in Redis, not in the job record; new image jobs
+    # get 503 once this many image bytes are pending
+    JOB_MAX_PENDING_IMAGE_BYTES: int = 256 * 1024 * 1024
+    JOB_TTL_SECONDS: int = 3600
+    JOB_DEADLINE_SECONDS: float = 120.0
+
+    # Interaction and feedback logs: append-only JSONL segments under backend/data/query_log/
+    # and backend/data/feedback_log/, a new segment
+    # past LOG_SEGMENT_MAX_BYTES or LOG_SEGMENT_MAX_SECONDS (0 disables either); oldest beyond
+    # LOG_MAX_SEGMENTS are deleted (0 keeps all). LOG_FSYNC: "always", "interval" or "never"
+    LOG_SEGMENT_MAX_BYTES: int = 5 * 1024 * 1024
+    LOG_SEGMENT_MAX_SECONDS: float = 86400.0
+    LOG_MAX_SEGMENTS: int = 30
+    LOG_FSYNC: str = "interval"
+    LOG_FSYNC_INTERVAL_SECONDS: float = 1.0
+
+    # Interaction/feedback records are queued and written by a background thread in batches of
+    # LOG_BATCH_SIZE or every LOG_FLUSH_INTERVAL_SECONDS. LOG_QUEUE_FULL_POLICY: "drop" or "block"
+    # (wait up to LOG_QUEUE_BLOCK_SECONDS); shutdown waits LOG_DRAIN_TIMEOUT_SECONDS for the queue
+    LOG_QUEUE_MAX_RECORDS: int = 10000
+    LOG_BATCH_SIZE: int = 200
+    LOG_FLUSH_INTERVAL_SECONDS: float = 1.0
+    LOG_QUEUE_FULL_POLICY: str = "drop"
+    LOG_QUEUE_BLOCK_SECONDS: float = 0.5
+    LOG_DRAIN_TIMEOUT_SECONDS: float = 10.0
+
+    # Per-endpoint request deadlines in seconds (0 disables); see core.deadline
+    DEADLINE_TEXT_SECONDS: float = 25.0
+    DEADLINE_IMAGE_SECONDS: float = 40.0
+    DEADLINE_CHAT_SECONDS: float = 40.0
+    DEADLINE_STREAM_SECONDS: float = 60.0
+    # Time kept for the formatter; with less left the LLM formatting pass is skipped
+    DEADLINE_FORMATTER_RESERVE_SECONDS: float = 4.0
+
     DEBUG: bool = False
 
     model_config = SettingsConfigDict(
@@ -0,0 +1,109 @@
+"""
+End-to-end request deadlines.
+
+Each /ask endpoint opens a deadline_scope(); the absolute deadline lives in a
+contextvar, so it follows the request into asyncio tasks and to_thread calls
+without being threaded through every signature. The router, the agents'
+Groq calls (via the resilience layer) and the formatter read remaining()
+before starting work and bound their awaits with it.
+"""
+from __future__ import annotations
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Absolute time.monotonic() deadline of the current request, None = unbounded
+_DEADLINE: ContextVar[Optional[float]] = ContextVar("agrigpt_deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's time budget ran out before a stage could finish."""
+
+    def __init__(self, stage: str = "") -> None:
+        super().__init__(f"Deadline exceeded{f' during {stage}' if stage else ''}")
+        self.stage = stage
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]) -> Iterator[Optional[float]]:
+    """
+    Run the block under a deadline `seconds` from now (None / <= 0 disables).
+    Nested scopes can only tighten an enclosing deadline, never extend it.
+    """
+    current = _DEADLINE.get()
+    deadline = current
+    if seconds is not None and seconds > 0:
+        candidate = time.monotonic() + float(seconds)
+        deadline = candidate if current is None else min(current, candidate)
+    token = _DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _DEADLINE.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left (may be negative), or None when no deadline is set."""
+    deadline = _DEADLINE.get()
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def has_time(seconds: float) -> bool:
+    """True when at least `seconds` are left (always True without a deadline)."""
+    left = remaining()
+    return left is None or left >= seconds
+
+
+def check(stage: str = "") -> None:
+    if expired():
+        raise DeadlineExceeded(stage)
+
+
+async def await_within(aw: Awaitable[T], stage: str = "", reserve: float = 0.0) -> T:
+    """
+    Await aw, cancelling it when the deadline (minus `reserve` seconds kept
+    for later stages) passes. Raises DeadlineExceeded in that case.
+    """
+    left = remaining()
+    if left is None:
+        return await aw
+    budget = left - reserve
+    if budget <= 0:
+        _close(aw)
+        raise DeadlineExceeded(stage)
+    timeout = asyncio.timeout(budget)
+    try:
+        async with timeout:
+            return await aw
+    except TimeoutError:
+        # A timeout raised by the awaited call itself is not ours to rename
+        if timeout.expired():
+            raise DeadlineExceeded(stage) from None
+        raise
+
+
+def record_cut(trace: Optional[Dict[str, Any]], stage: str) -> None:
+    """Note a stage dropped for the deadline in trace["cut_stages"] (reported to the client)."""
+    if isinstance(trace, dict):
+        cut = trace.setdefault("cut_stages", [])
+        if stage not in cut:
+            cut.append(stage)
+
+
+def _close(aw: Any) -> None:
+    """Avoid 'coroutine was never awaited' warnings for skipped stages."""
+    close = getattr(aw, "close", None)
+    if callable(close):
+        close()
@@ -0,0 +1,202 @@
+"""
+Hedged requests for latency-critical Groq text calls.
+
+Groq latency has a long tail and the formatter waits for the slowest agent.
+A hedged call fires a duplicate once the first has been outstanding longer
+than HEDGE_PERCENTILE of recent latencies for the same call site; the first
+response wins and the other is cancelled. A token-bucket budget (every call
+earns HEDGE_BUDGET_RATIO of a hedge) keeps the extra token spend bounded,
+and a duplicate is only sent when the model's rate-limit governor can
+reserve capacity for it right away.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, TypeVar
+
+from backend.core.config import settings
+from backend.core.rate_governor import get_governor
+
+T = TypeVar("T")
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies (seconds)."""
+
+    def __init__(self, window: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=max(1, window))
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Nearest-rank percentile; None while the window is empty."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        rank = math.ceil(max(0.0, min(100.0, pct)) / 100.0 * len(samples))
+        return samples[max(0, rank - 1)]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._samples)
+
+
+class HedgeBudget:
+    """Each call earns `ratio` tokens (capped at `burst`); a hedge spends one."""
+
+    def __init__(self, ratio: float = 0.1, burst: float = 5.0) -> None:
+        self.ratio = max(0.0, ratio)
+        self.burst = max(1.0, burst)
+        self._tokens = self.burst
+        self._lock = threading.Lock()
+
+    def earn(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    def refund(self) -> None:
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + 1.0)
+
+    @property
+    def tokens(self) -> float:
+        with self._lock:
+            return self._tokens
+
+
+_TRACKERS: Dict[str, LatencyTracker] = {}
+_BUDGET: Optional[HedgeBudget] = None
+_LOCK = threading.Lock()
+_STATS = {"calls": 0, "hedged": 0, "hedge_wins": 0, "budget_denied": 0, "rate_denied": 0}
+
+
+def _get_tracker(name: str) -> LatencyTracker:
+    with _LOCK:
+        tracker = _TRACKERS.get(name)
+        if tracker is None:
+            tracker = LatencyTracker(settings.HEDGE_WINDOW)
+            _TRACKERS[name] = tracker
+        return tracker
+
+
+def _get_budget() -> HedgeBudget:
+    global _BUDGET
+    with _LOCK:
+        if _BUDGET is None:
+            _BUDGET = HedgeBudget(settings.HEDGE_BUDGET_RATIO, settings.HEDGE_BUDGET_BURST)
+        return _BUDGET
+
+
+def _count(key: str) -> None:
+    with _LOCK:
+        _STATS[key] += 1
+
+
+def hedge_delay(tracker: LatencyTracker) -> Optional[float]:
+    """Seconds to wait before hedging; None until enough samples are in."""
+    if len(tracker) < settings.HEDGE_MIN_SAMPLES:
+        return None
+    value = tracker.percentile(settings.HEDGE_PERCENTILE)
+    if value is None:
+        return None
+    return max(settings.HEDGE_MIN_DELAY_SECONDS, value)
+
+
+async def ahedged(
+    fn: Callable[[], Awaitable[T]],
+    name: str,
+    model: Optional[str] = None,
+    cost_tokens: int = 0,
+) -> T:
+    """
+    Await fn(), firing a second fn() if the first is slower than the hedge
+    delay for `name` and the budget allows. With `model`, the duplicate also
+    needs a governor reservation of `cost_tokens` that is free without
+    queueing, otherwise it is skipped. The first success wins; the other
+    call is cancelled. Errors surface only when every call failed.
+    """
+    if not settings.HEDGE_ENABLED:
+        return await fn()
+
+    tracker = _get_tracker(name)
+    budget = _get_budget()
+    budget.earn()
+    _count("calls")
+
+    delay = hedge_delay(tracker)
+    started = time.perf_counter()
+    tasks: List[asyncio.Task] = [asyncio.ensure_future(fn())]
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                if not budget.try_spend():
+                    _count("budget_denied")
+                elif model and not await get_governor(model).atry_reserve(cost_tokens):
+                    budget.refund()
+                    _count("rate_denied")
+                else:
+                    _count("hedged")
+                    tasks.append(asyncio.ensure_future(fn()))
+        winner = await _first_success(tasks)
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    tracker.record(time.perf_counter() - started)
+    if len(tasks) > 1 and winner is tasks[1]:
+        _count("hedge_wins")
+    return winner.result()
+
+
+async def _first_success(tasks: List[asyncio.Task]) -> asyncio.Task:
+    pending = set(tasks)
+    while True:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is None:
+                return task
+        if not pending:
+            return done.pop()  # all failed; result() re-raises the error
+
+
+def hedge_stats() -> Dict[str, Any]:
+    """Hedge counters, remaining budget and the current delay per call site."""
+    with _LOCK:
+        stats = dict(_STATS)
+        trackers = dict(_TRACKERS)
+    return {
+        "enabled": settings.HEDGE_ENABLED,
+        "percentile": settings.HEDGE_PERCENTILE,
+        **stats,
+        "budget_tokens": round(_get_budget().tokens, 2),
+        "call_sites": {
+            name: {
+                "samples": len(t),
+                "p50_ms": _ms(t.percentile(50)),
+                "p99_ms": _ms(t.percentile(99)),
+                "hedge_delay_ms": _ms(hedge_delay(t)),
+            }
+            for name, t in trackers.items()
+        },
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[int]:
+    return int(seconds * 1000) if seconds is not None else None
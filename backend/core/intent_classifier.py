@@ -0,0 +1,130 @@
+"""
+Local intent classifier - zero-cost pre-router over MiniLM embeddings.
+
+Nearest-centroid model trained from AGENT_DESCRIPTIONS plus the per-agent
+queries the LLM router decided in the interaction log - never its own past
+decisions or cache hits, so its mistakes are not fed back into it. Class probabilities
+(softmax over cosine similarities) are scaled to 0-100 so they plug into
+the same PRIMARY/SECONDARY score thresholds as the LLM router.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.core.router_schema import AgentScore, RouterOutput
+from backend.core.semantic_cache import normalize_text
+
+# Canned agent queries that say nothing about intent
+_IGNORED_QUERIES = {"", "image-based symptom observation", "image-based diagnosis"}
+
+
+def build_training_samples(
+    descriptions: Iterable[dict],
+    interactions: Iterable[dict],
+    agents: Iterable[str],
+    max_per_agent: int = 200,
+) -> Dict[str, List[str]]:
+    """
+    Collect labelled texts per agent: the router description first, then the
+    most recent distinct logged queries the LLM router sent to that agent.
+    Trace records carry "router_source"; older per-agent entries without a
+    "routing_mode" predate the local classifier and were all LLM-routed.
+    """
+    allowed = set(agents)
+    samples: Dict[str, List[str]] = {name: [] for name in allowed}
+    for d in descriptions:
+        name = d.get("name")
+        if name in samples and d.get("description"):
+            samples[name].append(str(d["description"]))
+
+    seen: Dict[str, set] = {name: set() for name in allowed}
+    for entry in reversed(list(interactions)):
+        agent = entry.get("agent")
+        if agent not in allowed or entry.get("type") == "image":
+            continue
+        if "routing_mode" in entry and entry.get("router_source") != "llm":
+            continue
+        query = normalize_text(entry.get("query", ""))
+        if query in _IGNORED_QUERIES or query in seen[agent]:
+            continue
+        if len(seen[agent]) >= max_per_agent:
+            continue
+        seen[agent].add(query)
+        samples[agent].append(query)
+
+    return {name: texts for name, texts in samples.items() if texts}
+
+
+class IntentClassifier:
+    """Nearest-centroid classifier over unit-length sentence embeddings."""
+
+    def __init__(
+        self,
+        embed_documents: Callable[[List[str]], Sequence[Sequence[float]]],
+        temperature: float = 0.05,
+    ) -> None:
+        self._embed_documents = embed_documents
+        self.temperature = temperature
+        self._lock = threading.Lock()
+        self._labels: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+        self._sample_counts: Dict[str, int] = {}
+
+    @staticmethod
+    def _unit(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    @property
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    def fit(self, samples: Dict[str, List[str]]) -> None:
+        labels = sorted(name for name, texts in samples.items() if texts)
+        if not labels:
+            raise ValueError("No training samples for intent classifier")
+
+        centroids = []
+        for name in labels:
+            vectors = self._unit(np.asarray(self._embed_documents(samples[name]), dtype=np.float32))
+            centroids.append(vectors.mean(axis=0))
+
+        with self._lock:
+            self._labels = labels
+            self._centroids = self._unit(np.stack(centroids))
+            self._sample_counts = {name: len(samples[name]) for name in labels}
+
+    def classify(self, query: str) -> Tuple[RouterOutput, float]:
+        """
+        Score every agent for the query.
+        Returns (RouterOutput with 0-100 scores, best raw cosine similarity).
+        """
+        with self._lock:
+            labels, centroids = self._labels, self._centroids
+        if centroids is None:
+            raise RuntimeError("Intent classifier is not fitted")
+
+        vector = self._unit(np.asarray(self._embed_documents([normalize_text(query)]), dtype=np.float32))[0]
+        sims = centroids @ vector
+        logits = (sims - sims.max()) / self.temperature
+        probs = np.exp(logits)
+        probs /= probs.sum()
+
+        agents = [
+            AgentScore(agent=label, score=int(round(100 * float(p))))
+            for label, p in sorted(zip(labels, probs), key=lambda x: x[1], reverse=True)
+        ]
+        return RouterOutput(agents=agents), float(sims.max())
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "ready": self._centroids is not None,
+                "labels": list(self._labels),
+                "samples": dict(self._sample_counts),
+                "temperature": self.temperature,
+            }
@@ -0,0 +1,343 @@
+"""
+Job queue for asynchronous requests (POST /jobs, GET /jobs/{id}).
+
+Multimodal requests with several agents can outlive the load balancer's idle
+timeout, so clients submit a job and poll it instead. Two backends share one
+interface:
+
+- memory: an asyncio queue drained by JOB_WORKERS tasks inside the API
+  process (single instance, tests, or Redis unreachable).
+- redis: jobs go onto a Redis stream read by a consumer group of worker
+  processes (`python -m backend.worker`), so the API tier and the LLM tier
+  scale independently. Job records live in Redis with a TTL.
+
+A job record is a plain dict: job_id, request_id, status, timestamps, the
+request (query, session_id, mode), "agents" once routed, "partial" agent
+results as they finish, then "result" (the /ask payload) or "error". After
+submission the worker running the job is its only writer.
+
+Uploaded images are kept by reference, never in the job record or stream
+entry: the memory backend spools them to data/job_images/, the redis backend
+stores them under their own key with the job TTL. Both refuse new image jobs
+once JOB_MAX_PENDING_IMAGE_BYTES of images are waiting.
+"""
+from __future__ import annotations
+
+import asyncio
+import base64
+import json
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from backend.core.config import settings
+from backend.core.redis_client import get_redis
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = "queued", "running", "succeeded", "failed"
+
+_STREAM = "agrigpt:jobs"
+_GROUP = "agrigpt-workers"
+_JOB_PREFIX = "agrigpt:job:"
+_IMAGE_BYTES_KEY = "agrigpt:jobs:image_bytes"
+
+IMAGE_DIR = Path(__file__).resolve().parent.parent / "data" / "job_images"
+
+# runner(queue, job, image bytes or None): executes a job, saving progress through the queue
+JobRunner = Callable[[Any, Dict[str, Any], Optional[bytes]], Awaitable[None]]
+
+
+class QueueFull(Exception):
+    """Too many jobs (or too many image bytes) are waiting; the client should retry later."""
+
+
+def new_job(query: str, session_id: Optional[str], has_image: bool) -> Dict[str, Any]:
+    return {
+        "job_id": uuid.uuid4().hex,
+        "request_id": str(uuid.uuid4()),
+        "status": QUEUED,
+        "mode": "multimodal" if has_image else "text_only",
+        "query": query,
+        "session_id": session_id,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+        "agents": [],
+        "partial": [],
+        "result": None,
+        "error": None,
+    }
+
+
+class MemoryJobQueue:
+    """In-process queue + JOB_WORKERS consumer tasks on the running event loop."""
+
+    backend = "memory"
+
+    def __init__(
+        self,
+        workers: int,
+        max_pending: int,
+        ttl: float,
+        runner: Optional[JobRunner] = None,
+        max_image_bytes: int = 256 * 1024 * 1024,
+        image_dir: Path = IMAGE_DIR,
+    ) -> None:
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.ttl = ttl
+        self.runner = runner
+        self.max_image_bytes = max_image_bytes
+        self.image_dir = Path(image_dir)
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        # job_id -> size of its spooled image, until a worker picks the job up
+        self._images: Dict[str, int] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def submit(self, job: Dict[str, Any], image: Optional[bytes] = None) -> None:
+        queue = self._ensure_workers()
+        self._prune()
+        if queue.qsize() >= self.max_pending:
+            raise QueueFull()
+        if image is not None:
+            if self.pending_image_bytes + len(image) > self.max_image_bytes:
+                raise QueueFull()
+            await asyncio.to_thread(self._write_image, job["job_id"], bytes(image))
+            self._images[job["job_id"]] = len(image)
+        self._jobs[job["job_id"]] = job
+        queue.put_nowait(job["job_id"])
+
+    @property
+    def pending_image_bytes(self) -> int:
+        return sum(self._images.values())
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return json.loads(json.dumps(job)) if job is not None else None
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["job_id"]] = job
+
+    def stats(self) -> Dict[str, Any]:
+        statuses = [j["status"] for j in self._jobs.values()]
+        return {
+            "backend": self.backend,
+            "workers": len([t for t in self._tasks if not t.done()]),
+            "pending": self._queue.qsize() if self._queue is not None else 0,
+            "pending_image_bytes": self.pending_image_bytes,
+            **{s: statuses.count(s) for s in (QUEUED, RUNNING, SUCCEEDED, FAILED)},
+        }
+
+    async def aclose(self) -> None:
+        tasks, self._tasks = self._tasks, []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for job_id in list(self._images):
+            self._take_image(job_id)
+
+    def _ensure_workers(self) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._queue is None:
+            # asyncio queues are loop-bound; the server runs one loop, tests may run several
+            self._loop, self._queue, self._tasks = loop, asyncio.Queue(), []
+        if self.runner is None:
+            from backend.worker import run_job  # pulls in the agent pipeline
+            self.runner = run_job
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(loop.create_task(self._consume()))
+        return self._queue
+
+    async def _consume(self) -> None:
+        queue = self._queue
+        while True:
+            job_id = await queue.get()
+            job = self._jobs.get(job_id)
+            image = await asyncio.to_thread(self._take_image, job_id) if job_id in self._images else None
+            if job is None:
+                continue
+            try:
+                await self.runner(self, job, image)
+            except Exception as e:
+                print(f"[JOBS] Job {job_id} crashed: {e}")
+
+    def _image_path(self, job_id: str) -> Path:
+        return self.image_dir / f"{job_id}.img"
+
+    def _write_image(self, job_id: str, image: bytes) -> None:
+        self.image_dir.mkdir(parents=True, exist_ok=True)
+        self._image_path(job_id).write_bytes(image)
+
+    def _take_image(self, job_id: str) -> Optional[bytes]:
+        """Read and delete a spooled image."""
+        self._images.pop(job_id, None)
+        path = self._image_path(job_id)
+        try:
+            return path.read_bytes()
+        except OSError:
+            return None
+        finally:
+            path.unlink(missing_ok=True)
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job_id in [k for k, j in self._jobs.items() if (j.get("finished_at") or time.time()) < cutoff]:
+            self._jobs.pop(job_id, None)
+
+
+class RedisJobQueue:
+    """Jobs on a Redis stream (consumer group) with JSON records under agrigpt:job:<id>."""
+
+    backend = "redis"
+
+    def __init__(self, redis: Any, max_pending: int, ttl: float, max_image_bytes: int = 256 * 1024 * 1024) -> None:
+        self.redis = redis
+        self.max_pending = max(1, max_pending)
+        self.ttl = max(1, int(ttl))
+        self.max_image_bytes = max_image_bytes
+        self._last_reclaim = 0.0
+        # stream entry id -> image size, for claimed entries until they are acknowledged
+        self._claimed_images: Dict[str, int] = {}
+
+    # --- API side ---
+
+    async def submit(self, job: Dict[str, Any], image: Optional[bytes] = None) -> None:
+        await asyncio.to_thread(self._submit, job, image)
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.get_sync, job_id)
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        await asyncio.to_thread(self._save, job)
+
+    def get_sync(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.redis.get(_JOB_PREFIX + job_id)
+        return json.loads(raw) if raw else None
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            pending = int(self.redis.xlen(_STREAM))
+        except Exception:
+            pending = None
+        try:
+            image_bytes = int(self.redis.get(_IMAGE_BYTES_KEY) or 0)
+        except Exception:
+            image_bytes = None
+        return {"backend": self.backend, "pending": pending, "pending_image_bytes": image_bytes}
+
+    async def aclose(self) -> None:
+        return None
+
+    def _submit(self, job: Dict[str, Any], image: Optional[bytes]) -> None:
+        if int(self.redis.xlen(_STREAM)) >= self.max_pending:
+            raise QueueFull()
+        size = len(image) if image is not None else 0
+        if size and int(self.redis.get(_IMAGE_BYTES_KEY) or 0) + size > self.max_image_bytes:
+            raise QueueFull()
+        key = _JOB_PREFIX + job["job_id"]
+        pipe = self.redis.pipeline()
+        pipe.set(key, json.dumps(job, ensure_ascii=False), ex=self.ttl)
+        if image is not None:
+            pipe.set(key + ":image", base64.b64encode(bytes(image)).decode("ascii"), ex=self.ttl)
+            pipe.incrby(_IMAGE_BYTES_KEY, size)
+            # the counter expires with the images it counts if workers never acknowledge them
+            pipe.expire(_IMAGE_BYTES_KEY, self.ttl)
+        pipe.xadd(_STREAM, {"job_id": job["job_id"], "image_bytes": size})
+        pipe.execute()
+
+    def _save(self, job: Dict[str, Any]) -> None:
+        self.redis.set(_JOB_PREFIX + job["job_id"], json.dumps(job, ensure_ascii=False), ex=self.ttl)
+
+    # --- worker side ---
+
+    def ensure_group(self) -> None:
+        try:
+            self.redis.xgroup_create(_STREAM, _GROUP, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def claim(
+        self, consumer: str, block_ms: int = 5000, reclaim_idle_ms: int = 0
+    ) -> Optional[Tuple[str, Dict[str, Any], Optional[bytes]]]:
+        """
+        Next job for `consumer` as (entry id, job, image). Entries a crashed
+        worker left unacknowledged for reclaim_idle_ms are taken over first.
+        """
+        entry = None
+        if reclaim_idle_ms > 0 and time.monotonic() - self._last_reclaim > 30:
+            self._last_reclaim = time.monotonic()
+            claimed = self.redis.xautoclaim(_STREAM, _GROUP, consumer, reclaim_idle_ms, "0-0", count=1)
+            if claimed and len(claimed) > 1 and claimed[1]:
+                entry = claimed[1][0]
+        if entry is None:
+            response = self.redis.xreadgroup(_GROUP, consumer, {_STREAM: ">"}, count=1, block=block_ms)
+            if not response or not response[0][1]:
+                return None
+            entry = response[0][1][0]
+
+        entry_id, fields = entry
+        job_id = fields.get("job_id", "")
+        self._claimed_images[entry_id] = int(fields.get("image_bytes") or 0)
+        job = self.get_sync(job_id)
+        if job is None:  # expired before a worker got to it
+            self.ack(entry_id, job_id)
+            return None
+        raw_image = self.redis.get(_JOB_PREFIX + job_id + ":image")
+        return entry_id, job, base64.b64decode(raw_image) if raw_image else None
+
+    def ack(self, entry_id: str, job_id: str) -> None:
+        size = self._claimed_images.pop(entry_id, 0)
+        pipe = self.redis.pipeline()
+        pipe.xack(_STREAM, _GROUP, entry_id)
+        pipe.xdel(_STREAM, entry_id)
+        pipe.delete(_JOB_PREFIX + job_id + ":image")
+        if size:
+            pipe.decrby(_IMAGE_BYTES_KEY, size)
+        results = pipe.execute()
+        if size and int(results[-1]) < 0:  # the counter expired while this image was pending
+            self.redis.set(_IMAGE_BYTES_KEY, 0, ex=self.ttl)
+
+
+_QUEUE: Optional[Any] = None
+_QUEUE_LOCK = threading.Lock()
+
+
+def get_job_queue() -> Any:
+    """Queue for JOB_BACKEND ("memory" or "redis"; redis falls back to memory when unreachable)."""
+    global _QUEUE
+    with _QUEUE_LOCK:
+        if _QUEUE is None:
+            r = get_redis() if settings.JOB_BACKEND == "redis" else None
+            if r is not None:
+                _QUEUE = RedisJobQueue(
+                    r, settings.JOB_MAX_PENDING, settings.JOB_TTL_SECONDS,
+                    max_image_bytes=settings.JOB_MAX_PENDING_IMAGE_BYTES,
+                )
+            else:
+                if settings.JOB_BACKEND == "redis":
+                    print("[JOBS] Redis unavailable, running jobs in-process")
+                _QUEUE = MemoryJobQueue(
+                    settings.JOB_WORKERS, settings.JOB_MAX_PENDING, settings.JOB_TTL_SECONDS,
+                    max_image_bytes=settings.JOB_MAX_PENDING_IMAGE_BYTES,
+                )
+        return _QUEUE
+
+
+def job_stats() -> Dict[str, Any]:
+    """Queue backend and depth, for /health."""
+    with _QUEUE_LOCK:
+        queue = _QUEUE
+    return queue.stats() if queue is not None else {"backend": settings.JOB_BACKEND, "pending": 0}
+
+
+async def aclose_job_queue() -> None:
+    """Stop in-process workers (FastAPI shutdown)."""
+    with _QUEUE_LOCK:
+        queue = _QUEUE
+    if queue is not None:
+        await queue.aclose()
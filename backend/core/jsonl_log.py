@@ -0,0 +1,198 @@
+"""
+Append-only JSONL log split into time-stamped segments.
+
+Each record is one JSON line appended with a single O_APPEND write, so a
+write is O(1) and concurrent writers (threads or processes) never rewrite
+each other's data. Segments are named <prefix>-<UTC start stamp>.jsonl; the
+newest one is active and a new segment starts once it exceeds max_bytes or
+max_age seconds. Rotation never renames files, so other processes simply
+move on to the newest segment. Readers go through the segments in name
+order, which is also time order, and skip torn lines.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER = "always", "interval", "never"
+
+_STAMP_FORMAT = "%Y%m%dT%H%M%S%fZ"
+# How often a writer looks for a newer segment started by another process
+_RESCAN_SECONDS = 5.0
+
+
+class JsonlLog:
+    """Segmented append-only JSONL log in one directory."""
+
+    def __init__(
+        self,
+        directory: Path,
+        prefix: str,
+        max_bytes: int = 5 * 1024 * 1024,
+        max_age: float = 86400.0,
+        max_segments: int = 0,
+        fsync: str = FSYNC_INTERVAL,
+        fsync_interval: float = 1.0,
+    ) -> None:
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.max_segments = max_segments
+        self.fsync = fsync if fsync in (FSYNC_ALWAYS, FSYNC_INTERVAL, FSYNC_NEVER) else FSYNC_INTERVAL
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._fd: Optional[int] = None
+        self._path: Optional[Path] = None
+        self._started = 0.0
+        self._scanned = 0.0
+        self._synced = 0.0
+
+    # --- writing ---
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        self.append_many([entry])
+
+    def append_many(self, entries: Iterable[Dict[str, Any]]) -> None:
+        """Append records as one write (one line each)."""
+        data = "".join(json.dumps(e, ensure_ascii=False) + "\n" for e in entries).encode("utf-8")
+        if not data:
+            return
+        with self._lock:
+            fd = self._writable()
+            os.write(fd, data)
+            now = time.monotonic()
+            if self.fsync == FSYNC_ALWAYS or (
+                self.fsync == FSYNC_INTERVAL and now - self._synced >= self.fsync_interval
+            ):
+                os.fsync(fd)
+                self._synced = now
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+    def _writable(self) -> int:
+        now = time.time()
+        if self._fd is not None and now - self._scanned >= _RESCAN_SECONDS:
+            self._scanned = now
+            newest = self._newest_segment()
+            if newest is not None and newest != self._path:
+                self._close()  # another process rotated
+        if self._fd is not None:
+            too_big = self.max_bytes > 0 and os.fstat(self._fd).st_size >= self.max_bytes
+            too_old = self.max_age > 0 and now - self._started >= self.max_age
+            if too_big or too_old:
+                self._close()
+                self._open(self._segment_path(now))
+                self._prune()
+        if self._fd is None:
+            newest = self._newest_segment()
+            if newest is None:
+                self._open(self._segment_path(now))
+            else:
+                self._open(newest)
+                return self._writable()  # the newest segment may itself be due for rotation
+        return self._fd
+
+    def _open(self, path: Path) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._fd = os.open(str(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._path = path
+        started = self.segment_start(path)
+        self._started = started.timestamp() if started else time.time()
+        self._scanned = time.time()
+
+    def _close(self) -> None:
+        if self._fd is not None:
+            try:
+                if self.fsync != FSYNC_NEVER:
+                    os.fsync(self._fd)
+            finally:
+                os.close(self._fd)
+        self._fd = None
+        self._path = None
+
+    def _segment_path(self, now: float) -> Path:
+        return self.segment_path(datetime.utcfromtimestamp(now))
+
+    def segment_path(self, started: datetime) -> Path:
+        """Path of the segment starting at `started` (naive UTC)."""
+        return self.directory / f"{self.prefix}-{started.strftime(_STAMP_FORMAT)}.jsonl"
+
+    def segment_start(self, path: Path) -> Optional[datetime]:
+        """Start time encoded in a segment's name (None if it is not one)."""
+        return _segment_start(path, self.prefix)
+
+    def _prune(self) -> None:
+        if self.max_segments <= 0:
+            return
+        for old in self.segments()[:-self.max_segments]:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+    def _newest_segment(self) -> Optional[Path]:
+        segments = self.segments()
+        return segments[-1] if segments else None
+
+    # --- reading ---
+
+    def segments(self) -> List[Path]:
+        """Segment files, oldest first."""
+        if not self.directory.exists():
+            return []
+        return sorted(p for p in self.directory.glob(f"{self.prefix}-*.jsonl") if p.is_file())
+
+    def read(self, since: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        All records, oldest first. With `since` (naive UTC), segments that
+        ended before it are skipped; records inside a segment are not filtered.
+        """
+        segments = self.segments()
+        if since is not None:
+            starts = [self.segment_start(p) for p in segments]
+            keep = []
+            for i, path in enumerate(segments):
+                next_start = starts[i + 1] if i + 1 < len(starts) else None
+                if next_start is None or next_start >= since:
+                    keep.append(path)
+            segments = keep
+        records: List[Dict[str, Any]] = []
+        for path in segments:
+            records.extend(read_jsonl(path))
+        return records
+
+
+def read_jsonl(path: Path) -> List[Dict[str, Any]]:
+    """Records of one JSONL file; blank, torn or non-object lines are skipped."""
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(record, dict):
+                    records.append(record)
+    except OSError:
+        return []
+    return records
+
+
+def _segment_start(path: Path, prefix: str) -> Optional[datetime]:
+    stamp = path.stem[len(prefix) + 1:]
+    try:
+        return datetime.strptime(stamp, _STAMP_FORMAT)
+    except ValueError:
+        return None
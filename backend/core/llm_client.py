@@ -1,13 +1,267 @@
+"""
+Process-wide LLM client registry.
+
+ChatGroq instances are cached per (model, temperature, max_tokens) and, with
+the raw Groq SDK clients used for vision, share one configured httpx pool, so keep-alive connections and TLS
+sessions survive across calls. Async pools are bound to the event loop that
+created them (httpx connections cannot move between loops), so the registry
+keeps one set per running loop; the server has exactly one. Sync wrappers
+run their coroutine through run_sync(), which closes the throwaway loop's
+pool before the loop exits.
+
+Each text call site (router, agents, formatter, subsidy RAG chain) also has
+a model cascade: an ordered model list and a latency budget, configured via
+CASCADE_<SITE>_MODELS / CASCADE_<SITE>_BUDGET_SECONDS and executed by
+core.resilience.acall_with_cascade.
+"""
 from __future__ import annotations
+
+import asyncio
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Any, Awaitable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+from groq import AsyncGroq, Groq
 from langchain_groq import ChatGroq
+
 from backend.core.config import settings
 
+LLMKey = Tuple[str, float, int]
+T = TypeVar("T")
+
+
+class _NoLoop:
+    """Registry bucket for clients created outside a running event loop."""
+
+
+_NO_LOOP = _NoLoop()
+
+_lock = threading.Lock()
+_sync_http: Optional[httpx.Client] = None
+_async_http: "weakref.WeakKeyDictionary[Any, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_llms: "weakref.WeakKeyDictionary[Any, Dict[LLMKey, ChatGroq]]" = weakref.WeakKeyDictionary()
+_groq_sync: Optional[Groq] = None
+_groq_async: "weakref.WeakKeyDictionary[Any, AsyncGroq]" = weakref.WeakKeyDictionary()
+_stats = {"llm_created": 0, "llm_reused": 0, "http_pools_created": 0, "groq_clients_created": 0}
+
+# Raw Groq SDK clients (vision) keep the previous per-request timeout
+GROQ_SDK_TIMEOUT_SECONDS = 30
+
+
+def http2_enabled() -> bool:
+    """HTTP/2 when requested and the optional 'h2' package is installed."""
+    if not settings.LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
 
-def get_llm() -> ChatGroq:
 
-    return ChatGroq(
-        api_key=settings.GROQ_API_KEY,
-        model=settings.TEXT_MODEL_NAME,
-        temperature=0.2,
-        max_tokens=1500,
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_SECONDS,
     )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(settings.LLM_HTTP_TIMEOUT_SECONDS, connect=5.0)
+
+
+def _loop_bucket() -> Any:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return _NO_LOOP
+
+
+def get_http_client() -> httpx.Client:
+    """Shared blocking HTTP pool (thread-safe, loop independent)."""
+    global _sync_http
+    with _lock:
+        if _sync_http is None:
+            _sync_http = httpx.Client(limits=_limits(), timeout=_timeout(), http2=http2_enabled())
+            _stats["http_pools_created"] += 1
+        return _sync_http
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Shared async HTTP pool for the current event loop."""
+    bucket = _loop_bucket()
+    with _lock:
+        client = _async_http.get(bucket)
+        if client is None:
+            client = httpx.AsyncClient(limits=_limits(), timeout=_timeout(), http2=http2_enabled())
+            _async_http[bucket] = client
+            _stats["http_pools_created"] += 1
+        return client
+
+
+def get_llm(
+    model: Optional[str] = None,
+    temperature: float = 0.2,
+    max_tokens: int = 1500,
+) -> ChatGroq:
+    """Return the pooled ChatGroq for (model, temperature, max_tokens)."""
+    key: LLMKey = (model or settings.TEXT_MODEL_NAME, float(temperature), int(max_tokens))
+    http_client = get_http_client()
+    http_async_client = get_async_http_client()
+    bucket = _loop_bucket()
+
+    with _lock:
+        clients = _llms.setdefault(bucket, {})
+        llm = clients.get(key)
+        if llm is not None:
+            _stats["llm_reused"] += 1
+            return llm
+
+        llm = ChatGroq(
+            api_key=settings.GROQ_API_KEY,
+            model=key[0],
+            temperature=key[1],
+            max_tokens=key[2],
+            http_client=http_client,
+            http_async_client=http_async_client,
+            max_retries=0,  # retries/backoff live in core.resilience
+        )
+        clients[key] = llm
+        _stats["llm_created"] += 1
+        return llm
+
+
+# --- model cascades ---
+
+ROUTER, AGENT, FORMATTER, RAG = "router", "agent", "formatter", "rag"
+
+# Sites whose output is structural (scores, merged markdown) rather than agronomic
+# advice, so a small model is an acceptable stand-in by default
+_DEFAULT_FALLBACK_SITES = (ROUTER, FORMATTER)
+
+
+@dataclass(frozen=True)
+class ModelCascade:
+    """Ordered models for one call site; all but the last are bounded by latency_budget."""
+    site: str
+    models: Tuple[str, ...]
+    latency_budget: Optional[float] = None
+
+    @property
+    def primary(self) -> str:
+        return self.models[0]
+
+
+def get_cascade(site: str) -> ModelCascade:
+    """Cascade for a call site ("router", "agent", "formatter", "rag") from settings."""
+    key = site.upper()
+    configured = str(getattr(settings, f"CASCADE_{key}_MODELS", "") or "")
+    models = [m.strip() for m in configured.split(",") if m.strip()]
+    if not models:
+        models = [settings.TEXT_MODEL_NAME]
+        if site in _DEFAULT_FALLBACK_SITES and settings.FALLBACK_TEXT_MODEL_NAME:
+            models.append(settings.FALLBACK_TEXT_MODEL_NAME)
+    if not settings.CASCADE_ENABLED:
+        models = models[:1]
+    budget = float(getattr(settings, f"CASCADE_{key}_BUDGET_SECONDS", 0.0) or 0.0)
+    return ModelCascade(site, tuple(dict.fromkeys(models)), budget if budget > 0 else None)
+
+
+def get_groq_client() -> Groq:
+    """Shared Groq SDK client (vision) on the pooled blocking HTTP client."""
+    global _groq_sync
+    http_client = get_http_client()
+    with _lock:
+        if _groq_sync is None:
+            _groq_sync = Groq(
+                api_key=settings.GROQ_API_KEY,
+                timeout=GROQ_SDK_TIMEOUT_SECONDS,
+                max_retries=0,
+                http_client=http_client,
+            )
+            _stats["groq_clients_created"] += 1
+        return _groq_sync
+
+
+def get_async_groq_client() -> AsyncGroq:
+    """Shared AsyncGroq SDK client (vision) for the current event loop."""
+    http_client = get_async_http_client()
+    bucket = _loop_bucket()
+    with _lock:
+        client = _groq_async.get(bucket)
+        if client is None:
+            client = AsyncGroq(
+                api_key=settings.GROQ_API_KEY,
+                timeout=GROQ_SDK_TIMEOUT_SECONDS,
+                max_retries=0,
+                http_client=http_client,
+            )
+            _groq_async[bucket] = client
+            _stats["groq_clients_created"] += 1
+        return client
+
+
+def _pool_connections(client: Optional[httpx._client.BaseClient]) -> Optional[int]:
+    """Open connections in an httpx pool (best effort - relies on httpcore internals)."""
+    if client is None:
+        return None
+    try:
+        return len(client._transport._pool.connections)  # type: ignore[attr-defined]
+    except Exception:
+        return None
+
+
+def llm_pool_stats() -> Dict[str, Any]:
+    """Registry and connection-pool statistics for /health."""
+    with _lock:
+        async_clients = list(_async_http.values())
+        return {
+            **_stats,
+            "llm_clients": sum(len(c) for c in _llms.values()),
+            "http2": http2_enabled(),
+            "max_connections": settings.LLM_HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": settings.LLM_HTTP_MAX_KEEPALIVE,
+            "sync_pool_connections": _pool_connections(_sync_http),
+            "async_pools": len(async_clients),
+            "async_pool_connections": sum(_pool_connections(c) or 0 for c in async_clients),
+        }
+
+
+async def _aclose_loop_clients() -> None:
+    """Drop the current loop's clients and close its async pool."""
+    bucket = _loop_bucket()
+    with _lock:
+        client = _async_http.pop(bucket, None)
+        _llms.pop(bucket, None)
+        _groq_async.pop(bucket, None)
+    if client is not None:
+        await client.aclose()
+
+
+async def aclose_http_clients() -> None:
+    """Close pooled connections for the current loop and the blocking pool (FastAPI shutdown)."""
+    global _sync_http, _groq_sync
+    await _aclose_loop_clients()
+    with _lock:
+        _groq_sync = None
+        sync_client, _sync_http = _sync_http, None
+    if sync_client is not None:
+        sync_client.close()
+
+
+def run_sync(coro: Awaitable[T]) -> T:
+    """
+    asyncio.run for blocking wrappers. Each call gets a fresh loop, and with it
+    fresh async clients; they are closed before the loop goes away so sockets
+    are not leaked. The shared blocking pool is left open.
+    """
+    async def _main() -> T:
+        try:
+            return await coro
+        finally:
+            await _aclose_loop_clients()
+
+    return asyncio.run(_main())
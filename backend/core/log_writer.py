@@ -0,0 +1,206 @@
+"""
+Background batched writers for the interaction and feedback logs.
+
+Request handlers only put a record on a bounded in-memory queue; one daemon
+thread per log takes records off it and hands them to the sink in batches,
+once LOG_BATCH_SIZE records are waiting or LOG_FLUSH_INTERVAL_SECONDS after
+the first one arrived. When the queue is full, LOG_QUEUE_FULL_POLICY decides:
+"drop" discards the new record at once (counted in the stats), "block" waits
+up to LOG_QUEUE_BLOCK_SECONDS for room and then drops. drain_log_writers()
+runs on FastAPI shutdown and at interpreter exit so queued records are
+written before the process goes away.
+"""
+from __future__ import annotations
+
+import atexit
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.core.config import settings
+
+POLICY_DROP, POLICY_BLOCK = "drop", "block"
+
+_STOP = object()
+
+
+class BatchedLogWriter:
+    """Bounded queue drained into `sink(records)` by one background thread."""
+
+    def __init__(
+        self,
+        name: str,
+        sink: Callable[[List[Dict[str, Any]]], None],
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        policy: str = POLICY_DROP,
+        block_timeout: float = 0.5,
+    ) -> None:
+        self.name = name
+        self.sink = sink
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.policy = policy if policy in (POLICY_DROP, POLICY_BLOCK) else POLICY_DROP
+        self.block_timeout = max(0.0, block_timeout)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, max_queue))
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.max_depth = 0
+
+    def put(self, record: Dict[str, Any]) -> bool:
+        """Queue one record; False if it was dropped (queue full or writer closed)."""
+        if self._closed:
+            with self._lock:
+                self.dropped += 1
+            return False
+        self._ensure_thread()
+        try:
+            if self.policy == POLICY_BLOCK:
+                self._queue.put(record, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """Write everything queued so far and stop the thread; True if it finished in time."""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is None or not thread.is_alive():
+            self._flush_remaining()
+            return True
+        try:
+            # The stop marker must get in even when the queue is full
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return False
+        thread.join(timeout)
+        return not thread.is_alive()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "max_queue_depth": self.max_depth,
+                "queue_capacity": self._queue.maxsize,
+                "policy": self.policy,
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+                "running": bool(self._thread and self._thread.is_alive()),
+            }
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"log-writer-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = [first]
+            flush_at = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = flush_at - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if stop:
+                self._flush_remaining()
+                return
+
+    def _flush_remaining(self) -> None:
+        batch = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                batch.append(item)
+        for i in range(0, len(batch), self.batch_size):
+            self._write(batch[i:i + self.batch_size])
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self.sink(batch)
+        except Exception as e:
+            print(f"[LOG WRITER] {self.name}: failed to write {len(batch)} records: {e}")
+            with self._lock:
+                self.failed += len(batch)
+            return
+        with self._lock:
+            self.written += len(batch)
+            self.batches += 1
+
+
+_writers: Dict[str, BatchedLogWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(name: str, sink: Callable[[List[Dict[str, Any]]], None]) -> BatchedLogWriter:
+    """The writer for `name`, created from settings on first use."""
+    with _writers_lock:
+        writer = _writers.get(name)
+        if writer is None:
+            writer = BatchedLogWriter(
+                name,
+                sink,
+                max_queue=settings.LOG_QUEUE_MAX_RECORDS,
+                batch_size=settings.LOG_BATCH_SIZE,
+                flush_interval=settings.LOG_FLUSH_INTERVAL_SECONDS,
+                policy=settings.LOG_QUEUE_FULL_POLICY,
+                block_timeout=settings.LOG_QUEUE_BLOCK_SECONDS,
+            )
+            _writers[name] = writer
+        return writer
+
+
+def log_writer_stats() -> Dict[str, Dict[str, Any]]:
+    with _writers_lock:
+        writers = list(_writers.values())
+    return {w.name: w.stats() for w in writers}
+
+
+def drain_log_writers(timeout: Optional[float] = None) -> None:
+    """Flush and stop every writer (each gets up to `timeout` seconds)."""
+    if timeout is None:
+        timeout = settings.LOG_DRAIN_TIMEOUT_SECONDS
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        if not writer.drain(timeout):
+            print(f"[LOG WRITER] {writer.name}: drain timed out, {writer.stats()['queue_depth']} records lost")
+
+
+atexit.register(drain_log_writers)
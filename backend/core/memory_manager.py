@@ -4,11 +4,12 @@ Redis enables: multi-worker scaling, persistence across restarts.
 """
 from __future__ import annotations
 
+import asyncio
 import json
 import collections
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Optional
 
-from backend.core.config import settings
+from backend.core.redis_client import get_redis, reset_redis
 
 MAX_HISTORY_LENGTH = 10
 MAX_HISTORY_MESSAGES = 5
@@ -20,32 +21,6 @@ _KEY_TTL_SECONDS = 86400 * 7  # 7 days
 # In-memory fallback when Redis unavailable
 _CHAT_MEMORY: Dict[str, collections.deque] = {}
 
-_redis_client: Optional[Any] = None
-
-
-def _get_redis():
-    """Lazy Redis connection; returns None if not configured or connection fails."""
-    global _redis_client
-    if _redis_client is not None:
-        return _redis_client
-    url = str(settings.REDIS_URL or "").strip()
-    if not url or url.lower() in ("", "none", "false"):
-        return None
-    try:
-        import redis
-        client = redis.from_url(
-            url,
-            decode_responses=True,
-            socket_connect_timeout=2,
-        )
-        client.ping()
-        _redis_client = client
-        return _redis_client
-    except Exception:
-        _redis_client = None
-        return None
-
-
 def _trim_history(history: List[Dict[str, str]]) -> List[Dict[str, str]]:
     """Trim to last N messages and ~N chars for token efficiency."""
     if not history:
@@ -70,7 +45,7 @@ def get_chat_history(session_id: str) -> List[Dict[str, str]]:
     if not session_id:
         return []
 
-    r = _get_redis()
+    r = get_redis()
     if r:
         try:
             key = f"{_KEY_PREFIX}{session_id}"
@@ -87,9 +62,7 @@ def get_chat_history(session_id: str) -> List[Dict[str, str]]:
                     continue
             return _trim_history(history)
         except Exception:
-            global _redis_client
-            _redis_client = None
-            pass
+            reset_redis()
 
     # In-memory fallback
     if session_id not in _CHAT_MEMORY:
@@ -108,7 +81,7 @@ def add_message_to_history(session_id: str, role: str, content: str) -> None:
 
     msg = {"role": role, "content": str(content or "")}
 
-    r = _get_redis()
+    r = get_redis()
     if r:
         try:
             key = f"{_KEY_PREFIX}{session_id}"
@@ -117,9 +90,7 @@ def add_message_to_history(session_id: str, role: str, content: str) -> None:
             r.expire(key, _KEY_TTL_SECONDS)
             return
         except Exception:
-            global _redis_client
-            _redis_client = None
-            pass
+            reset_redis()
 
     # In-memory fallback
     if session_id not in _CHAT_MEMORY:
@@ -139,6 +110,48 @@ def format_history_for_prompt(history: List[Dict[str, str]]) -> str:
     return "\n".join(formatted)
 
 
+class LocalHistory:
+    """
+    Connection-local copy of a session's history for long-lived clients
+    (WebSocket chat): loaded once, extended in memory each turn, and written
+    back to the store in the background - in order, one turn after another.
+    """
+
+    def __init__(self, session_id: str, messages: Optional[List[Dict[str, str]]] = None) -> None:
+        self.session_id = session_id
+        self._messages: collections.deque = collections.deque(messages or [], maxlen=MAX_HISTORY_LENGTH)
+        self._pending: Optional[asyncio.Task] = None
+
+    @classmethod
+    async def load(cls, session_id: str) -> "LocalHistory":
+        return cls(session_id, await asyncio.to_thread(get_chat_history, session_id))
+
+    def messages(self) -> List[Dict[str, str]]:
+        """History as route_query expects it (same trimming as get_chat_history)."""
+        return _trim_history(list(self._messages))
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def add_message(self, role: str, content: str) -> None:
+        """Record a message locally now and queue its write-back."""
+        self._messages.append({"role": role, "content": str(content or "")})
+        self._pending = asyncio.create_task(self._write(self._pending, role, content))
+
+    async def flush(self) -> None:
+        """Wait for queued write-backs (call before the connection goes away)."""
+        if self._pending is not None:
+            await self._pending
+
+    async def _write(self, previous: Optional[asyncio.Task], role: str, content: str) -> None:
+        if previous is not None:
+            await previous
+        try:
+            await asyncio.to_thread(add_message_to_history, self.session_id, role, content)
+        except Exception as e:
+            print(f"[MEMORY] History write-back failed for {self.session_id}: {e}")
+
+
 def redis_available() -> bool:
     """True if Redis is configured and reachable."""
-    return _get_redis() is not None
+    return get_redis() is not None
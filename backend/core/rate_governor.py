@@ -0,0 +1,328 @@
+"""
+Cluster-wide Groq rate-limit governor.
+
+Groq enforces requests-per-minute and tokens-per-minute per model for the
+whole API key, but each worker used to discover the limit on its own via
+429s. The governor keeps an RPM and a TPM token bucket per model, shared
+through Redis (one atomic Lua script) with an in-process fallback. Every LLM
+call reserves capacity before it is sent (see core.resilience); when a
+bucket is empty the call waits locally for its turn instead of burning a
+retry, and a 429 drains the buckets so every worker backs off together.
+Redis round trips never run on the event loop, and after a Redis failure
+the governor stays on its in-process buckets for _REDIS_RETRY_SECONDS
+instead of paying a connect timeout on every call.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from backend.core import deadline
+from backend.core.config import settings
+from backend.core.redis_client import get_redis, reset_redis
+
+_REDIS_PREFIX = "agrigpt:ratelimit:"
+
+# After a Redis failure, use the in-process buckets for this long before reconnecting
+_REDIS_RETRY_SECONDS = 30.0
+_redis_down_until = 0.0
+
+# KEYS: rpm bucket, tpm bucket. ARGV: now, rpm limit, tpm limit, token cost, max wait.
+# Reserves both buckets (balances may go negative = queued) unless the wait
+# would exceed max wait. Returns {reserved (1/0), wait seconds as string}.
+_RESERVE_LUA = """
+local now = tonumber(ARGV[1])
+local costs = {1, tonumber(ARGV[4])}
+local wait = 0
+local balances = {}
+for i = 1, 2 do
+  local limit = tonumber(ARGV[i + 1])
+  if limit > 0 then
+    local rate = limit / 60.0
+    local data = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or limit
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(limit, tokens + math.max(0, now - ts) * rate) - math.min(costs[i], limit)
+    if tokens < 0 then wait = math.max(wait, -tokens / rate) end
+    balances[i] = tokens
+  end
+end
+if wait > tonumber(ARGV[5]) then
+  return {0, tostring(wait)}
+end
+for i = 1, 2 do
+  if balances[i] ~= nil then
+    redis.call('HSET', KEYS[i], 'tokens', tostring(balances[i]), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[i], 180)
+  end
+end
+return {1, tostring(wait)}
+"""
+
+# KEYS: rpm bucket, tpm bucket. ARGV: now, rpm limit, tpm limit, pause seconds.
+_THROTTLE_LUA = """
+local now = tonumber(ARGV[1])
+for i = 1, 2 do
+  local limit = tonumber(ARGV[i + 1])
+  if limit > 0 then
+    local rate = limit / 60.0
+    local data = redis.call('HMGET', KEYS[i], 'tokens', 'ts')
+    local tokens = tonumber(data[1]) or limit
+    local ts = tonumber(data[2]) or now
+    tokens = math.min(limit, tokens + math.max(0, now - ts) * rate)
+    tokens = math.min(tokens, -tonumber(ARGV[4]) * rate)
+    redis.call('HSET', KEYS[i], 'tokens', tostring(tokens), 'ts', tostring(now))
+    redis.call('EXPIRE', KEYS[i], 180)
+  end
+end
+return 1
+"""
+
+
+class RateBudgetExceeded(Exception):
+    """The wait for rate-limit capacity would exceed the allowed queueing time."""
+
+    def __init__(self, model: str, wait: float) -> None:
+        super().__init__(f"Rate limit for '{model}' needs a {wait:.1f}s wait")
+        self.model = model
+        self.wait = wait
+
+
+def estimate_tokens(*texts: Any, output_tokens: Optional[int] = None) -> int:
+    """Rough token estimate (~4 chars per token) plus the expected completion size."""
+    chars = sum(len(str(t or "")) for t in texts)
+    expected = settings.GOVERNOR_EST_OUTPUT_TOKENS if output_tokens is None else output_tokens
+    return chars // 4 + max(0, expected)
+
+
+class RateGovernor:
+    """RPM + TPM token buckets for one model (limits of 0 disable a bucket)."""
+
+    def __init__(self, model: str, rpm: int, tpm: int, max_wait: float = 10.0) -> None:
+        self.model = model
+        self.rpm = max(0, int(rpm))
+        self.tpm = max(0, int(tpm))
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        # local fallback buckets: [tokens, last refill (monotonic)]
+        self._local = {
+            "rpm": [float(self.rpm), time.monotonic()],
+            "tpm": [float(self.tpm), time.monotonic()],
+        }
+        self._stats = {"reserved": 0, "waited": 0, "wait_ms_total": 0.0, "rejected": 0, "throttled": 0}
+        self._backend = "memory"
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    def reserve(self, tokens: int) -> float:
+        """Reserve one request + `tokens`; returns seconds to wait before sending."""
+        max_wait = self.max_wait
+        left = deadline.remaining()
+        if left is not None:
+            max_wait = min(max_wait, max(0.0, left))
+
+        reserved, wait = self._reserve_redis(tokens, max_wait)
+        if reserved is None:
+            reserved, wait = self._reserve_local(tokens, max_wait)
+
+        with self._lock:
+            if not reserved:
+                self._stats["rejected"] += 1
+            else:
+                self._stats["reserved"] += 1
+                if wait > 0:
+                    self._stats["waited"] += 1
+                    self._stats["wait_ms_total"] += wait * 1000
+        if not reserved:
+            raise RateBudgetExceeded(self.model, wait)
+        return wait
+
+    def try_reserve(self, tokens: int) -> bool:
+        """Reserve one request + `tokens` only if no wait is needed (for optional extra calls)."""
+        if not self.enabled:
+            return True
+        reserved, _ = self._reserve_redis(tokens, 0.0)
+        if reserved is None:
+            reserved, _ = self._reserve_local(tokens, 0.0)
+        if reserved:
+            with self._lock:
+                self._stats["reserved"] += 1
+        return reserved
+
+    async def atry_reserve(self, tokens: int) -> bool:
+        if not self.enabled:
+            return True
+        if _redis_usable():
+            return await asyncio.to_thread(self.try_reserve, tokens)
+        return self.try_reserve(tokens)
+
+    async def acquire(self, tokens: int) -> None:
+        if not self.enabled:
+            return
+        if _redis_usable():
+            wait = await asyncio.to_thread(self.reserve, tokens)
+        else:
+            wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self, tokens: int) -> None:
+        if not self.enabled:
+            return
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def throttle(self, seconds: float) -> None:
+        """
+        Drain both buckets so no caller (on any worker) sends for `seconds`.
+        Called from an event loop, the shared Redis buckets are drained on a
+        worker thread; the local buckets are drained immediately either way.
+        """
+        if not self.enabled or seconds <= 0:
+            return
+        with self._lock:
+            self._stats["throttled"] += 1
+        if _redis_usable():
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            if loop is None:
+                self._throttle_redis(seconds)
+            else:
+                loop.run_in_executor(None, self._throttle_redis, seconds)
+        now = time.monotonic()
+        with self._lock:
+            for name, limit in (("rpm", self.rpm), ("tpm", self.tpm)):
+                if limit > 0:
+                    bucket = self._local[name]
+                    self._refill(bucket, limit, now)
+                    bucket[0] = min(bucket[0], -seconds * limit / 60.0)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        waited = stats.pop("wait_ms_total")
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "backend": self._backend,
+            **stats,
+            "avg_wait_ms": round(waited / stats["waited"], 1) if stats["waited"] else 0.0,
+        }
+
+    # --- internals ---
+
+    def _keys(self) -> list:
+        return [f"{_REDIS_PREFIX}{self.model}:rpm", f"{_REDIS_PREFIX}{self.model}:tpm"]
+
+    def _reserve_redis(self, tokens: int, max_wait: float) -> Tuple[Optional[bool], float]:
+        r = _governor_redis()
+        if r is None:
+            return None, 0.0
+        try:
+            reserved, wait = r.register_script(_RESERVE_LUA)(
+                keys=self._keys(), args=[time.time(), self.rpm, self.tpm, int(tokens), max_wait]
+            )
+            self._backend = "redis"
+            return bool(int(reserved)), float(wait)
+        except Exception as e:
+            _mark_redis_down(e)
+            return None, 0.0
+
+    def _throttle_redis(self, seconds: float) -> None:
+        r = _governor_redis()
+        if r is None:
+            return
+        try:
+            r.register_script(_THROTTLE_LUA)(
+                keys=self._keys(), args=[time.time(), self.rpm, self.tpm, seconds]
+            )
+        except Exception as e:
+            _mark_redis_down(e)
+
+    def _reserve_local(self, tokens: int, max_wait: float) -> Tuple[bool, float]:
+        now = time.monotonic()
+        self._backend = "memory"
+        with self._lock:
+            balances = {}
+            wait = 0.0
+            for name, limit, cost in (("rpm", self.rpm, 1), ("tpm", self.tpm, tokens)):
+                if limit <= 0:
+                    continue
+                bucket = self._local[name]
+                self._refill(bucket, limit, now)
+                balance = bucket[0] - min(cost, limit)
+                if balance < 0:
+                    wait = max(wait, -balance / (limit / 60.0))
+                balances[name] = balance
+            if wait > max_wait:
+                return False, wait
+            for name, balance in balances.items():
+                self._local[name][0] = balance
+            return True, wait
+
+    @staticmethod
+    def _refill(bucket: list, limit: int, now: float) -> None:
+        bucket[0] = min(float(limit), bucket[0] + max(0.0, now - bucket[1]) * limit / 60.0)
+        bucket[1] = now
+
+
+def _redis_usable() -> bool:
+    """Redis is configured and not in its post-failure backoff (a call may block on I/O)."""
+    url = str(settings.REDIS_URL or "").strip().lower()
+    return bool(url) and url not in ("none", "false") and time.monotonic() >= _redis_down_until
+
+
+def _governor_redis() -> Optional[Any]:
+    if not _redis_usable():
+        return None
+    r = get_redis()
+    if r is None:
+        _mark_redis_down("connection failed")
+    return r
+
+
+def _mark_redis_down(error: Any) -> None:
+    global _redis_down_until
+    if time.monotonic() >= _redis_down_until:
+        print(f"[GOVERNOR] Redis unavailable, using in-process buckets for {_REDIS_RETRY_SECONDS:.0f}s: {error}")
+    _redis_down_until = time.monotonic() + _REDIS_RETRY_SECONDS
+    reset_redis()
+
+
+_GOVERNORS: Dict[str, RateGovernor] = {}
+_GOVERNORS_LOCK = threading.Lock()
+
+
+def _limits_for(model: str) -> Tuple[int, int]:
+    if model == settings.VISION_MODEL_NAME:
+        return settings.GOVERNOR_VISION_RPM, settings.GOVERNOR_VISION_TPM
+    if model == settings.TEXT_MODEL_NAME:
+        return settings.GOVERNOR_TEXT_RPM, settings.GOVERNOR_TEXT_TPM
+    if model == settings.FALLBACK_TEXT_MODEL_NAME:
+        return settings.GOVERNOR_FALLBACK_RPM, settings.GOVERNOR_FALLBACK_TPM
+    return 0, 0
+
+
+def get_governor(model: str) -> RateGovernor:
+    """Per-model governor, created on first use (limits from settings)."""
+    with _GOVERNORS_LOCK:
+        governor = _GOVERNORS.get(model)
+        if governor is None:
+            rpm, tpm = _limits_for(model) if settings.GOVERNOR_ENABLED else (0, 0)
+            governor = RateGovernor(model, rpm, tpm, max_wait=settings.GOVERNOR_MAX_WAIT_SECONDS)
+            _GOVERNORS[model] = governor
+        return governor
+
+
+def governor_stats() -> Dict[str, Dict[str, Any]]:
+    """Per-model bucket limits, waits and rejections, for /health."""
+    with _GOVERNORS_LOCK:
+        governors = list(_GOVERNORS.values())
+    return {g.model: g.stats() for g in governors if g.enabled}
@@ -0,0 +1,40 @@
+"""
+Shared lazy Redis connection for chat memory and caches.
+Returns None when REDIS_URL is unset or unreachable so callers fall back to in-memory.
+"""
+from __future__ import annotations
+
+from typing import Any, Optional
+
+from backend.core.config import settings
+
+_redis_client: Optional[Any] = None
+
+
+def get_redis():
+    """Lazy Redis connection; returns None if not configured or connection fails."""
+    global _redis_client
+    if _redis_client is not None:
+        return _redis_client
+    url = str(settings.REDIS_URL or "").strip()
+    if not url or url.lower() in ("", "none", "false"):
+        return None
+    try:
+        import redis
+        client = redis.from_url(
+            url,
+            decode_responses=True,
+            socket_connect_timeout=2,
+        )
+        client.ping()
+        _redis_client = client
+        return _redis_client
+    except Exception:
+        _redis_client = None
+        return None
+
+
+def reset_redis() -> None:
+    """Drop the cached connection after an error; the next call reconnects."""
+    global _redis_client
+    _redis_client = None
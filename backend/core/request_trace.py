@@ -0,0 +1,49 @@
+"""
+Per-request trace capture.
+
+aroute_query opens a trace_scope() for each request and writes one trace
+record to the interaction log when it is done. While a scope is active,
+agents hand their logged output to the scope (capture()) instead of writing
+their own log entry; like the request deadline, the scope lives in a
+contextvar so it reaches agents running in tasks and to_thread calls.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional
+
+# Longest agent/formatter text kept in a trace record
+MAX_LOGGED_CHARS = 5000
+
+_TRACE: ContextVar[Optional[Dict[str, Any]]] = ContextVar("agrigpt_request_trace", default=None)
+
+
+@contextmanager
+def trace_scope(trace: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Collect agent output of the block into trace["captured"]."""
+    token = _TRACE.set(trace)
+    try:
+        yield trace
+    finally:
+        _TRACE.reset(token)
+
+
+def capture(agent: str, entry: Dict[str, Any]) -> bool:
+    """Attach an agent's log entry to the active trace; False when no trace is active."""
+    trace = _TRACE.get()
+    if trace is None:
+        return False
+    trace.setdefault("captured", {})[agent] = entry
+    return True
+
+
+def annotate(key: str, value: Any) -> None:
+    """Set a field on the active trace (no-op outside a trace scope)."""
+    trace = _TRACE.get()
+    if trace is not None:
+        trace[key] = value
+
+
+def clip(text: Any) -> str:
+    return str(text or "")[:MAX_LOGGED_CHARS]
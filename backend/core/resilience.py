@@ -0,0 +1,429 @@
+"""
+Shared resilience layer for Groq calls (text, vision, router).
+
+- Errors are classified by exception type (Groq SDK / httpx), not by
+  substring matching on the message.
+- Retries use full-jitter exponential backoff and honour Retry-After.
+- A per-model circuit breaker stops calling Groq during an outage and lets
+  a single half-open probe through after the recovery timeout.
+
+The SDK clients are built with max_retries=0 (see llm_client) so this is
+the only retry loop. Both callers respect the request deadline (see
+core.deadline): attempts are bounded by the time left and a backoff that
+would overrun it is not taken. Every attempt first reserves rate-limit
+capacity from the model's governor (core.rate_governor). The cascade
+callers walk a call site's model list (core.llm_client.ModelCascade) and
+report which model answered.
+"""
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+import httpx
+
+try:
+    import groq
+except ImportError:  # classification then relies on httpx/asyncio types only
+    groq = None
+
+from backend.core import deadline
+from backend.core.config import settings
+from backend.core.deadline import DeadlineExceeded
+from backend.core.rate_governor import RateBudgetExceeded, get_governor
+
+if TYPE_CHECKING:
+    from backend.core.llm_client import ModelCascade
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the model while its breaker is open."""
+
+    def __init__(self, name: str, retry_in: float) -> None:
+        super().__init__(f"Circuit for '{name}' is open; retry in {retry_in:.1f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+    max_retry_after: float = 20.0
+
+
+def default_policy() -> RetryPolicy:
+    return RetryPolicy(
+        max_attempts=max(1, settings.LLM_RETRY_ATTEMPTS),
+        base_delay=settings.LLM_RETRY_BASE_DELAY,
+        max_delay=settings.LLM_RETRY_MAX_DELAY,
+        max_retry_after=settings.LLM_RETRY_AFTER_MAX,
+    )
+
+
+# --- classification ---
+
+def _status_code(error: BaseException) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        response = getattr(error, "response", None)
+        status = getattr(response, "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Parse Retry-After / retry-after-ms from the error's HTTP response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return max(0.0, float(ms) / 1000.0)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient failures (rate limits, 5xx, timeouts, connection drops) are retryable."""
+    if isinstance(error, (CircuitOpenError, DeadlineExceeded, RateBudgetExceeded)):
+        return False
+    if groq is not None:
+        if isinstance(error, (groq.APITimeoutError, groq.APIConnectionError)):
+            return True
+        if isinstance(error, groq.APIStatusError):
+            return _status_code(error) in _RETRYABLE_STATUS
+    if isinstance(error, httpx.HTTPStatusError):
+        return _status_code(error) in _RETRYABLE_STATUS
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return True
+    return isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError))
+
+
+def backoff_delay(attempt: int, policy: RetryPolicy, error: Optional[BaseException] = None) -> float:
+    """Full jitter: uniform(0, min(max_delay, base * 2^attempt)); Retry-After wins when given."""
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        return min(retry_after, policy.max_retry_after)
+    return random.uniform(0.0, min(policy.max_delay, policy.base_delay * (2 ** attempt)))
+
+
+# --- circuit breaker ---
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half_open (one probe) -> closed/open."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> Tuple[bool, float]:
+        """(allowed, seconds until the next probe when rejected)."""
+        with self._lock:
+            if self._state == CLOSED:
+                return True, 0.0
+            remaining = self._opened_at + self.recovery_timeout - time.monotonic()
+            if self._state == OPEN and remaining <= 0:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True, 0.0
+            self._stats["rejected"] += 1
+            return False, max(0.0, remaining)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._stats["successes"] += 1
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._stats["opened"] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Outcome says nothing about service health (e.g. a 400) - free the probe slot."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._failures = 0
+            self._probe_in_flight = False
+
+    def abandon(self) -> None:
+        """Call was cancelled before an outcome - free the probe slot, keep the state."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._state
+            if state == OPEN and time.monotonic() >= self._opened_at + self.recovery_timeout:
+                state = HALF_OPEN
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "recovery_timeout_s": self.recovery_timeout,
+                **self._stats,
+            }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Per-model breaker, created on first use."""
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name,
+                failure_threshold=settings.BREAKER_FAILURE_THRESHOLD,
+                recovery_timeout=settings.BREAKER_RECOVERY_SECONDS,
+            )
+            _BREAKERS[name] = breaker
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """Snapshot of every breaker, for /health."""
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+def record_outcome(breaker: CircuitBreaker, error: Optional[BaseException]) -> bool:
+    """Record an outcome; returns True when the error is retryable."""
+    if error is None:
+        breaker.record_success()
+        return False
+    if _status_code(error) == 429:
+        # Every worker shares the key's limit - make them all wait it out
+        get_governor(breaker.name).throttle(retry_after_seconds(error) or 1.0)
+    if is_retryable(error):
+        breaker.record_failure()
+        return True
+    breaker.release()
+    return False
+
+
+# --- callers ---
+
+def _retry_delay(attempt: int, policy: RetryPolicy, error: BaseException, governor: Any) -> float:
+    """A throttled 429 is waited out in the governor queue, not slept on twice."""
+    if governor.enabled and _status_code(error) == 429:
+        return 0.0
+    return backoff_delay(attempt, policy, error)
+
+
+async def acall_with_resilience(
+    fn: Callable[[], Awaitable[T]],
+    breaker_name: str,
+    policy: Optional[RetryPolicy] = None,
+    label: str = "LLM",
+    cost_tokens: int = 0,
+) -> T:
+    """
+    Await fn() with rate-limit reservation, breaker checks and jittered retries
+    on transient errors. cost_tokens is the estimated token use of one call
+    (see rate_governor.estimate_tokens). Raises CircuitOpenError when the
+    breaker rejects the call, DeadlineExceeded when the request deadline cuts
+    it short, RateBudgetExceeded when the rate-limit queue is too long,
+    otherwise the last error once retries are exhausted or the error is not retryable.
+    """
+    policy = policy or default_policy()
+    breaker = get_breaker(breaker_name)
+    governor = get_governor(breaker_name)
+    for attempt in range(policy.max_attempts):
+        deadline.check(label)
+        await governor.acquire(cost_tokens)
+        allowed, retry_in = breaker.allow()
+        if not allowed:
+            raise CircuitOpenError(breaker_name, retry_in)
+        try:
+            result = await deadline.await_within(fn(), stage=label)
+        except (asyncio.CancelledError, DeadlineExceeded):
+            # Our own budget ran out - says nothing about the model's health
+            breaker.abandon()
+            raise
+        except Exception as e:
+            retryable = record_outcome(breaker, e)
+            print(f"[{label}] {type(e).__name__} on {breaker_name} (attempt {attempt + 1}): {str(e)[:200]}")
+            if not retryable or attempt >= policy.max_attempts - 1:
+                raise
+            delay = _retry_delay(attempt, policy, e, governor)
+            if not deadline.has_time(delay):
+                raise
+            await asyncio.sleep(delay)
+            continue
+        record_outcome(breaker, None)
+        return result
+    raise RuntimeError("unreachable")
+
+
+def call_with_resilience(
+    fn: Callable[[], T],
+    breaker_name: str,
+    policy: Optional[RetryPolicy] = None,
+    label: str = "LLM",
+    cost_tokens: int = 0,
+) -> T:
+    """
+    Blocking counterpart of acall_with_resilience for sync callers. A running
+    call cannot be interrupted, but no attempt or backoff starts past the deadline.
+    """
+    policy = policy or default_policy()
+    breaker = get_breaker(breaker_name)
+    governor = get_governor(breaker_name)
+    for attempt in range(policy.max_attempts):
+        deadline.check(label)
+        governor.acquire_sync(cost_tokens)
+        allowed, retry_in = breaker.allow()
+        if not allowed:
+            raise CircuitOpenError(breaker_name, retry_in)
+        try:
+            result = fn()
+        except Exception as e:
+            retryable = record_outcome(breaker, e)
+            print(f"[{label}] {type(e).__name__} on {breaker_name} (attempt {attempt + 1}): {str(e)[:200]}")
+            if not retryable or attempt >= policy.max_attempts - 1:
+                raise
+            delay = _retry_delay(attempt, policy, e, governor)
+            if not deadline.has_time(delay):
+                raise
+            time.sleep(delay)
+            continue
+        record_outcome(breaker, None)
+        return result
+    raise RuntimeError("unreachable")
+
+
+# --- model cascade ---
+
+_CASCADE_STATS: Dict[str, Dict[str, Any]] = {}
+_CASCADE_LOCK = threading.Lock()
+
+
+def _site_stats(site: str) -> Dict[str, Any]:
+    return _CASCADE_STATS.setdefault(site, {"answered_by": {}, "fallbacks": 0})
+
+
+def record_cascade_answer(site: str, model: str) -> None:
+    with _CASCADE_LOCK:
+        answered = _site_stats(site)["answered_by"]
+        answered[model] = answered.get(model, 0) + 1
+
+
+def record_cascade_fallback(site: str, model: str, error: BaseException, label: str = "LLM") -> None:
+    print(f"[{label}] {model} skipped for {site} ({type(error).__name__}); trying the next model")
+    with _CASCADE_LOCK:
+        _site_stats(site)["fallbacks"] += 1
+
+
+def cascade_stats() -> Dict[str, Dict[str, Any]]:
+    """Answers per model and fallback counts per call site, for /health."""
+    with _CASCADE_LOCK:
+        return {
+            site: {"answered_by": dict(s["answered_by"]), "fallbacks": s["fallbacks"]}
+            for site, s in _CASCADE_STATS.items()
+        }
+
+
+def _falls_through(error: BaseException) -> bool:
+    """Degraded, over the site's latency budget, or still failing after retries."""
+    if isinstance(error, DeadlineExceeded):
+        return not deadline.expired()  # only the per-model budget ran out
+    return isinstance(error, (CircuitOpenError, RateBudgetExceeded)) or is_retryable(error)
+
+
+async def acall_with_cascade(
+    fn: Callable[[str], Awaitable[T]],
+    cascade: "ModelCascade",
+    policy: Optional[RetryPolicy] = None,
+    label: str = "LLM",
+    cost_tokens: int = 0,
+) -> Tuple[T, str]:
+    """
+    Await fn(model) for each model of the cascade in turn (each through
+    acall_with_resilience) and return (result, model that answered). Every
+    model but the last runs under the cascade's latency budget. Errors the
+    next model cannot help with, and the request deadline, are raised as-is.
+    """
+    last = len(cascade.models) - 1
+    for index, model in enumerate(cascade.models):
+        budget = cascade.latency_budget if index < last else None
+        try:
+            with deadline.deadline_scope(budget):
+                result = await acall_with_resilience(
+                    lambda: fn(model), model, policy=policy, label=label, cost_tokens=cost_tokens
+                )
+        except Exception as e:
+            if index == last or not _falls_through(e):
+                raise
+            record_cascade_fallback(cascade.site, model, e, label)
+            continue
+        record_cascade_answer(cascade.site, model)
+        return result, model
+    raise ValueError(f"Model cascade for '{cascade.site}' is empty")
+
+
+def call_with_cascade(
+    fn: Callable[[str], T],
+    cascade: "ModelCascade",
+    policy: Optional[RetryPolicy] = None,
+    label: str = "LLM",
+    cost_tokens: int = 0,
+) -> Tuple[T, str]:
+    """Blocking counterpart of acall_with_cascade (the budget only gates new attempts)."""
+    last = len(cascade.models) - 1
+    for index, model in enumerate(cascade.models):
+        budget = cascade.latency_budget if index < last else None
+        try:
+            with deadline.deadline_scope(budget):
+                result = call_with_resilience(
+                    lambda: fn(model), model, policy=policy, label=label, cost_tokens=cost_tokens
+                )
+        except Exception as e:
+            if index == last or not _falls_through(e):
+                raise
+            record_cascade_fallback(cascade.site, model, e, label)
+            continue
+        record_cascade_answer(cascade.site, model)
+        return result, model
+    raise ValueError(f"Model cascade for '{cascade.site}' is empty")
@@ -0,0 +1,366 @@
+"""
+Embedding-keyed semantic cache (LLMOps latency/cost optimization).
+
+Lookups embed the normalised text and return the closest cached value whose
+cosine similarity clears the threshold. Entries are evicted LRU-first and
+expire after a TTL. When Redis is configured, exact-text hits are also shared
+across workers; semantic matching stays in-process.
+
+Purges reach every worker through a per-cache generation counter in Redis:
+a purge increments it, and each worker re-reads it at most every
+_GENERATION_CHECK_SECONDS, dropping its in-memory entries when it moved.
+Shared entries are keyed by generation, so late writes from a worker that
+has not noticed the purge yet are never read back. Without Redis a purge
+covers only the worker that received it.
+"""
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from backend.core.redis_client import get_redis, reset_redis
+
+_REDIS_PREFIX = "agrigpt:cache:"
+_GENERATION_PREFIX = "agrigpt:cachegen:"
+_GENERATION_CHECK_SECONDS = 2.0
+
+# All caches created in this process, for /metrics/cache. Other cache types
+# join via register_cache() - anything with name, stats() and purge().
+_CACHES: Dict[str, Any] = {}
+
+# Caches are built lazily on first use; register_store() names them up front
+# with a purge of their shared (Redis/disk) entries, so a worker that has not
+# built a cache yet can still purge it.
+_STORES: Dict[str, Callable[[], None]] = {}
+
+
+class PurgeGeneration:
+    """Cross-worker purge counter of one cache (see module docstring)."""
+
+    def __init__(self, name: str) -> None:
+        self.key = f"{_GENERATION_PREFIX}{name}"
+        self.current = 0
+        self._seen: Optional[int] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def changed(self, force: bool = False) -> bool:
+        """Re-read the counter if due (or forced); True when it moved since the last read."""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._checked_at < _GENERATION_CHECK_SECONDS:
+                return False
+            self._checked_at = now
+        r = get_redis()
+        if not r:
+            return False
+        try:
+            value = int(r.get(self.key) or 0)
+        except Exception:
+            reset_redis()
+            return False
+        with self._lock:
+            previous, self._seen, self.current = self._seen, value, value
+        return previous is not None and previous != value
+
+
+def bump_generation(name: str) -> bool:
+    """Start a new purge generation for `name`; False without Redis (the purge stays local)."""
+    r = get_redis()
+    if not r:
+        return False
+    try:
+        r.incr(f"{_GENERATION_PREFIX}{name}")
+        return True
+    except Exception:
+        reset_redis()
+        return False
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, NFKC-normalise and collapse whitespace/punctuation noise."""
+    text = unicodedata.normalize("NFKC", str(text or ""))
+    text = re.sub(r"[\x00-\x1f\x7f]", " ", text)
+    text = re.sub(r"[?!.,;:]+(\s|$)", r"\1", text)
+    text = re.sub(r"\s+", " ", text)
+    return text.strip().lower()
+
+
+@dataclass
+class _Entry:
+    vector: np.ndarray
+    value: Any
+    partition: str
+    expires_at: float
+
+
+class SemanticCache:
+    """Cosine-similarity cache with LRU + TTL eviction and optional Redis sharing."""
+
+    def __init__(
+        self,
+        name: str,
+        embed_fn: Callable[[str], Sequence[float]],
+        threshold: float = 0.93,
+        max_entries: int = 2000,
+        ttl_seconds: int = 6 * 3600,
+        use_redis: bool = True,
+    ) -> None:
+        self.name = name
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._embed_fn = embed_fn
+        self._use_redis = use_redis
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._hits = 0
+        self._redis_hits = 0
+        self._misses = 0
+        self._saved_ms = 0.0
+        self._avg_miss_ms: Optional[float] = None
+        self._generation = PurgeGeneration(name)
+        register_cache(self)
+
+    @staticmethod
+    def _key(text: str, partition: str) -> str:
+        raw = f"{partition}\x1f{normalize_text(text)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def embed(self, text: str) -> np.ndarray:
+        """Unit-length embedding of the normalised text."""
+        vec = np.asarray(self._embed_fn(normalize_text(text)), dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm > 0 else vec
+
+    def lookup(
+        self,
+        text: str,
+        partition: str = "",
+        vector: Optional[np.ndarray] = None,
+    ) -> Tuple[Optional[Any], Optional[np.ndarray]]:
+        """
+        Return (value, vector). value is None on a miss; the vector is returned
+        so a subsequent store() does not embed the same text twice.
+        """
+        key = self._key(text, partition)
+        now = time.time()
+        self._sync_generation()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self._record_hit()
+                return entry.value, entry.vector
+
+        shared = self._redis_get(key)
+        if shared is not None:
+            with self._lock:
+                self._redis_hits += 1
+                self._record_hit()
+            return shared, vector
+
+        if vector is None:
+            try:
+                vector = self.embed(text)
+            except Exception as e:
+                print(f"[CACHE:{self.name}] Embedding failed: {e}")
+                with self._lock:
+                    self._misses += 1
+                return None, None
+
+        with self._lock:
+            best_key, best_sim = self._nearest(vector, partition, now)
+            if best_key is not None and best_sim >= self.threshold:
+                self._entries.move_to_end(best_key)
+                self._record_hit()
+                return self._entries[best_key].value, vector
+            self._misses += 1
+
+        return None, vector
+
+    def store(
+        self,
+        text: str,
+        value: Any,
+        partition: str = "",
+        vector: Optional[np.ndarray] = None,
+    ) -> None:
+        """Insert or refresh an entry; value must be JSON-serialisable for Redis sharing."""
+        key = self._key(text, partition)
+        if vector is None:
+            try:
+                vector = self.embed(text)
+            except Exception as e:
+                print(f"[CACHE:{self.name}] Embedding failed: {e}")
+                return
+
+        self._sync_generation()
+        with self._lock:
+            self._entries[key] = _Entry(
+                vector=vector,
+                value=value,
+                partition=partition,
+                expires_at=time.time() + self.ttl_seconds,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        self._redis_set(key, value)
+
+    def record_miss_latency(self, elapsed_ms: float) -> None:
+        """Feed the cost of a miss (the work a hit avoids) into the saved-latency estimate."""
+        with self._lock:
+            if self._avg_miss_ms is None:
+                self._avg_miss_ms = float(elapsed_ms)
+            else:
+                self._avg_miss_ms = 0.9 * self._avg_miss_ms + 0.1 * float(elapsed_ms)
+
+    def purge(self) -> int:
+        """Drop all entries (local and shared). Returns the number of local entries removed."""
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        purge_shared(self.name)
+        self._generation.changed(force=True)  # write under the new generation from now on
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "redis_hits": self._redis_hits,
+                "misses": self._misses,
+                "hit_ratio": round(self._hits / lookups, 4) if lookups else None,
+                "avg_miss_latency_ms": round(self._avg_miss_ms, 1) if self._avg_miss_ms is not None else None,
+                "saved_latency_ms": round(self._saved_ms, 1),
+            }
+
+    # --- internals (call with self._lock held where noted) ---
+
+    def _record_hit(self) -> None:
+        """Lock held."""
+        self._hits += 1
+        if self._avg_miss_ms is not None:
+            self._saved_ms += self._avg_miss_ms
+
+    def _nearest(self, vector: np.ndarray, partition: str, now: float) -> Tuple[Optional[str], float]:
+        """Lock held. Drops expired entries while scanning."""
+        expired = [k for k, e in self._entries.items() if e.expires_at <= now]
+        for k in expired:
+            del self._entries[k]
+
+        keys: List[str] = [k for k, e in self._entries.items() if e.partition == partition]
+        if not keys:
+            return None, 0.0
+        matrix = np.stack([self._entries[k].vector for k in keys])
+        sims = matrix @ vector
+        idx = int(np.argmax(sims))
+        return keys[idx], float(sims[idx])
+
+    def _sync_generation(self) -> None:
+        """Drop local entries once another worker has purged this cache."""
+        if self._generation.changed():
+            with self._lock:
+                self._entries.clear()
+
+    def _redis_key(self, key: str) -> str:
+        return f"{_REDIS_PREFIX}{self.name}:{self._generation.current}:{key}"
+
+    def _redis(self):
+        return get_redis() if self._use_redis else None
+
+    def _redis_get(self, key: str) -> Optional[Any]:
+        r = self._redis()
+        if not r:
+            return None
+        try:
+            raw = r.get(self._redis_key(key))
+            return json.loads(raw) if raw else None
+        except Exception:
+            reset_redis()
+            return None
+
+    def _redis_set(self, key: str, value: Any) -> None:
+        r = self._redis()
+        if not r:
+            return
+        try:
+            r.setex(self._redis_key(key), self.ttl_seconds, json.dumps(value))
+        except Exception:
+            reset_redis()
+
+
+def register_cache(cache: Any) -> None:
+    """Expose a non-semantic cache through cache_stats()/purge_caches()."""
+    _CACHES[cache.name] = cache
+
+
+def cache_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every semantic cache created in this process."""
+    return {name: cache.stats() for name, cache in _CACHES.items()}
+
+
+def get_cache(name: str) -> Optional[Any]:
+    return _CACHES.get(name)
+
+
+def register_store(name: str, purge_stored: Callable[[], None]) -> None:
+    """Name a lazily built cache, with a purge of its shared entries for when it is not built yet."""
+    _STORES[name] = purge_stored
+
+
+def known_caches() -> List[str]:
+    """Caches created in this process plus those registered as stores."""
+    return sorted(set(_CACHES) | set(_STORES))
+
+
+def purge_shared(name: str) -> None:
+    """Delete a semantic cache's Redis entries and tell the other workers to drop theirs."""
+    if not bump_generation(name):
+        return
+    r = get_redis()
+    if not r:
+        return
+    try:
+        keys = list(r.scan_iter(match=f"{_REDIS_PREFIX}{name}:*", count=500))
+        if keys:
+            r.delete(*keys)
+    except Exception:
+        reset_redis()
+
+
+def purge_caches(name: Optional[str] = None) -> Dict[str, int]:
+    """
+    Purge one named cache (or all). Returns local entries removed per cache;
+    a cache not built in this worker reports 0 after its shared entries are purged.
+    """
+    removed: Dict[str, int] = {}
+    for n in ([name] if name else known_caches()):
+        if n in _CACHES:
+            removed[n] = _CACHES[n].purge()
+        elif n in _STORES:
+            _STORES[n]()
+            removed[n] = 0
+    return removed
+
+
+for _name in ("answer", "routing"):
+    register_store(_name, functools.partial(purge_shared, _name))
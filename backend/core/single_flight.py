@@ -0,0 +1,248 @@
+"""
+Single-flight de-duplication of identical concurrent work.
+
+Callers with the same key await one in-flight computation. In-process this is
+a shared asyncio task; across workers a Redis lock elects one leader, which
+publishes its result for the others to pick up. Results must be JSON
+round-trippable when Redis is used (tuples come back as tuples).
+
+Followers wait only as long as their own request deadline allows. A leader
+outcome cut short by the leader's deadline (DeadlineExceeded, or a result
+the caller's `shareable` check rejects) is not handed on: the follower runs
+the work itself under its own budget.
+
+Redis is only ever touched off the event loop. When it is configured but
+unreachable, the group coalesces in-process for _REDIS_RETRY_SECONDS instead
+of paying a connect timeout on every call.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from backend.core import deadline
+from backend.core.config import settings
+from backend.core.deadline import DeadlineExceeded
+from backend.core.redis_client import get_redis, reset_redis
+
+T = TypeVar("T")
+
+_REDIS_PREFIX = "agrigpt:flight:"
+
+# After a Redis failure, coalesce in-process only for this long before retrying
+_REDIS_RETRY_SECONDS = 30.0
+
+# All flight groups created in this process, for metrics
+_GROUPS: Dict[str, "SingleFlight"] = {}
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into a single execution."""
+
+    def __init__(
+        self,
+        name: str,
+        lock_ttl_seconds: float = 90.0,
+        result_ttl_seconds: float = 30.0,
+        poll_interval: float = 0.1,
+        use_redis: bool = True,
+    ) -> None:
+        self.name = name
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.result_ttl_seconds = result_ttl_seconds
+        self.poll_interval = poll_interval
+        self._use_redis = use_redis
+        self._redis_down_until = 0.0
+        self._inflight: Dict[str, Tuple[asyncio.AbstractEventLoop, asyncio.Task]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "executions": 0,
+            "local_followers": 0,
+            "remote_followers": 0,
+            "remote_timeouts": 0,
+            "unshared": 0,
+            "redis_failures": 0,
+        }
+        _GROUPS[name] = self
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        shareable: Optional[Callable[[T], bool]] = None,
+    ) -> Tuple[T, bool]:
+        """
+        Run fn once per key among concurrent callers.
+        Returns (result, shared) - shared is True when another caller did the work.
+        `shareable(result)` returning False (e.g. a deadline-degraded answer)
+        keeps the result from being handed to followers or published.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            current = self._inflight.get(key)
+            if current and current[0] is loop and not current[1].done():
+                self._stats["local_followers"] += 1
+                task = current[1]
+                leader = False
+            else:
+                task = loop.create_task(self._execute(key, fn, shareable))
+                self._inflight[key] = (loop, task)
+                leader = True
+
+        if leader:
+            task.add_done_callback(lambda _t: self._forget(key, _t))
+            # shield: a cancelled caller must not cancel work other callers await
+            result, remote = await asyncio.shield(task)
+            return result, remote
+
+        try:
+            result, _ = await deadline.await_within(asyncio.shield(task), stage=f"coalesced:{self.name}")
+        except DeadlineExceeded:
+            if not _ran_out(task):
+                raise  # this caller's own deadline
+        else:
+            if shareable is None or shareable(result):
+                return result, True
+        return await self._run_unshared(fn), False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "in_flight": len(self._inflight)}
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        with self._lock:
+            current = self._inflight.get(key)
+            if current and current[1] is task:
+                del self._inflight[key]
+
+    async def _run_unshared(self, fn: Callable[[], Awaitable[T]]) -> T:
+        with self._lock:
+            self._stats["unshared"] += 1
+        return await self._compute(fn)
+
+    async def _execute(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        shareable: Optional[Callable[[T], bool]] = None,
+    ) -> Tuple[T, bool]:
+        """Leader path: coordinate via Redis when available, then compute. Returns (result, remote)."""
+        r = await self._redis()
+        if r is None:
+            return await self._compute(fn), False
+
+        lock_key = f"{_REDIS_PREFIX}{self.name}:{key}:lock"
+        result_key = f"{_REDIS_PREFIX}{self.name}:{key}:result"
+        token = uuid.uuid4().hex
+
+        try:
+            acquired = await asyncio.to_thread(
+                r.set, lock_key, token, nx=True, px=int(self.lock_ttl_seconds * 1000)
+            )
+        except Exception as e:
+            self._mark_redis_down(e)
+            return await self._compute(fn), False
+
+        if not acquired:
+            published = await self._wait_for_remote(r, lock_key, result_key)
+            if published is not None and (shareable is None or shareable(published)):
+                with self._lock:
+                    self._stats["remote_followers"] += 1
+                return published, True
+            return await self._compute(fn), False
+
+        try:
+            result = await self._compute(fn)
+            if shareable is None or shareable(result):
+                try:
+                    await asyncio.to_thread(
+                        r.set, result_key, json.dumps(result), px=int(self.result_ttl_seconds * 1000)
+                    )
+                except (TypeError, ValueError):
+                    pass
+                except Exception as e:
+                    self._mark_redis_down(e)
+            return result, False
+        finally:
+            try:
+                await asyncio.to_thread(self._release, r, lock_key, token)
+            except Exception as e:
+                self._mark_redis_down(e)
+
+    async def _redis(self) -> Optional[Any]:
+        """The Redis client, fetched off the loop; None when unused, unset or backing off."""
+        url = str(settings.REDIS_URL or "").strip().lower()
+        if not self._use_redis or not url or url in ("none", "false"):
+            return None
+        if time.monotonic() < self._redis_down_until:
+            return None
+        r = await asyncio.to_thread(get_redis)
+        if r is None:
+            self._mark_redis_down("connection failed")
+        return r
+
+    def _mark_redis_down(self, error: Any) -> None:
+        with self._lock:
+            self._stats["redis_failures"] += 1
+            if time.monotonic() >= self._redis_down_until:
+                print(f"[SINGLE FLIGHT] {self.name}: Redis unavailable, coalescing in-process "
+                      f"for {_REDIS_RETRY_SECONDS:.0f}s: {error}")
+            self._redis_down_until = time.monotonic() + _REDIS_RETRY_SECONDS
+        reset_redis()
+
+    async def _compute(self, fn: Callable[[], Awaitable[T]]) -> T:
+        with self._lock:
+            self._stats["executions"] += 1
+        return await fn()
+
+    async def _wait_for_remote(self, r: Any, lock_key: str, result_key: str) -> Optional[Any]:
+        """
+        Poll for the remote leader's result until it lands or the lock goes
+        away - for at most the lock TTL, or what is left of the request deadline.
+        """
+        limit = self.lock_ttl_seconds
+        left = deadline.remaining()
+        if left is not None:
+            limit = min(limit, max(0.0, left))
+        waited = 0.0
+        while waited < limit:
+            try:
+                raw = await asyncio.to_thread(r.get, result_key)
+                if raw:
+                    return _decode(raw)
+                if not await asyncio.to_thread(r.exists, lock_key):
+                    raw = await asyncio.to_thread(r.get, result_key)
+                    return _decode(raw) if raw else None
+            except Exception as e:
+                self._mark_redis_down(e)
+                return None
+            await asyncio.sleep(self.poll_interval)
+            waited += self.poll_interval
+        with self._lock:
+            self._stats["remote_timeouts"] += 1
+        return None
+
+    @staticmethod
+    def _release(r: Any, lock_key: str, token: str) -> None:
+        """Delete the lock only if this worker still owns it."""
+        if r.get(lock_key) == token:
+            r.delete(lock_key)
+
+
+def _ran_out(task: asyncio.Task) -> bool:
+    """True when the shared work ended because the leader's own deadline passed."""
+    return task.done() and not task.cancelled() and isinstance(task.exception(), DeadlineExceeded)
+
+
+def _decode(raw: str) -> Any:
+    value = json.loads(raw)
+    return tuple(value) if isinstance(value, list) else value
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Stats for every flight group created in this process."""
+    return {name: group.stats() for name, group in _GROUPS.items()}
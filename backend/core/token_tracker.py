@@ -2,14 +2,16 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Dict, Optional
+from typing import Any, Dict, Iterable, Optional
 import threading
 
 # Groq pricing (approximate $/1M tokens, as of 2025 - adjust as needed)
 # llama-3.3-70b: input ~$0.59, output ~$0.79 per 1M tokens
 # meta-llama/llama-4-scout-17b: input ~$0.11, output ~$0.34 per 1M tokens
+# llama-3.1-8b-instant (cascade fallback): input ~$0.05, output ~$0.08 per 1M tokens
 GROQ_PRICING = {
     "llama-3.3-70b-versatile": {"input": 0.59, "output": 0.79},
+    "llama-3.1-8b-instant": {"input": 0.05, "output": 0.08},
     "meta-llama/llama-4-scout-17b-16e-instruct": {"input": 0.11, "output": 0.34},
     # Legacy (fallback for old recorded sessions)
     "llama-3.1-70b-versatile": {"input": 0.59, "output": 0.79},
@@ -22,13 +24,17 @@ class TokenUsage:
     input_tokens: int = 0
     output_tokens: int = 0
     model: str = ""
+    # Answer shared from another request's call (single-flight); its cost was paid there
+    coalesced: bool = False
 
     @property
     def total_tokens(self) -> int:
         return self.input_tokens + self.output_tokens
 
     def estimated_cost_usd(self) -> float:
-        """Rough cost estimate in USD."""
+        """Rough cost estimate in USD (0 for coalesced usage)."""
+        if self.coalesced:
+            return 0.0
         pricing = GROQ_PRICING.get(
             self.model,
             {"input": 0.50, "output": 0.80}
@@ -44,7 +50,8 @@ class TokenTracker:
     def __init__(self) -> None:
         self._lock = threading.Lock()
         self._request_usage: Dict[str, list[TokenUsage]] = {}
-        self._session_totals: Dict[str, TokenUsage] = {}
+        # session_id -> model -> running totals (priced per model)
+        self._session_totals: Dict[str, Dict[str, TokenUsage]] = {}
 
     def record(
         self,
@@ -67,17 +74,50 @@ class TokenTracker:
                 self._request_usage[request_id].append(usage)
 
             if session_id:
-                if session_id not in self._session_totals:
-                    self._session_totals[session_id] = TokenUsage()
-                s = self._session_totals[session_id]
+                by_model = self._session_totals.setdefault(session_id, {})
+                if model not in by_model:
+                    by_model[model] = TokenUsage(model=model)
+                s = by_model[model]
                 s.input_tokens += input_tokens
                 s.output_tokens += output_tokens
-                s.model = model
+
+    def record_coalesced(self, usage: Dict[str, Any], request_id: Optional[str]) -> None:
+        """
+        Usage dict ({input_tokens, output_tokens, model}) of a call this request
+        shared with another (single-flight). Counted in the request's tokens
+        but not in its cost, nor in session totals.
+        """
+        if not request_id or not usage.get("model"):
+            return
+        shared = TokenUsage(
+            int(usage.get("input_tokens", 0) or 0),
+            int(usage.get("output_tokens", 0) or 0),
+            str(usage["model"]),
+            coalesced=True,
+        )
+        with self._lock:
+            self._request_usage.setdefault(request_id, []).append(shared)
+
+    def copy_coalesced(self, from_request_id: Optional[str], to_request_id: Optional[str]) -> None:
+        """Attribute every call of one request to another that shared its whole result."""
+        if not from_request_id or not to_request_id or from_request_id == to_request_id:
+            return
+        with self._lock:
+            usages = [
+                TokenUsage(u.input_tokens, u.output_tokens, u.model, coalesced=True)
+                for u in self._request_usage.get(from_request_id, [])
+            ]
+            if usages:
+                self._request_usage.setdefault(to_request_id, []).extend(usages)
 
     def get_request_summary(self, request_id: str) -> Optional[Dict]:
         """Get token summary for a request."""
+        return self.get_requests_summary([request_id])
+
+    def get_requests_summary(self, request_ids: Iterable[str]) -> Optional[Dict]:
+        """Combined token summary for several requests (e.g. one /ask/batch)."""
         with self._lock:
-            usages = self._request_usage.get(request_id, [])
+            usages = [u for rid in request_ids for u in self._request_usage.get(rid, [])]
         if not usages:
             return None
         total_in = sum(u.input_tokens for u in usages)
@@ -88,21 +128,41 @@ class TokenTracker:
             "output_tokens": total_out,
             "total_tokens": total_in + total_out,
             "calls": len(usages),
+            "coalesced_calls": sum(1 for u in usages if u.coalesced),
             "estimated_cost_usd": round(cost, 6),
+            "by_model": _by_model(usages),
         }
 
     def get_session_summary(self, session_id: str) -> Optional[Dict]:
         """Get token summary for a session."""
         with self._lock:
-            s = self._session_totals.get(session_id)
-        if not s:
+            totals = self._session_totals.get(session_id)
+            usages = [TokenUsage(u.input_tokens, u.output_tokens, u.model) for u in (totals or {}).values()]
+        if not usages:
             return None
+        total_in = sum(u.input_tokens for u in usages)
+        total_out = sum(u.output_tokens for u in usages)
         return {
-            "input_tokens": s.input_tokens,
-            "output_tokens": s.output_tokens,
-            "total_tokens": s.total_tokens,
-            "estimated_cost_usd": s.estimated_cost_usd(),
+            "input_tokens": total_in,
+            "output_tokens": total_out,
+            "total_tokens": total_in + total_out,
+            "estimated_cost_usd": round(sum(u.estimated_cost_usd() for u in usages), 6),
+            "by_model": _by_model(usages),
         }
 
 
+def _by_model(usages: Iterable[TokenUsage]) -> Dict[str, Dict[str, Any]]:
+    """Tokens and cost per model that actually answered (cascade fallbacks show up here)."""
+    out: Dict[str, Dict[str, Any]] = {}
+    for u in usages:
+        entry = out.setdefault(
+            u.model or "unknown",
+            {"input_tokens": 0, "output_tokens": 0, "estimated_cost_usd": 0.0},
+        )
+        entry["input_tokens"] += u.input_tokens
+        entry["output_tokens"] += u.output_tokens
+        entry["estimated_cost_usd"] = round(entry["estimated_cost_usd"] + u.estimated_cost_usd(), 6)
+    return out
+
+
 token_tracker = TokenTracker()
@@ -0,0 +1,301 @@
+"""
+Content-hash cache for vision diagnoses.
+
+Keys are a SHA-256 over the vision model, prompts and the normalised
+(preprocessed) image bytes, so re-uploads of the same photo skip the vision
+call. An optional perceptual mode (64-bit dHash, Hamming distance) also
+catches near-duplicate re-encodes of the same photo. Entries live in a
+bounded LRU with TTL and can be persisted to Redis or disk.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from backend.core.config import settings
+from backend.core.redis_client import get_redis, reset_redis
+from backend.core.semantic_cache import PurgeGeneration, bump_generation, register_cache, register_store
+
+try:
+    from PIL import Image
+except ImportError:  # perceptual mode needs Pillow
+    Image = None
+
+_REDIS_PREFIX = "agrigpt:vision:"
+
+DEFAULT_DISK_DIR = Path(__file__).resolve().parent.parent / "data" / "vision_cache"
+
+
+def dhash(data: Any, hash_size: int = 8) -> Optional[int]:
+    """64-bit difference hash of an image; None if it cannot be decoded."""
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft("L", (hash_size * 4, hash_size * 4))
+        small = img.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR)
+    except Exception:
+        return None
+    px = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = px[row * (hash_size + 1) + col]
+            right = px[row * (hash_size + 1) + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    return bits
+
+
+@dataclass
+class _Entry:
+    value: Any
+    partition: str
+    phash: Optional[int]
+    expires_at: float
+
+
+class VisionCache:
+    """LRU + TTL cache of vision results keyed by image content."""
+
+    def __init__(
+        self,
+        name: str = "vision",
+        max_entries: int = 500,
+        ttl_seconds: int = 7 * 24 * 3600,
+        backend: str = "memory",
+        disk_dir: Optional[str] = None,
+        phash_enabled: bool = False,
+        phash_max_distance: int = 4,
+        disk_max_entries: int = 5000,
+    ) -> None:
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend if backend in ("memory", "redis", "disk") else "memory"
+        self.phash_enabled = phash_enabled and Image is not None
+        self.phash_max_distance = phash_max_distance
+        self.disk_max_entries = disk_max_entries
+        self._disk_dir = Path(disk_dir) if disk_dir else None
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._stats = {"hits": 0, "phash_hits": 0, "persistent_hits": 0, "misses": 0, "stores": 0}
+        # Purges on other workers clear this LRU too (see core.semantic_cache)
+        self._generation = PurgeGeneration(name)
+        register_cache(self)
+
+    @staticmethod
+    def make_key(image_bytes: Any, partition: str) -> str:
+        h = hashlib.sha256(partition.encode("utf-8"))
+        h.update(b"\x1f")
+        h.update(image_bytes)
+        return h.hexdigest()
+
+    @staticmethod
+    def make_partition(model: str, *prompts: str) -> str:
+        """Model + prompts; near-duplicate matching never crosses partitions."""
+        h = hashlib.sha256(model.encode("utf-8"))
+        for p in prompts:
+            h.update(b"\x1f")
+            h.update(str(p).encode("utf-8"))
+        return h.hexdigest()[:32]
+
+    def lookup(self, image_bytes: Any, partition: str) -> Tuple[Optional[Any], str, Optional[int]]:
+        """
+        Return (value, key, phash). value is None on a miss; key and phash are
+        handed back to store() so the image is not hashed twice.
+        """
+        key = self.make_key(image_bytes, partition)
+        now = time.time()
+        self._sync_generation()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry.value, key, entry.phash
+
+        value = self._persistent_get(key)
+        if value is not None:
+            with self._lock:
+                self._stats["hits"] += 1
+                self._stats["persistent_hits"] += 1
+            self._remember(key, value, partition, None)
+            return value, key, None
+
+        phash = dhash(image_bytes) if self.phash_enabled else None
+        if phash is not None:
+            with self._lock:
+                match = self._nearest(phash, partition, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self._stats["hits"] += 1
+                    self._stats["phash_hits"] += 1
+                    return self._entries[match].value, key, phash
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None, key, phash
+
+    def store(self, key: str, value: Any, partition: str, phash: Optional[int] = None) -> None:
+        """Insert a result (JSON-serialisable when persisted)."""
+        self._sync_generation()
+        self._remember(key, value, partition, phash)
+        with self._lock:
+            self._stats["stores"] += 1
+            stores = self._stats["stores"]
+        self._persistent_set(key, value)
+        if self.backend == "disk" and stores % 100 == 0:
+            self._prune_disk()
+
+    def purge(self) -> int:
+        with self._lock:
+            removed = len(self._entries)
+            self._entries.clear()
+        purge_stored(self.backend, self._disk_dir, self.name)
+        self._generation.changed(force=True)
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "backend": self.backend,
+                "phash": self.phash_enabled,
+                "hit_ratio": round(self._stats["hits"] / lookups, 4) if lookups else None,
+            }
+
+    # --- internals ---
+
+    def _remember(self, key: str, value: Any, partition: str, phash: Optional[int]) -> None:
+        with self._lock:
+            self._entries[key] = _Entry(
+                value=value,
+                partition=partition,
+                phash=phash,
+                expires_at=time.time() + self.ttl_seconds,
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _nearest(self, phash: int, partition: str, now: float) -> Optional[str]:
+        """Lock held. Closest unexpired entry within phash_max_distance."""
+        best_key, best_dist = None, self.phash_max_distance + 1
+        for k, e in self._entries.items():
+            if e.phash is None or e.partition != partition or e.expires_at <= now:
+                continue
+            dist = bin(e.phash ^ phash).count("1")
+            if dist < best_dist:
+                best_key, best_dist = k, dist
+        return best_key
+
+    def _sync_generation(self) -> None:
+        if self._generation.changed():
+            with self._lock:
+                self._entries.clear()
+
+    def _redis_key(self, key: str) -> str:
+        return f"{_REDIS_PREFIX}{self._generation.current}:{key}"
+
+    def _disk_path(self, key: str) -> Optional[Path]:
+        return self._disk_dir / f"{key}.json" if self._disk_dir else None
+
+    def _persistent_get(self, key: str) -> Optional[Any]:
+        if self.backend == "redis":
+            r = get_redis()
+            if not r:
+                return None
+            try:
+                raw = r.get(self._redis_key(key))
+                return json.loads(raw) if raw else None
+            except Exception:
+                reset_redis()
+                return None
+        if self.backend == "disk":
+            path = self._disk_path(key)
+            if not path or not path.exists():
+                return None
+            try:
+                record = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:
+                return None
+            if record.get("expires_at", 0) <= time.time():
+                path.unlink(missing_ok=True)
+                return None
+            return record.get("value")
+        return None
+
+    def _persistent_set(self, key: str, value: Any) -> None:
+        if self.backend == "redis":
+            r = get_redis()
+            if not r:
+                return
+            try:
+                r.setex(self._redis_key(key), self.ttl_seconds, json.dumps(value))
+            except Exception:
+                reset_redis()
+        elif self.backend == "disk":
+            path = self._disk_path(key)
+            if not path:
+                return
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                tmp.write_text(
+                    json.dumps({"value": value, "expires_at": time.time() + self.ttl_seconds}),
+                    encoding="utf-8",
+                )
+                os.replace(tmp, path)
+            except Exception as e:
+                print(f"[CACHE:{self.name}] Disk write failed: {e}")
+
+    def _prune_disk(self) -> None:
+        """Keep at most disk_max_entries files, dropping the oldest first."""
+        if not self._disk_dir or not self._disk_dir.exists():
+            return
+        try:
+            files = sorted(self._disk_dir.glob("*.json"), key=lambda p: p.stat().st_mtime)
+            for path in files[: max(0, len(files) - self.disk_max_entries)]:
+                path.unlink(missing_ok=True)
+        except Exception as e:
+            print(f"[CACHE:{self.name}] Disk prune failed: {e}")
+
+
+def purge_stored(backend: str, disk_dir: Optional[Path], name: str = "vision") -> None:
+    """Delete persisted vision results (Redis keys or disk files) and tell other workers to drop theirs."""
+    bump_generation(name)
+    if backend == "redis":
+        r = get_redis()
+        if r:
+            try:
+                keys = list(r.scan_iter(match=f"{_REDIS_PREFIX}*", count=500))
+                if keys:
+                    r.delete(*keys)
+            except Exception:
+                reset_redis()
+    elif backend == "disk" and disk_dir and disk_dir.exists():
+        for path in disk_dir.glob("*.json"):
+            path.unlink(missing_ok=True)
+
+
+def _purge_configured_store() -> None:
+    purge_stored(
+        str(settings.VISION_CACHE_BACKEND).strip().lower(),
+        Path(settings.VISION_CACHE_DIR) if settings.VISION_CACHE_DIR else DEFAULT_DISK_DIR,
+    )
+
+
+register_store("vision", _purge_configured_store)
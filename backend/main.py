@@ -8,10 +8,13 @@ from fastapi.staticfiles import StaticFiles
 
 # Routers
 from backend.routes.health_router import router as health_router
-from backend.routes.ask_router import router as ask_router
+from backend.routes.ask_router import router as ask_router, MAX_REQUEST_BODY_BYTES
 from backend.routes.weather_router import router as weather_router
 from backend.routes.metrics_router import router as metrics_router
+from backend.routes.jobs_router import router as jobs_router
+from backend.routes.ws_router import router as ws_router
 from backend.core.config import settings
+from backend.core.body_limit import BodySizeLimitMiddleware
 
 app = FastAPI(
     title="AgriGPT Backend",
@@ -19,6 +22,10 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Reject oversized /ask and /jobs bodies before Starlette spools the multipart upload
+# (added first so CORS headers still wrap the 413)
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_REQUEST_BODY_BYTES, path_prefixes=("/ask", "/jobs"))
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  
@@ -31,6 +38,8 @@ app.include_router(health_router)
 app.include_router(weather_router)
 app.include_router(ask_router)
 app.include_router(metrics_router)
+app.include_router(jobs_router)
+app.include_router(ws_router)
 
 # Ensure static dir exists before mounting (avoids startup failure)
 _static_dir = Path(__file__).resolve().parent / "static"
@@ -54,10 +63,17 @@ def root():
             "/ask/text",
             "/ask/image",
             "/ask/chat",
+            "/ask/stream",
+            "/ask/batch",
+            "/jobs",
+            "/ws/chat",
             "/weather",
             "/health",
             "/metrics/usage",
             "/metrics/quality",
+            "/metrics/cache",
+            "/metrics/routing",
+            "/metrics/admission",
             "/metrics/feedback",
             "/docs"
         ]
@@ -98,4 +114,16 @@ async def startup_event():
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    import asyncio
+    from backend.core.job_queue import aclose_job_queue
+    from backend.core.llm_client import aclose_http_clients
+    from backend.core.log_writer import drain_log_writers
+    from backend.services.feedback_service import close_feedback_log
+    from backend.services.history_service import close_interaction_log
+    await aclose_job_queue()
+    await aclose_http_clients()
+    # Write out queued interaction/feedback records before the process exits
+    await asyncio.to_thread(drain_log_writers)
+    close_interaction_log()
+    close_feedback_log()
     print(" AgriGPT Backend Shutting down....")
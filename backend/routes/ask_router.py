@@ -1,16 +1,27 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-import tempfile
-import os
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
+import json
 import time
 import uuid
-from typing import Optional
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
 
+from backend.core.admission import IMAGE, TEXT, AdmissionRejected, get_controller
+from backend.core.config import settings
+from backend.core.deadline import deadline_scope
 from backend.core.token_tracker import token_tracker
+from backend.services.vision_service import sniff_image_mime
 
 router = APIRouter(prefix="/ask", tags=["Query"])
 
 ALLOWED_IMAGE_MIME = {"image/jpeg", "image/png"}
 MAX_UPLOAD_BYTES = 8 * 1024 * 1024
+UPLOAD_CHUNK_BYTES = 64 * 1024
+# Whole-request cap for /ask (enforced by BodySizeLimitMiddleware): image + form fields + multipart framing
+MAX_REQUEST_BODY_BYTES = MAX_UPLOAD_BYTES + 256 * 1024
 MAX_QUERY_CHARS = 2000
 
 
@@ -39,6 +50,68 @@ def _build_response(
     return out
 
 
+async def _read_upload(file: UploadFile, empty_detail: str) -> memoryview:
+    """
+    Stream an uploaded image into a bounded in-memory buffer.
+    Magic bytes are checked on the first chunk and the byte counter stops the
+    read as soon as MAX_UPLOAD_BYTES is crossed. The bytes go straight to the
+    vision service - no temp file round trip.
+    """
+    if not file.content_type or file.content_type not in ALLOWED_IMAGE_MIME:
+        raise HTTPException(415, "Only JPEG/PNG images allowed.")
+
+    buf = bytearray()
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        if not buf and sniff_image_mime(chunk) not in ALLOWED_IMAGE_MIME:
+            raise HTTPException(415, "Only JPEG/PNG images allowed.")
+        if len(buf) + len(chunk) > MAX_UPLOAD_BYTES:
+            raise HTTPException(413, "File too large (max 8MB).")
+        buf += chunk
+
+    if not buf:
+        raise HTTPException(400, empty_detail)
+
+    return memoryview(buf)
+
+
+async def _admit(kind: str) -> Callable[[], None]:
+    """
+    Take an admission slot ("text" or "image" traffic); sheds load with
+    429/503 + Retry-After. Returns an idempotent release callback.
+    """
+    if not settings.ADMISSION_ENABLED:
+        return lambda: None
+
+    controller = get_controller(kind)
+    try:
+        await controller.acquire()
+    except AdmissionRejected as e:
+        raise HTTPException(e.status_code, e.detail, headers={"Retry-After": str(e.retry_after)})
+
+    started = time.monotonic()
+    released = False
+
+    def release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            controller.release(time.monotonic() - started)
+
+    return release
+
+
+@asynccontextmanager
+async def _admitted(kind: str) -> AsyncIterator[None]:
+    release = await _admit(kind)
+    try:
+        yield
+    finally:
+        release()
+
+
 @router.post("/text")
 async def ask_text(
     query: str = Form(...),
@@ -55,17 +128,19 @@ async def ask_text(
     if len(query) > MAX_QUERY_CHARS:
         raise HTTPException(413, f"Query too long. Max {MAX_QUERY_CHARS} chars.")
 
-    from backend.agents.master_agent import route_query
+    from backend.agents.master_agent import aroute_query
 
-    try:
-        response = route_query(
-            query=query,
-            image_path=None,
-            session_id=session_id,
-            request_id=request_id,
-        )
-    except Exception as e:
-        raise HTTPException(500, f"Error: {str(e)}")
+    async with _admitted(TEXT):
+        try:
+            with deadline_scope(settings.DEADLINE_TEXT_SECONDS):
+                response, meta = await aroute_query(
+                    query=query,
+                    image_path=None,
+                    session_id=session_id,
+                    request_id=request_id,
+                )
+        except Exception as e:
+            raise HTTPException(500, f"Error: {str(e)}")
 
     return _build_response(
         request_id,
@@ -73,68 +148,48 @@ async def ask_text(
         response,
         session_id=session_id,
         query=query,
+        **meta,
     )
 
 
 @router.post("/image")
 async def ask_image(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     session_id: Optional[str] = Form(None),
 ):
     """Image-only crop analysis endpoint."""
     start = time.time()
     request_id = str(uuid.uuid4())
-    tmp_path = ""
 
-    if not file.content_type or file.content_type not in ALLOWED_IMAGE_MIME:
-        raise HTTPException(415, "Only JPEG/PNG images allowed.")
-
-    try:
-        data = await file.read()
-
-        if not data:
-            raise HTTPException(400, "Empty image file.")
-
-        if len(data) > MAX_UPLOAD_BYTES:
-            raise HTTPException(413, "File too large (max 8MB).")
-
-        ext = ".jpg" if file.content_type == "image/jpeg" else ".png"
+    image_bytes = await _read_upload(file, "Empty image file.")
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            tmp.write(data)
-            tmp_path = tmp.name
-
-        from backend.agents.master_agent import route_query
-
-        response = route_query(
-            query=None,
-            image_path=tmp_path,
-            session_id=session_id,
-            request_id=request_id,
-        )
-
-        background_tasks.add_task(os.remove, tmp_path)
-
-        return _build_response(
-            request_id,
-            start,
-            response,
-            session_id=session_id,
-            image_uploaded=True,
-        )
+    async with _admitted(IMAGE):
+        try:
+            from backend.agents.master_agent import aroute_query
+
+            with deadline_scope(settings.DEADLINE_IMAGE_SECONDS):
+                response, meta = await aroute_query(
+                    query=None,
+                    image_bytes=image_bytes,
+                    session_id=session_id,
+                    request_id=request_id,
+                )
+
+            return _build_response(
+                request_id,
+                start,
+                response,
+                session_id=session_id,
+                **meta,
+                image_uploaded=True,
+            )
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        if tmp_path and os.path.exists(tmp_path):
-            background_tasks.add_task(os.remove, tmp_path)
-        raise HTTPException(500, f"Error: {str(e)}")
+        except Exception as e:
+            raise HTTPException(500, f"Error: {str(e)}")
 
 
 @router.post("/chat")
 async def ask_chat(
-    background_tasks: BackgroundTasks,
     query: str = Form(...),
     file: UploadFile = File(None),
     session_id: Optional[str] = Form(None),
@@ -155,72 +210,296 @@ async def ask_chat(
     if query_clean and len(query_clean) > MAX_QUERY_CHARS:
         raise HTTPException(413, f"Query too long. Max {MAX_QUERY_CHARS} chars.")
 
-    from backend.agents.master_agent import route_query
+    from backend.agents.master_agent import aroute_query
 
     # Text only (no file uploaded)
     if not file or not file.filename:
-        try:
-            response = route_query(
-                query=query_clean,
-                image_path=None,
-                session_id=session_id,
-                request_id=request_id,
-            )
-        except Exception as e:
-            raise HTTPException(500, f"Error: {str(e)}")
+        async with _admitted(TEXT):
+            try:
+                with deadline_scope(settings.DEADLINE_CHAT_SECONDS):
+                    response, meta = await aroute_query(
+                        query=query_clean,
+                        image_path=None,
+                        session_id=session_id,
+                        request_id=request_id,
+                    )
+            except Exception as e:
+                raise HTTPException(500, f"Error: {str(e)}")
 
         return _build_response(
             request_id,
             start,
             response,
             session_id=session_id,
+            **meta,
             mode="text_only",
             query=query_clean,
         )
 
     # Multimodal (text + image)
-    if not file.content_type or file.content_type not in ALLOWED_IMAGE_MIME:
-        raise HTTPException(415, "Only JPEG/PNG images allowed.")
+    image_bytes = await _read_upload(file, "Image file is empty.")
 
-    tmp_path = ""
+    async with _admitted(IMAGE):
+        try:
+            with deadline_scope(settings.DEADLINE_CHAT_SECONDS):
+                response, meta = await aroute_query(
+                    query=query_clean,
+                    image_bytes=image_bytes,
+                    session_id=session_id,
+                    request_id=request_id,
+                )
+
+            return _build_response(
+                request_id,
+                start,
+                response,
+                session_id=session_id,
+                **meta,
+                mode="multimodal",
+                query=query_clean,
+                image_uploaded=True,
+            )
 
-    try:
-        data = await file.read()
+        except Exception as e:
+            raise HTTPException(500, f"Error: {str(e)}")
 
-        if not data:
-            raise HTTPException(400, "Image file is empty.")
 
-        if len(data) > MAX_UPLOAD_BYTES:
-            raise HTTPException(413, "File too large (max 8MB).")
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    """Encode one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
-        ext = ".jpg" if file.content_type == "image/jpeg" else ".png"
 
-        with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as tmp:
-            tmp.write(data)
-            tmp_path = tmp.name
+@router.post("/stream")
+async def ask_stream(
+    query: str = Form(""),
+    file: UploadFile = File(None),
+    session_id: Optional[str] = Form(None),
+):
+    """
+    Server-Sent Events variant of /ask/chat.
+    Emits "routed" and "agent_done" stage events, then the formatter's
+    "token" events as Groq produces them, and finally a "final" event with
+    the full response (request_id, token_usage, elapsed_ms).
+    """
+    start = time.time()
+    request_id = str(uuid.uuid4())
+    query_clean = (query or "").strip()
 
-        response = route_query(
-            query=query_clean,
-            image_path=tmp_path,
-            session_id=session_id,
-            request_id=request_id,
-        )
+    has_image = bool(file and file.filename)
+    if not query_clean and not has_image:
+        raise HTTPException(400, "Query cannot be empty")
 
-        background_tasks.add_task(os.remove, tmp_path)
+    if query_clean and len(query_clean) > MAX_QUERY_CHARS:
+        raise HTTPException(413, f"Query too long. Max {MAX_QUERY_CHARS} chars.")
 
-        return _build_response(
-            request_id,
-            start,
-            response,
-            session_id=session_id,
-            mode="multimodal",
-            query=query_clean,
-            image_uploaded=True,
-        )
+    image_bytes = await _read_upload(file, "Image file is empty.") if has_image else None
+
+    from backend.agents.master_agent import aroute_query
+
+    # The slot is held until the stream finishes (or the client goes away)
+    release = await _admit(IMAGE if has_image else TEXT)
+
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def on_event(event: str, data: Dict[str, Any]) -> None:
+        await events.put((event, data))
+
+    async def run_pipeline() -> None:
+        try:
+            with deadline_scope(settings.DEADLINE_STREAM_SECONDS):
+                response, meta = await aroute_query(
+                    query=query_clean,
+                    image_bytes=image_bytes,
+                    session_id=session_id,
+                    request_id=request_id,
+                    on_event=on_event,
+                )
+            extra: Dict[str, Any] = {"mode": "multimodal" if has_image else "text_only", **meta}
+            if query_clean:
+                extra["query"] = query_clean
+            if has_image:
+                extra["image_uploaded"] = True
+            await events.put((
+                "final",
+                _build_response(request_id, start, response, session_id=session_id, **extra),
+            ))
+        except Exception as e:
+            await events.put(("error", {"request_id": request_id, "detail": f"Error: {str(e)}"}))
+        finally:
+            await events.put(None)
+
+    async def event_stream():
+        task = asyncio.create_task(run_pipeline())
+        try:
+            yield _sse("start", {"request_id": request_id})
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                yield _sse(*item)
+        finally:
+            if not task.done():
+                task.cancel()
+            release()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(release),
+    )
+
+
+def _parse_batch(raw: bytes, content_type: str) -> List[Dict[str, Any]]:
+    """
+    Batch body -> [{"id", "query", "session_id"}]. Accepts a JSON list, a JSON
+    object {"queries": [...], "session_id": default}, or NDJSON (one item per
+    line). Items are plain strings or objects with "query" and optional
+    "id" / "session_id".
+    """
+    try:
+        text = raw.decode("utf-8-sig")
+        if "ndjson" in content_type or "jsonl" in content_type:
+            body: Any = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            body = json.loads(text)
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise HTTPException(400, f"Invalid batch body: {e}")
+
+    default_session = None
+    if isinstance(body, dict):
+        default_session = body.get("session_id")
+        body = body.get("queries")
+    if not isinstance(body, list) or not body:
+        raise HTTPException(400, "Batch must be a non-empty list of queries.")
+    if len(body) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(413, f"Too many queries. Max {settings.BATCH_MAX_ITEMS} per batch.")
+
+    items = []
+    for entry in body:
+        if isinstance(entry, str):
+            entry = {"query": entry}
+        if not isinstance(entry, dict):
+            raise HTTPException(400, "Each batch item must be a string or an object with 'query'.")
+        session = entry.get("session_id") or default_session
+        items.append({
+            "id": entry.get("id"),
+            "query": str(entry.get("query") or "").strip(),
+            "session_id": str(session) if session else None,
+        })
+    return items
+
+
+class _BatchPacer:
+    """Spaces a batch's query starts evenly, `per_minute` at most (0 = no pacing)."""
+
+    def __init__(self, per_minute: int) -> None:
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        start, self._next = max(now, self._next), max(now, self._next) + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+def _ndjson(data: Dict[str, Any]) -> str:
+    return json.dumps(data, ensure_ascii=False) + "\n"
+
+
+@router.post("/batch")
+async def ask_batch(request: Request):
+    """
+    Bulk text queries (JSON list or NDJSON body, see _parse_batch).
+    Streams one NDJSON "result" line per query as it completes - with its
+    index, id and the usual /ask/text payload, or status "error" - then a
+    "summary" line with counts and combined token usage / cost. Queries run
+    BATCH_CONCURRENCY at a time; queries sharing a session_id run in
+    submission order. The rate-limit governor paces the Groq calls when
+    GOVERNOR_ENABLED is on; otherwise the batch itself starts at most
+    BATCH_QUERIES_PER_MINUTE queries.
+    """
+    start = time.time()
+    batch_id = str(uuid.uuid4())
+    items = _parse_batch(await request.body(), request.headers.get("content-type", ""))
+
+    from backend.agents.master_agent import aroute_query
+
+    # The whole batch holds one text slot so bulk work cannot crowd out interactive traffic
+    release = await _admit(TEXT)
+
+    pool = asyncio.Semaphore(max(1, settings.BATCH_CONCURRENCY))
+    pace = _BatchPacer(settings.BATCH_QUERIES_PER_MINUTE if not settings.GOVERNOR_ENABLED else 0)
+    session_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def run_item(index: int, item: Dict[str, Any]) -> Tuple[Optional[str], Dict[str, Any]]:
+        item_start = time.time()
+        head = {"type": "result", "index": index, "id": item["id"]}
+        query = item["query"]
+        if not query:
+            return None, {**head, "status": "error", "detail": "Query cannot be empty"}
+        if len(query) > MAX_QUERY_CHARS:
+            return None, {**head, "status": "error", "detail": f"Query too long. Max {MAX_QUERY_CHARS} chars."}
+
+        request_id = str(uuid.uuid4())
+        session_id = item["session_id"]
+        ordered = session_locks[session_id] if session_id else None
+        try:
+            if ordered is not None:
+                await ordered.acquire()
+            try:
+                async with pool:
+                    await pace.wait()
+                    with deadline_scope(settings.DEADLINE_TEXT_SECONDS):
+                        response, meta = await aroute_query(
+                            query=query,
+                            image_path=None,
+                            session_id=session_id,
+                            request_id=request_id,
+                        )
+            finally:
+                if ordered is not None:
+                    ordered.release()
+        except Exception as e:
+            return request_id, {**head, "request_id": request_id, "status": "error", "detail": f"Error: {str(e)}"}
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        if tmp_path and os.path.exists(tmp_path):
-            background_tasks.add_task(os.remove, tmp_path)
-        raise HTTPException(500, f"Error: {str(e)}")
+        payload = _build_response(request_id, item_start, response, session_id=session_id, query=query, **meta)
+        return request_id, {**head, **payload}
+
+    async def result_stream():
+        tasks = [asyncio.create_task(run_item(i, item)) for i, item in enumerate(items)]
+        request_ids: List[str] = []
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                request_id, line = await next_done
+                if request_id:
+                    request_ids.append(request_id)
+                if line.get("status") == "success":
+                    succeeded += 1
+                yield _ndjson(line)
+
+            yield _ndjson({
+                "type": "summary",
+                "batch_id": batch_id,
+                "total": len(items),
+                "succeeded": succeeded,
+                "failed": len(items) - succeeded,
+                "elapsed_ms": int((time.time() - start) * 1000),
+                "token_usage": token_tracker.get_requests_summary(request_ids),
+            })
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            release()
+
+    return StreamingResponse(
+        result_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "X-Batch-Id": batch_id},
+        background=BackgroundTask(release),
+    )
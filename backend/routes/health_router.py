@@ -3,7 +3,12 @@ from datetime import datetime, timedelta
 import time
 
 from backend.core.config import settings, langsmith_enabled
-from backend.core.llm_client import get_llm
+from backend.core.hedging import hedge_stats
+from backend.core.job_queue import job_stats
+from backend.core.llm_client import llm_pool_stats
+from backend.core.log_writer import log_writer_stats
+from backend.core.rate_governor import governor_stats
+from backend.core.resilience import breaker_states, cascade_stats
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -21,12 +26,11 @@ async def health_check():
 
     uptime_sec = int(time.time() - START_TIME)
 
-    try:
-        get_llm()
-        model_ok = bool(settings.TEXT_MODEL_NAME) and bool(settings.GROQ_API_KEY)
-        groq_status = "configured" if model_ok else "not_configured"
-    except Exception as e:
-        groq_status = f"error: {str(e)}"
+    model_ok = bool(settings.TEXT_MODEL_NAME) and bool(settings.GROQ_API_KEY)
+    groq_status = "configured" if model_ok else "not_configured"
+    breakers = breaker_states()
+    if model_ok and any(b["state"] != "closed" for b in breakers.values()):
+        groq_status = "degraded (circuit open)"
 
     langsmith_ok = langsmith_enabled()
     pinecone_ok = bool(settings.PINECONE_API_KEY) and bool(settings.PINECONE_INDEX_NAME)
@@ -43,6 +47,7 @@ async def health_check():
         "models": {
             "text_model": str(settings.TEXT_MODEL_NAME or ""),
             "vision_model": str(settings.VISION_MODEL_NAME or ""),
+            "fallback_text_model": str(settings.FALLBACK_TEXT_MODEL_NAME or ""),
         },
         "dependencies": {
             "groq_api": groq_status,
@@ -50,5 +55,12 @@ async def health_check():
             "pinecone_rag": "configured" if pinecone_ok else "faiss (local)",
             "redis_memory": "connected" if redis_ok else "in-memory",
         },
+        "llm_pool": llm_pool_stats(),
+        "circuit_breakers": breakers,
+        "hedging": hedge_stats(),
+        "rate_limits": governor_stats(),
+        "model_cascade": cascade_stats(),
+        "jobs": job_stats(),
+        "log_writers": log_writer_stats(),
         "notes": "Health OK",
     }
@@ -0,0 +1,64 @@
+"""Asynchronous jobs - submit a query, then poll for partial and final results."""
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+from backend.core.job_queue import QueueFull, get_job_queue, new_job
+from backend.routes.ask_router import MAX_QUERY_CHARS, _read_upload
+
+router = APIRouter(prefix="/jobs", tags=["Jobs"])
+
+
+@router.post("", status_code=202)
+@router.post("/", status_code=202, include_in_schema=False)
+async def submit_job(
+    query: str = Form(""),
+    file: UploadFile = File(None),
+    session_id: Optional[str] = Form(None),
+):
+    """
+    Queue a /ask/chat-style request (text + optional image) and return its
+    job id immediately; poll GET /jobs/{job_id} for progress and the answer.
+    """
+    query_clean = (query or "").strip()
+    has_image = bool(file and file.filename)
+    if not query_clean and not has_image:
+        raise HTTPException(400, "Query cannot be empty")
+
+    if query_clean and len(query_clean) > MAX_QUERY_CHARS:
+        raise HTTPException(413, f"Query too long. Max {MAX_QUERY_CHARS} chars.")
+
+    image_bytes = await _read_upload(file, "Image file is empty.") if has_image else None
+
+    job = new_job(query_clean, session_id, has_image)
+    try:
+        await get_job_queue().submit(job, image_bytes)
+    except QueueFull:
+        raise HTTPException(503, "Too many queued jobs. Please retry shortly.", headers={"Retry-After": "5"})
+
+    poll_url = f"/jobs/{job['job_id']}"
+    return JSONResponse(
+        status_code=202,
+        content={
+            "job_id": job["job_id"],
+            "request_id": job["request_id"],
+            "status": job["status"],
+            "poll_url": poll_url,
+        },
+        headers={"Location": poll_url},
+    )
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """Job status, routed agents, partial agent results and - once done - the final response."""
+    job = await get_job_queue().get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found or expired.")
+    end = job.get("finished_at") or time.time()
+    job["elapsed_ms"] = int((end - job["created_at"]) * 1000)
+    return job
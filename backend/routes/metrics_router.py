@@ -7,23 +7,20 @@ from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, HTTPException, Query
 
+from backend.core.admission import admission_stats
+from backend.core.redis_client import get_redis
+from backend.core import vision_cache  # noqa: F401  (registers the "vision" store)
+from backend.core.semantic_cache import cache_stats, known_caches, purge_caches
+from backend.core.single_flight import single_flight_stats
 from backend.services.feedback_service import get_feedback_log
-from backend.services.history_service import LOG_PATH
+from backend.services.history_service import load_interactions
 
 router = APIRouter(prefix="/metrics", tags=["Metrics"])
 
 
-def _load_query_log() -> List[dict]:
-    """Load query_log.json safely."""
-    try:
-        if not LOG_PATH.exists():
-            return []
-        import json
-        with open(LOG_PATH, "r", encoding="utf-8") as f:
-            data = json.load(f)
-            return data if isinstance(data, list) else []
-    except Exception:
-        return []
+def _load_query_log(since: Optional[datetime] = None) -> List[dict]:
+    """Load the interaction log safely (segments closed before `since` are skipped)."""
+    return load_interactions(since)
 
 
 @router.post("/feedback")
@@ -51,7 +48,8 @@ def get_usage_metrics(days: int = Query(7, ge=1, le=365)) -> Dict[str, Any]:
     Usage metrics from query_log.
     Returns agent distribution, query types, and daily counts.
     """
-    logs = _load_query_log()
+    cutoff_date = (datetime.utcnow() - timedelta(days=days)).date()
+    logs = _load_query_log(datetime.combine(cutoff_date, datetime.min.time()))
     if not logs:
         return {
             "total_requests": 0,
@@ -61,7 +59,6 @@ def get_usage_metrics(days: int = Query(7, ge=1, le=365)) -> Dict[str, Any]:
             "days": days,
         }
 
-    cutoff_date = (datetime.utcnow() - timedelta(days=days)).date()
     agent_counts: Counter = Counter()
     type_counts: Counter = Counter()
     day_counts: Dict[str, int] = defaultdict(int)
@@ -78,8 +75,10 @@ def get_usage_metrics(days: int = Query(7, ge=1, le=365)) -> Dict[str, Any]:
         except Exception:
             continue
 
-        agent = entry.get("agent", "unknown")
-        agent_counts[agent] += 1
+        # Request trace records list every agent that ran; older entries are one per agent
+        agents = entry.get("agents") if isinstance(entry.get("agents"), list) else [entry.get("agent", "unknown")]
+        for agent in agents:
+            agent_counts[agent] += 1
 
         qtype = entry.get("type", "text")
         type_counts[qtype] += 1
@@ -96,6 +95,51 @@ def get_usage_metrics(days: int = Query(7, ge=1, le=365)) -> Dict[str, Any]:
     }
 
 
+@router.get("/cache")
+def get_cache_metrics() -> Dict[str, Any]:
+    """
+    Cache and request coalescing metrics for this worker.
+    Returns per-cache (semantic and vision) hit ratio, entry counts and estimated saved latency,
+    plus single-flight executions vs. coalesced followers.
+    """
+    return {"caches": cache_stats(), "single_flight": single_flight_stats()}
+
+
+@router.delete("/cache")
+def purge_cache(name: Optional[str] = Query(None)) -> Dict[str, Any]:
+    """
+    Purge a cache by name (e.g. "answer", "routing", "vision"), or all caches when omitted.
+    Shared Redis (and vision disk) entries are removed too, also for caches this worker
+    has not built yet. With Redis, other workers drop their in-memory entries within a
+    couple of seconds; without it only this worker's memory is cleared ("scope").
+    "removed" counts this worker's in-memory entries.
+    """
+    if name and name not in known_caches():
+        raise HTTPException(404, f"Unknown cache '{name}'")
+    removed = purge_caches(name)
+    scope = "all_workers" if get_redis() is not None else "this_worker"
+    return {"status": "purged", "scope": scope, "removed": removed}
+
+
+@router.get("/routing")
+def get_routing_metrics() -> Dict[str, Any]:
+    """
+    Routing metrics for this worker.
+    Returns how many queries were routed by the cache, the local intent classifier or the LLM.
+    """
+    from backend.agents.master_agent import router_stats
+    return router_stats()
+
+
+@router.get("/admission")
+def get_admission_metrics() -> Dict[str, Any]:
+    """
+    Admission control metrics for this worker.
+    Returns per traffic class (text, image) in-flight and queue depth, queue wait times and shed counts.
+    """
+    return admission_stats()
+
+
 @router.get("/quality")
 def get_quality_metrics(days: int = Query(30, ge=1, le=365)) -> Dict[str, Any]:
     """
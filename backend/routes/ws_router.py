@@ -0,0 +1,153 @@
+"""WebSocket chat - one connection per conversation, with the session history kept on the connection."""
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+import time
+import uuid
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
+
+from backend.core.admission import IMAGE, TEXT
+from backend.core.config import settings
+from backend.core.deadline import deadline_scope
+from backend.core.memory_manager import LocalHistory
+from backend.routes.ask_router import (
+    ALLOWED_IMAGE_MIME,
+    MAX_QUERY_CHARS,
+    MAX_UPLOAD_BYTES,
+    _admit,
+    _build_response,
+)
+from backend.services.vision_service import sniff_image_mime
+
+router = APIRouter(prefix="/ws", tags=["WebSocket"])
+
+
+def _parse_turn(raw: str) -> Dict[str, Any]:
+    """A turn is plain text or JSON {"query": ..., "image": <base64 JPEG/PNG>}. Raises ValueError."""
+    try:
+        frame = json.loads(raw)
+    except json.JSONDecodeError:
+        frame = None
+    if not isinstance(frame, dict):
+        frame = {"query": raw}
+
+    query = str(frame.get("query") or "").strip()
+    image = None
+    if frame.get("image"):
+        try:
+            image = base64.b64decode(str(frame["image"]), validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("Image must be base64-encoded.")
+        if len(image) > MAX_UPLOAD_BYTES:
+            raise ValueError("File too large (max 8MB).")
+        if sniff_image_mime(image) not in ALLOWED_IMAGE_MIME:
+            raise ValueError("Only JPEG/PNG images allowed.")
+
+    if not query and image is None:
+        raise ValueError("Query cannot be empty")
+    if len(query) > MAX_QUERY_CHARS:
+        raise ValueError(f"Query too long. Max {MAX_QUERY_CHARS} chars.")
+    return {"query": query, "image": image}
+
+
+@router.websocket("/chat")
+async def ws_chat(websocket: WebSocket, session_id: Optional[str] = None):
+    """
+    Multi-turn chat over one connection. The session history is loaded once
+    and kept on the connection; each turn streams the same frames as
+    /ask/stream ("start", "routed", "agent_done", "token", then "final" or
+    "error") and the turn is written back to chat memory in the background.
+    """
+    await websocket.accept()
+
+    from backend.agents.master_agent import aroute_query
+
+    session_id = (session_id or "").strip() or f"ws-{uuid.uuid4()}"
+    history = await LocalHistory.load(session_id)
+    await websocket.send_json({"type": "ready", "session_id": session_id, "history_messages": len(history)})
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                turn = _parse_turn(_frame_text(message))
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "detail": str(e)})
+                continue
+            await _run_turn(websocket, aroute_query, history, turn)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await history.flush()
+
+
+def _frame_text(message: Dict[str, Any]) -> str:
+    """Text of a received frame; binary frames must hold UTF-8 text. Raises ValueError."""
+    if message.get("text") is not None:
+        return message["text"]
+    try:
+        return (message.get("bytes") or b"").decode("utf-8")
+    except UnicodeDecodeError:
+        raise ValueError("Binary frames must be UTF-8 text or JSON; send images base64-encoded in JSON.")
+
+
+async def _run_turn(websocket: WebSocket, aroute_query: Any, history: LocalHistory, turn: Dict[str, Any]) -> None:
+    start = time.time()
+    request_id = str(uuid.uuid4())
+    query, image = turn["query"], turn["image"]
+
+    try:
+        release = await _admit(IMAGE if image is not None else TEXT)
+    except HTTPException as e:
+        await websocket.send_json({
+            "type": "error",
+            "request_id": request_id,
+            "status_code": e.status_code,
+            "detail": e.detail,
+            "retry_after": int((e.headers or {}).get("Retry-After", 1)),
+        })
+        return
+
+    async def on_event(event: str, data: Dict[str, Any]) -> None:
+        await websocket.send_json({"type": event, **data})
+
+    chat_history = history.messages()
+    # Like aroute_query, keep the question even if answering it fails
+    history.add_message("user", query or "Uploaded an image")
+    try:
+        await websocket.send_json({"type": "start", "request_id": request_id})
+        with deadline_scope(settings.DEADLINE_CHAT_SECONDS):
+            response, meta = await aroute_query(
+                query=query,
+                image_bytes=image,
+                session_id=history.session_id,
+                request_id=request_id,
+                on_event=on_event,
+                chat_history=chat_history,
+                save_history=False,
+            )
+    except WebSocketDisconnect:
+        raise
+    except Exception as e:
+        await websocket.send_json({"type": "error", "request_id": request_id, "detail": f"Error: {str(e)}"})
+        return
+    finally:
+        release()
+
+    history.add_message("assistant", response)
+
+    extra: Dict[str, Any] = {"mode": "multimodal" if image is not None else "text_only", **meta}
+    if query:
+        extra["query"] = query
+    if image is not None:
+        extra["image_uploaded"] = True
+    await websocket.send_json({
+        "type": "final",
+        **_build_response(request_id, start, response, session_id=history.session_id, **extra),
+    })
@@ -0,0 +1,88 @@
+"""
+One-time migration of the old whole-file query and feedback logs into JSONL segments.
+Run: python -m backend.scripts.migrate_query_log [--dry-run]
+
+Reads data/query_log.archive.json and data/query_log.json (oldest first),
+writes their entries into one segment dated at the earliest entry so it
+sorts before any segment already written, then renames each legacy file to
+<name>.migrated. data/feedback_log.json goes into the feedback log the same
+way. Running it again finds nothing to migrate.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+# Add project root to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+
+from backend.core.jsonl_log import JsonlLog
+from backend.services import feedback_service, history_service
+
+
+def _earliest(entries: List[dict]) -> Optional[datetime]:
+    stamps = []
+    for entry in entries:
+        try:
+            stamps.append(datetime.fromisoformat(str(entry.get("timestamp"))).replace(tzinfo=None))
+        except ValueError:
+            continue
+    return min(stamps) if stamps else None
+
+
+def _target_segment(log: JsonlLog, entries: List[dict]) -> Path:
+    start = _earliest(entries) or datetime.utcnow()
+    segments = log.segments()
+    first = log.segment_start(segments[0]) if segments else None
+    if first is not None and start >= first:
+        start = first - timedelta(seconds=1)
+    return log.segment_path(start)
+
+
+def migrate(log: JsonlLog, legacy_paths: List[Path], dry_run: bool = False) -> int:
+    """Copy legacy entries into a new segment of `log`; returns the number migrated."""
+    sources = [p for p in legacy_paths if p.exists()]
+    entries: List[dict] = []
+    for path in sources:
+        entries.extend(history_service._read_legacy(path))
+    if not sources:
+        print("Nothing to migrate.")
+        return 0
+
+    target = _target_segment(log, entries)
+    print(f"{len(entries)} entries from {', '.join(p.name for p in sources)} -> {target}")
+    if dry_run:
+        return len(entries)
+
+    if entries:
+        # Written under a temporary name and renamed, so readers never see half a segment
+        staging = JsonlLog(log.directory, f".migrating-{os.getpid()}", max_bytes=0, max_age=0, fsync="always")
+        staging.append_many(entries)
+        staging.close()
+        os.replace(staging.segments()[0], target)
+    for path in sources:
+        path.rename(path.with_name(path.name + ".migrated"))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="report what would be migrated")
+    args = parser.parse_args()
+
+    migrate(
+        history_service.get_interaction_log(),
+        [history_service.LEGACY_ARCHIVE_PATH, history_service.LEGACY_LOG_PATH],
+        dry_run=args.dry_run,
+    )
+    migrate(
+        feedback_service.get_feedback_store(),
+        [feedback_service.LEGACY_FEEDBACK_PATH],
+        dry_run=args.dry_run,
+    )
+
+
+if __name__ == "__main__":
+    main()
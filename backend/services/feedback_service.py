@@ -1,25 +1,56 @@
 """Feedback service - stores user quality ratings for metrics."""
 from __future__ import annotations
 
-import json
 import threading
 from datetime import datetime
 from pathlib import Path
 from typing import List, Optional
 
+from backend.core.config import settings
+from backend.core.jsonl_log import JsonlLog
+from backend.core.log_writer import get_log_writer
+from backend.services.history_service import _read_legacy
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
-FEEDBACK_PATH = DATA_DIR / "feedback_log.json"
-FEEDBACK_TMP = DATA_DIR / "feedback_log_tmp.json"
+# Append-only JSONL segments (see core.jsonl_log), like the interaction log
+FEEDBACK_DIR = DATA_DIR / "feedback_log"
+FEEDBACK_PREFIX = "feedback_log"
+# Pre-JSONL whole-file log; still read, never written
+LEGACY_FEEDBACK_PATH = DATA_DIR / "feedback_log.json"
 
 DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+_log: Optional[JsonlLog] = None
 _lock = threading.Lock()
+# Held while a batch moves from _pending to disk, so readers never count it twice
+_write_lock = threading.Lock()
+# Entries queued for the log writer but not written yet, so metrics see them
+_pending: List[dict] = []
+
+
+def get_feedback_store() -> JsonlLog:
+    """The feedback log, configured from settings on first use."""
+    global _log
+    with _lock:
+        if _log is None:
+            _log = JsonlLog(
+                FEEDBACK_DIR,
+                FEEDBACK_PREFIX,
+                max_bytes=settings.LOG_SEGMENT_MAX_BYTES,
+                max_age=settings.LOG_SEGMENT_MAX_SECONDS,
+                max_segments=settings.LOG_MAX_SEGMENTS,
+                fsync=settings.LOG_FSYNC,
+                fsync_interval=settings.LOG_FSYNC_INTERVAL_SECONDS,
+            )
+        return _log
 
 
 def record_feedback(request_id: str, feedback: str, source: str = "chat") -> None:
     """
     Record user feedback (positive/negative) for a request.
     source: "chat" | "image"
+    Queued for the background log writer, which appends it with the next batch.
     """
     entry = {
         "request_id": request_id,
@@ -28,29 +59,44 @@ def record_feedback(request_id: str, feedback: str, source: str = "chat") -> Non
         "timestamp": datetime.utcnow().isoformat(),
     }
     with _lock:
+        _pending.append(entry)
+    if not get_log_writer("feedback", _write_feedback).put(entry):
+        _forget_pending([entry])
+
+
+def _write_feedback(entries: List[dict]) -> None:
+    """Append a batch as JSON lines; errors go to the log writer."""
+    with _write_lock:
         try:
-            data = []
-            if FEEDBACK_PATH.exists():
-                with open(FEEDBACK_PATH, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    if not isinstance(data, list):
-                        data = []
-            data.append(entry)
-            with open(FEEDBACK_TMP, "w", encoding="utf-8") as f:
-                json.dump(data, f, indent=2)
-            FEEDBACK_TMP.replace(FEEDBACK_PATH)
-        except Exception as e:
-            print(f"[FEEDBACK] Failed to write: {e}")
+            get_feedback_store().append_many(entries)
+        finally:
+            _forget_pending(entries)
 
 
-def get_feedback_log() -> List[dict]:
-    """Read all feedback entries."""
+def _forget_pending(entries: List[dict]) -> None:
+    with _lock:
+        ids = {id(e) for e in entries}
+        _pending[:] = [e for e in _pending if id(e) not in ids]
+
+
+def close_feedback_log() -> None:
+    """Close the active segment (after the log writers have drained)."""
+    global _log
     with _lock:
+        if _log is not None:
+            _log.close()
+            _log = None
+
+
+def get_feedback_log() -> List[dict]:
+    """Read all feedback entries (oldest first), including ones still queued for writing."""
+    legacy = _read_legacy(LEGACY_FEEDBACK_PATH) if LEGACY_FEEDBACK_PATH.exists() else []
+    with _write_lock:
         try:
-            if not FEEDBACK_PATH.exists():
-                return []
-            with open(FEEDBACK_PATH, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                return data if isinstance(data, list) else []
-        except Exception:
-            return []
+            written = get_feedback_store().read()
+        except Exception as e:
+            print(f"[FEEDBACK] Failed to read feedback log: {e}")
+            written = []
+        with _lock:
+            pending = list(_pending)
+    return legacy + written + pending
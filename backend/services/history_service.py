@@ -1,76 +1,109 @@
 import json
-import os
 import threading
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
-BASE_DIR = Path(__file__).resolve().parent.parent  
+from backend.core.config import settings
+from backend.core.jsonl_log import JsonlLog, read_jsonl
+from backend.core.log_writer import get_log_writer
+
+BASE_DIR = Path(__file__).resolve().parent.parent
 DATA_DIR = BASE_DIR / "data"
-LOG_PATH = DATA_DIR / "query_log.json"
-TMP_PATH = DATA_DIR / "query_log_tmp.json"
+# Append-only JSONL segments (see core.jsonl_log)
+LOG_DIR = DATA_DIR / "query_log"
+LOG_PREFIX = "query_log"
+# Pre-JSONL whole-file logs; still read until backend.scripts.migrate_query_log has run
+LEGACY_LOG_PATH = DATA_DIR / "query_log.json"
+LEGACY_ARCHIVE_PATH = DATA_DIR / "query_log.archive.json"
 
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+_log: Optional[JsonlLog] = None
 _log_lock = threading.Lock()
-MAX_LOG_SIZE_BYTES = 5 * 1024 * 1024  
+
+
+def get_interaction_log() -> JsonlLog:
+    """The interaction log, configured from settings on first use."""
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = JsonlLog(
+                LOG_DIR,
+                LOG_PREFIX,
+                max_bytes=settings.LOG_SEGMENT_MAX_BYTES,
+                max_age=settings.LOG_SEGMENT_MAX_SECONDS,
+                max_segments=settings.LOG_MAX_SEGMENTS,
+                fsync=settings.LOG_FSYNC,
+                fsync_interval=settings.LOG_FSYNC_INTERVAL_SECONDS,
+            )
+        return _log
 
 
 def _sanitize_entry(entry: dict) -> dict:
     """
-    Ensures all values are JSON-serializable UTF-8 strings.
+    Ensures all values are JSON-serializable (nested dicts/lists are kept,
+    anything else becomes a string).
     """
-    clean = {}
-    for key, val in entry.items():
-        if isinstance(val, (str, int, float, bool)) or val is None:
-            clean[key] = val
-        else:
-            clean[key] = str(val)
-    return clean
+    return {str(key): _sanitize_value(val) for key, val in entry.items()}
 
 
-def _atomic_write(data: list):
-    """
-    Safely writes to a temporary file, then atomically replaces the log.
-    """
-    with open(TMP_PATH, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2)
-    os.replace(TMP_PATH, LOG_PATH)
+def _sanitize_value(val):
+    if isinstance(val, (str, int, float, bool)) or val is None:
+        return val
+    if isinstance(val, dict):
+        return _sanitize_entry(val)
+    if isinstance(val, (list, tuple)):
+        return [_sanitize_value(v) for v in val]
+    return str(val)
 
 
 def log_interaction(entry: dict):
     """
-    Append a single query/response record to query_log.json.
+    Queue a single query/response record for the interaction log. The
+    background log writer appends it (one JSON line) with the next batch.
     """
 
     clean_entry = _sanitize_entry(entry)
     clean_entry.setdefault("timestamp", datetime.utcnow().isoformat())
+    get_log_writer("interactions", _write_interactions).put(clean_entry)
 
+
+def _write_interactions(entries: list) -> None:
+    get_interaction_log().append_many(entries)
+
+
+def close_interaction_log() -> None:
+    """Close the active segment (after the log writers have drained)."""
+    global _log
     with _log_lock:
+        if _log is not None:
+            _log.close()
+            _log = None
 
-        try:
-            if LOG_PATH.exists():
-                with open(LOG_PATH, "r", encoding="utf-8") as f:
-                    logs = json.load(f)
-                if not isinstance(logs, list):
-                    logs = []
-            else:
-                logs = []
-        except Exception:
-            logs = []
-
-        logs.append(clean_entry)
-
-        try:
-            approx_new_size = len(json.dumps(logs).encode("utf-8"))
-        except Exception:
-            approx_new_size = 0
-
-        if approx_new_size > MAX_LOG_SIZE_BYTES:
-            archive_path = LOG_PATH.with_suffix(".archive.json")
-            os.replace(LOG_PATH, archive_path)
-            logs = [clean_entry]  # start fresh after rotation
-
-        try:
-            _atomic_write(logs)
-        except Exception as e:
-            print(f"[LOG ERROR] Failed to write log: {e}")
+
+def load_interactions(since: Optional[datetime] = None) -> list:
+    """
+    Read logged interactions (oldest first). With `since` (naive UTC), log
+    segments closed before it are skipped. Returns [] if nothing was logged.
+    """
+    legacy = []
+    for path in (LEGACY_ARCHIVE_PATH, LEGACY_LOG_PATH):
+        if path.exists():
+            legacy.extend(_read_legacy(path))
+    try:
+        return legacy + get_interaction_log().read(since)
+    except Exception:
+        return legacy
+
+
+def _read_legacy(path: Path) -> list:
+    """A pre-JSONL log: one JSON array (JSONL content is accepted too)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return [e for e in data if isinstance(e, dict)] if isinstance(data, list) else []
+    except json.JSONDecodeError:
+        return read_jsonl(path)
+    except Exception:
+        return []
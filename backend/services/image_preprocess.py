@@ -0,0 +1,106 @@
+"""
+Image preprocessing ahead of vision inference.
+
+Uploads are decoded once, EXIF-oriented, stripped of metadata, downscaled to
+IMAGE_MAX_EDGE and re-encoded (JPEG or WebP) before being base64-encoded for
+the vision model. Leaf photos keep their diagnostic detail at ~1280px while
+the payload typically shrinks by an order of magnitude.
+"""
+from __future__ import annotations
+
+import io
+from typing import Any, Dict, Optional, Tuple
+
+from backend.core.config import settings
+from backend.services.vision_service import ImageData
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow missing - images are sent as uploaded
+    Image = None
+    ImageOps = None
+
+_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+
+def _output_format() -> Tuple[str, str]:
+    return _FORMATS.get(str(settings.IMAGE_FORMAT or "").strip().lower(), _FORMATS["jpeg"])
+
+
+def _passthrough(data: ImageData, reason: str) -> Tuple[ImageData, Dict[str, Any]]:
+    size = len(data)
+    return data, {
+        "preprocessed": False,
+        "reason": reason,
+        "original_bytes": size,
+        "sent_bytes": size,
+        "bytes_saved": 0,
+    }
+
+
+def prepare_image(data: ImageData) -> Tuple[ImageData, Dict[str, Any]]:
+    """
+    Decode, orient, strip, downscale and re-encode an uploaded image.
+    Returns (bytes_to_send, stats); on any failure the original bytes are
+    returned unchanged so vision validation can report the problem.
+    """
+    if not settings.IMAGE_PREPROCESS_ENABLED:
+        return _passthrough(data, "disabled")
+    if Image is None:
+        return _passthrough(data, "pillow_not_installed")
+    if not len(data):
+        return _passthrough(data, "empty")
+
+    max_edge = max(64, int(settings.IMAGE_MAX_EDGE))
+    pil_format, mime = _output_format()
+
+    try:
+        img = Image.open(io.BytesIO(data))
+        original_size = img.size
+        # JPEG: let libjpeg decode at a reduced scale (still >= max_edge)
+        img.draft("RGB", (max_edge, max_edge))
+        img = ImageOps.exif_transpose(img)
+
+        if img.mode in ("RGBA", "LA", "P"):
+            img = img.convert("RGBA")
+            background = Image.new("RGB", img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+
+        resized = max(img.size) > max_edge
+        if resized:
+            img.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        out = io.BytesIO()
+        img.save(out, format=pil_format, quality=int(settings.IMAGE_QUALITY))
+        encoded = out.getvalue()
+    except Exception as e:
+        print(f"[IMAGE] Preprocessing failed, sending original: {e}")
+        return _passthrough(data, "decode_failed")
+
+    # Small, already-compressed uploads can grow on re-encode; keep the original then
+    if len(encoded) >= len(data) and not resized:
+        return _passthrough(data, "original_smaller")
+
+    return encoded, {
+        "preprocessed": True,
+        "format": mime,
+        "original_bytes": len(data),
+        "sent_bytes": len(encoded),
+        "bytes_saved": len(data) - len(encoded),
+        "original_size": list(original_size),
+        "size": list(img.size),
+    }
+
+
+def read_image_file(image_path: Optional[str]) -> Optional[bytes]:
+    """Read an image from disk for callers that still pass a path."""
+    if not image_path:
+        return None
+    try:
+        with open(image_path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
@@ -4,15 +4,17 @@ Single retrieve, then prompt | llm | parse for full trace.
 """
 from __future__ import annotations
 
+import asyncio
 from typing import List, Optional
 
 from langchain_core.output_parsers import StrOutputParser
 
-from backend.core.llm_client import get_llm
+from backend.core.llm_client import RAG, get_cascade, get_llm
 from backend.core.langchain_prompts import SUBSIDY_RAG_PROMPT
 from backend.services.rag_service import rag_service
-from backend.core.config import settings
 from backend.core.token_tracker import token_tracker
+from backend.core.rate_governor import estimate_tokens
+from backend.core.resilience import acall_with_cascade, call_with_cascade
 
 
 def _format_subsidy_docs(docs: List[dict]) -> str:
@@ -33,19 +35,42 @@ def _format_subsidy_docs(docs: List[dict]) -> str:
     return " ".join(parts)
 
 
-_SUBSIDY_CHAIN = None
+def _get_subsidy_chain(model: str):
+    """LCEL chain: prompt | llm | parse (composition is cheap; the LLM client is pooled)."""
+    return SUBSIDY_RAG_PROMPT | get_llm(model) | StrOutputParser()
 
 
-def _get_subsidy_chain():
-    """Cached LCEL chain: prompt | llm | parse."""
-    global _SUBSIDY_CHAIN
-    if _SUBSIDY_CHAIN is None:
-        _SUBSIDY_CHAIN = (
-            SUBSIDY_RAG_PROMPT
-            | get_llm()
-            | StrOutputParser()
+def _build_chain_inputs(query: str, chat_history: str, docs: List[dict]) -> dict:
+    return {
+        "query": query,
+        "chat_history": chat_history or "None",
+        "context": _format_subsidy_docs(docs),
+    }
+
+
+def _chain_cost(inputs: dict) -> int:
+    """Estimated tokens of one chain call (inputs + ~500 chars of prompt template)."""
+    return estimate_tokens(str(inputs)) + 125
+
+
+def _record_chain_usage(
+    inputs: dict,
+    response: str,
+    model: str,
+    request_id: Optional[str],
+    session_id: Optional[str],
+) -> None:
+    """Approximate token usage (StrOutputParser drops response metadata)."""
+    if request_id or session_id:
+        approx_in = (len(str(inputs)) + 500) // 4
+        approx_out = len(response) // 4
+        token_tracker.record(
+            input_tokens=approx_in,
+            output_tokens=approx_out,
+            model=model,
+            request_id=request_id,
+            session_id=session_id,
         )
-    return _SUBSIDY_CHAIN
 
 
 def invoke_subsidy_rag_chain(
@@ -59,27 +84,43 @@ def invoke_subsidy_rag_chain(
     Single retrieve, then LCEL chain for traceability.
     """
     docs = rag_service.retrieve(query, k=2)
-    context = _format_subsidy_docs(docs)
+    inputs = _build_chain_inputs(query, chat_history, docs)
 
-    inputs = {
-        "query": query,
-        "chat_history": chat_history or "None",
-        "context": context,
-    }
+    raw, model = call_with_cascade(
+        lambda model: _get_subsidy_chain(model).invoke(inputs),
+        get_cascade(RAG),
+        label="RAG_CHAIN",
+        cost_tokens=_chain_cost(inputs),
+    )
+    response = str(raw).strip() if raw is not None else ""
+
+    _record_chain_usage(inputs, response, model, request_id, session_id)
 
-    chain = _get_subsidy_chain()
-    raw = chain.invoke(inputs)
+    return response, docs
+
+
+async def ainvoke_subsidy_rag_chain(
+    query: str,
+    chat_history: str = "None",
+    request_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+) -> tuple[str, list[dict]]:
+    """
+    Async variant of invoke_subsidy_rag_chain.
+    Retrieval (CPU-bound embedding + vector search) runs in a worker thread;
+    the LLM step is awaited via ainvoke.
+    """
+    docs = await asyncio.to_thread(rag_service.retrieve, query, 2)
+    inputs = _build_chain_inputs(query, chat_history, docs)
+
+    raw, model = await acall_with_cascade(
+        lambda model: _get_subsidy_chain(model).ainvoke(inputs),
+        get_cascade(RAG),
+        label="RAG_CHAIN",
+        cost_tokens=_chain_cost(inputs),
+    )
     response = str(raw).strip() if raw is not None else ""
 
-    if request_id or session_id:
-        approx_in = (len(str(inputs)) + 500) // 4
-        approx_out = len(response) // 4
-        token_tracker.record(
-            input_tokens=approx_in,
-            output_tokens=approx_out,
-            model=settings.TEXT_MODEL_NAME,
-            request_id=request_id,
-            session_id=session_id,
-        )
+    _record_chain_usage(inputs, response, model, request_id, session_id)
 
     return response, docs
@@ -148,6 +148,14 @@ class RAG:
         self.vector_store.save_local(VECTOR_DB_PATH)
         print("[RAG] FAISS index built and saved.")
 
+    def embed_query(self, text: str) -> List[float]:
+        """Embed text with the already-loaded MiniLM model (shared with caches/routing)."""
+        return self.embeddings.embed_query(text)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """Batch-embed texts with the same MiniLM model."""
+        return self.embeddings.embed_documents(texts)
+
     def retrieve(self, query: str, k: int = 2) -> List[Dict[str, str]]:
         if not query or not query.strip():
             return []
@@ -1,13 +1,29 @@
 from __future__ import annotations
-import time
-from typing import Optional, Tuple, Dict, Any
+import asyncio
+import hashlib
+import json
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
 
-from backend.core.llm_client import get_llm
+from backend.core.llm_client import AGENT, ModelCascade, get_cascade, get_llm
 from backend.core.config import settings
 from backend.core.token_tracker import token_tracker
+from backend.core.single_flight import SingleFlight
+from backend.core import deadline
+from backend.core.deadline import DeadlineExceeded
+from backend.core.hedging import ahedged
+from backend.core.rate_governor import RateBudgetExceeded, estimate_tokens, get_governor
+from backend.core.resilience import (
+    CircuitOpenError,
+    acall_with_cascade,
+    backoff_delay,
+    call_with_cascade,
+    default_policy,
+    get_breaker,
+    record_cascade_answer,
+    record_cascade_fallback,
+    record_outcome,
+)
 
-MAX_RETRIES = 3
-RETRY_BACKOFF = (1, 2, 4)
 MAX_PROMPT_CHARS = 4000
 
 DEFAULT_SYSTEM_MSG = (
@@ -30,33 +46,15 @@ def _normalize_output(output: Optional[str]) -> str:
         return ""
 
 
-def _is_retryable_error(error: Exception) -> bool:
-    """Detect network errors that should be retried."""
-    msg = str(error).lower()
-    return any(
-        token in msg
-        for token in (
-            "429",
-            "rate limit",
-            "too many requests",
-            "timeout",
-            "timed out",
-            "connection reset",
-            "connection aborted",
-            "service unavailable",
-            "gateway timeout",
-            "internal server error",
-            "500",
-            "502",
-            "503",
-            "504",
-        )
-    )
-
-
 def _extract_usage(response: Any) -> Tuple[int, int]:
     """Extract input/output tokens from LangChain response."""
     input_tok, output_tok = 0, 0
+    usage_metadata = getattr(response, "usage_metadata", None)
+    if isinstance(usage_metadata, dict) and usage_metadata:
+        return (
+            int(usage_metadata.get("input_tokens", 0) or 0),
+            int(usage_metadata.get("output_tokens", 0) or 0),
+        )
     try:
         meta = getattr(response, "response_metadata", None) or {}
         usage = meta.get("usage", meta.get("usage_metadata", {}))
@@ -68,71 +66,252 @@ def _extract_usage(response: Any) -> Tuple[int, int]:
     return input_tok, output_tok
 
 
+def _prepare_prompt(prompt: str) -> str:
+    """Truncate oversized prompts so a single call stays within budget."""
+    if len(prompt) > MAX_PROMPT_CHARS:
+        return (
+            prompt[:MAX_PROMPT_CHARS]
+            + f"\n[Input truncated to {MAX_PROMPT_CHARS} characters]"
+        )
+    return prompt
+
+
+def _build_messages(prompt: str, system_msg: Optional[str]) -> list:
+    sys_msg = system_msg if system_msg else DEFAULT_SYSTEM_MSG
+    return [
+        {"role": "system", "content": sys_msg},
+        {"role": "user", "content": prompt},
+    ]
+
+
+def _estimate_cost(messages: list) -> int:
+    """Estimated tokens of one call, for the rate-limit governor."""
+    return estimate_tokens(*(m["content"] for m in messages))
+
+
+def _handle_response(
+    response: Any,
+    request_id: Optional[str],
+    session_id: Optional[str],
+    model: str,
+) -> Tuple[str, Dict[str, Any]]:
+    """Normalize content and record token usage against the model that answered."""
+    content = getattr(response, "content", None)
+    cleaned = _normalize_output(content)
+
+    input_tok, output_tok = _extract_usage(response)
+    if request_id or session_id:
+        token_tracker.record(
+            input_tokens=input_tok,
+            output_tokens=output_tok,
+            model=model,
+            request_id=request_id,
+            session_id=session_id,
+        )
+
+    usage = {"input_tokens": input_tok, "output_tokens": output_tok, "model": model}
+
+    if cleaned:
+        return cleaned, usage
+
+    return "I could not generate a response at this moment. Please try again.", usage
+
+
+_UNAVAILABLE_MSG = "The system is temporarily unavailable. Please try again later."
+
+
 def query_groq_text(
     prompt: str,
     system_msg: Optional[str] = None,
     request_id: Optional[str] = None,
     session_id: Optional[str] = None,
+    site: str = AGENT,
 ) -> Tuple[str, Dict[str, int]]:
     """
     Primary text-generation entrypoint.
     Returns (content, usage_dict with input_tokens, output_tokens).
+    `site` selects the model cascade (core.llm_client.get_cascade).
     """
 
     if not isinstance(prompt, str) or not prompt.strip():
         return "No valid input was provided.", {"input_tokens": 0, "output_tokens": 0}
 
-    if len(prompt) > MAX_PROMPT_CHARS:
-        prompt = (
-            prompt[:MAX_PROMPT_CHARS]
-            + f"\n[Input truncated to {MAX_PROMPT_CHARS} characters]"
+    messages = _build_messages(_prepare_prompt(prompt), system_msg)
+
+    try:
+        response, model = call_with_cascade(
+            lambda model: get_llm(model).invoke(messages),
+            get_cascade(site),
+            label="TEXT_SERVICE",
+            cost_tokens=_estimate_cost(messages),
         )
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"[TEXT_SERVICE] Giving up: {type(e).__name__}: {str(e)[:200]}")
+        return _UNAVAILABLE_MSG, {"input_tokens": 0, "output_tokens": 0}
 
-    sys_msg = system_msg if system_msg else DEFAULT_SYSTEM_MSG
-    llm = get_llm()
-
-    for attempt in range(MAX_RETRIES):
-        try:
-            response = llm.invoke(
-                [
-                    {"role": "system", "content": sys_msg},
-                    {"role": "user", "content": prompt},
-                ]
-            )
-
-            content = getattr(response, "content", None)
-            cleaned = _normalize_output(content)
-
-            input_tok, output_tok = _extract_usage(response)
-            if request_id or session_id:
-                token_tracker.record(
-                    input_tokens=input_tok,
-                    output_tokens=output_tok,
-                    model=settings.TEXT_MODEL_NAME,
-                    request_id=request_id,
-                    session_id=session_id,
-                )
-
-            usage = {"input_tokens": input_tok, "output_tokens": output_tok}
-
-            if cleaned:
-                return cleaned, usage
-
-            return "I could not generate a response at this moment. Please try again.", usage
-
-        except Exception as e:
-            err_msg = str(e)
-            print(f"[TEXT_SERVICE] Groq/LLM error (attempt {attempt + 1}): {err_msg[:200]}")
-            if attempt < MAX_RETRIES - 1 and _is_retryable_error(e):
-                time.sleep(RETRY_BACKOFF[attempt])
-                continue
-
-            return "The system is temporarily unavailable. Please try again later.", {
-                "input_tokens": 0,
-                "output_tokens": 0,
-            }
-
-    return "The system is temporarily unavailable. Please try again later.", {
-        "input_tokens": 0,
-        "output_tokens": 0,
-    }
+    return _handle_response(response, request_id, session_id, model)
+
+
+_TEXT_FLIGHT = SingleFlight("groq_text")
+
+
+def _flight_key(model: str, messages: list) -> str:
+    raw = json.dumps([model, messages], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+async def aquery_groq_text(
+    prompt: str,
+    system_msg: Optional[str] = None,
+    request_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    site: str = AGENT,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Async variant of query_groq_text - awaits the LLM via ainvoke so the
+    event loop stays free while Groq is generating. Identical concurrent
+    prompts share one call (single-flight); the request that made the call
+    is charged for it and the others record its tokens as coalesced. Slow calls may be hedged (core.hedging)
+    and degraded or over-budget models give way to the next one in the
+    site's cascade. Raises DeadlineExceeded when the request deadline
+    (core.deadline) runs out; other failures return a fallback text.
+    """
+
+    if not isinstance(prompt, str) or not prompt.strip():
+        return "No valid input was provided.", {"input_tokens": 0, "output_tokens": 0}
+
+    messages = _build_messages(_prepare_prompt(prompt), system_msg)
+    cascade = get_cascade(site)
+
+    async def _call() -> Tuple[str, Dict[str, int]]:
+        return await _ainvoke_with_retry(messages, request_id, session_id, cascade)
+
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await _call()
+
+    result, shared = await _TEXT_FLIGHT.do(
+        _flight_key(",".join(cascade.models), messages), _call, shareable=_shareable
+    )
+    if shared:
+        token_tracker.record_coalesced(result[1], request_id)
+    return result
+
+
+def _shareable(result: Tuple[str, Dict[str, int]]) -> bool:
+    """A give-up fallback is not handed to coalesced callers; they try themselves."""
+    return result[0] != _UNAVAILABLE_MSG
+
+
+async def _ainvoke_with_retry(
+    messages: list,
+    request_id: Optional[str],
+    session_id: Optional[str],
+    cascade: ModelCascade,
+) -> Tuple[str, Dict[str, int]]:
+    try:
+        response, model = await acall_with_cascade(
+            lambda model: ahedged(
+                lambda: get_llm(model).ainvoke(messages), f"text:{model}", model, _estimate_cost(messages)
+            ),
+            cascade,
+            label="TEXT_SERVICE",
+            cost_tokens=_estimate_cost(messages),
+        )
+    except DeadlineExceeded:
+        raise  # callers decide how to degrade
+    except Exception as e:
+        print(f"[TEXT_SERVICE] Giving up: {type(e).__name__}: {str(e)[:200]}")
+        return _UNAVAILABLE_MSG, {"input_tokens": 0, "output_tokens": 0}
+
+    return _handle_response(response, request_id, session_id, model)
+
+
+async def astream_groq_text(
+    prompt: str,
+    on_token: Callable[[str], Awaitable[None]],
+    system_msg: Optional[str] = None,
+    request_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    site: str = AGENT,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Streaming variant of aquery_groq_text.
+    Awaits on_token(text) for every chunk as Groq produces it and returns the
+    full (content, usage) once the stream ends. Retries only happen before the
+    first token is emitted; a mid-stream failure returns what was received.
+    The cascade moves to the next model only before any token was sent (an
+    open breaker, no rate budget or exhausted retries) - the latency budget
+    does not apply, as streamed text cannot be taken back.
+    Raises DeadlineExceeded when the request deadline cuts the stream short.
+    """
+
+    if not isinstance(prompt, str) or not prompt.strip():
+        return "No valid input was provided.", {"input_tokens": 0, "output_tokens": 0}
+
+    messages = _build_messages(_prepare_prompt(prompt), system_msg)
+    cascade = get_cascade(site)
+    policy = default_policy()
+    cost = _estimate_cost(messages)
+
+    for model in cascade.models:
+        llm = get_llm(model)
+        breaker = get_breaker(model)
+        governor = get_governor(model)
+        skipped: Optional[Exception] = None
+
+        for attempt in range(policy.max_attempts):
+            deadline.check("TEXT_SERVICE")
+            try:
+                await governor.acquire(cost)
+            except RateBudgetExceeded as e:
+                skipped = e
+                break
+            allowed, retry_in = breaker.allow()
+            if not allowed:
+                skipped = CircuitOpenError(model, retry_in)
+                break
+
+            aggregate = None
+            emitted = False
+
+            async def _consume() -> None:
+                nonlocal aggregate, emitted
+                async for chunk in llm.astream(messages):
+                    aggregate = chunk if aggregate is None else aggregate + chunk
+                    text = chunk.content if isinstance(chunk.content, str) else ""
+                    if text:
+                        emitted = True
+                        await on_token(text)
+
+            try:
+                await deadline.await_within(_consume(), stage="TEXT_SERVICE")
+            except (asyncio.CancelledError, DeadlineExceeded):
+                breaker.abandon()
+                raise
+            except Exception as e:
+                retryable = record_outcome(breaker, e)
+                print(f"[TEXT_SERVICE] Groq/LLM stream error on {model} (attempt {attempt + 1}): {str(e)[:200]}")
+                if emitted:
+                    partial = _normalize_output(getattr(aggregate, "content", None))
+                    return partial or _UNAVAILABLE_MSG, {"input_tokens": 0, "output_tokens": 0}
+                if not retryable:
+                    return _UNAVAILABLE_MSG, {"input_tokens": 0, "output_tokens": 0}
+                delay = backoff_delay(attempt, policy, e)
+                if attempt < policy.max_attempts - 1 and deadline.has_time(delay):
+                    await asyncio.sleep(delay)
+                    continue
+                skipped = e
+                break
+
+            record_outcome(breaker, None)
+            record_cascade_answer(cascade.site, model)
+            return _handle_response(aggregate, request_id, session_id, model)
+
+        if skipped is not None and model != cascade.models[-1]:
+            record_cascade_fallback(cascade.site, model, skipped, "TEXT_SERVICE")
+        else:
+            print(f"[TEXT_SERVICE] Giving up on {model}: {skipped}")
+
+    return _UNAVAILABLE_MSG, {"input_tokens": 0, "output_tokens": 0}
@@ -1,25 +1,34 @@
 from __future__ import annotations
+import asyncio
 import base64
+import hashlib
+import io
 import os
-import time
-from typing import Any, Optional, Tuple, Dict
+from typing import Any, List, Optional, Tuple, Dict, Union
+
+import numpy as np
 
-from groq import Groq
 from backend.core.config import settings
+from backend.core.llm_client import get_async_groq_client, get_groq_client
 from backend.core.token_tracker import token_tracker
+from backend.core.single_flight import SingleFlight
+from backend.core.vision_cache import DEFAULT_DISK_DIR, VisionCache
+from backend.core.deadline import DeadlineExceeded
+from backend.core.rate_governor import estimate_tokens
+from backend.core.resilience import acall_with_resilience, call_with_resilience
 
-MAX_RETRIES = 3
-RETRY_BACKOFF = (1, 2, 4)
 MAX_IMAGE_BYTES = 8 * 1024 * 1024
 MAX_VISION_PROMPT_CHARS = 2000
+# Rough prompt tokens of one downscaled (<= IMAGE_MAX_EDGE) photo, for the rate-limit governor
+IMAGE_TOKEN_ESTIMATE = 1600
 
+# Raw upload bytes; a memoryview avoids copying the UploadFile buffer
+ImageData = Union[bytes, bytearray, memoryview]
 
-def _detect_mime(image_path: str) -> str:
-    try:
-        with open(image_path, "rb") as f:
-            header = f.read(10)
-    except Exception:
-        return "unknown"
+
+def sniff_image_mime(data: ImageData) -> str:
+    """Image MIME type from magic bytes (first 12 bytes are enough)."""
+    header = bytes(memoryview(data)[:10])
 
     if header.startswith(b"\x89PNG"):
         return "image/png"
@@ -27,9 +36,112 @@ def _detect_mime(image_path: str) -> str:
     if header.startswith(b"\xFF\xD8"):
         return "image/jpeg"
 
+    if header.startswith(b"RIFF") and bytes(memoryview(data)[8:12]) == b"WEBP":
+        return "image/webp"
+
     return "unknown"
 
 
+def _read_image(image_path: Optional[str]) -> Tuple[Optional[str], bytes]:
+    """Read an image file once. Returns (error_message, data)."""
+    if not image_path or not os.path.exists(image_path):
+        return "The image file was not found.", b""
+
+    if os.path.getsize(image_path) > MAX_IMAGE_BYTES:
+        return "The image is too large. Please upload an image under 8MB.", b""
+
+    try:
+        with open(image_path, "rb") as f:
+            return None, f.read()
+    except Exception:
+        return "The image could not be read.", b""
+
+
+# Retake hints returned instead of calling the vision model on unusable photos
+RETAKE_HINTS = {
+    "low_resolution": (
+        "The photo is too small to examine. Please retake it closer to the "
+        "affected leaves, at your camera's normal resolution."
+    ),
+    "too_dark": (
+        "The photo is too dark to see any symptoms. Please retake it in daylight "
+        "or with more light on the plant."
+    ),
+    "overexposed": (
+        "The photo is washed out by strong light. Please retake it in shade or "
+        "avoid pointing the camera towards the sun."
+    ),
+    "blank": (
+        "The photo looks blank or almost a single colour. Please retake it with "
+        "the affected plant part filling most of the frame."
+    ),
+    "blurry": (
+        "The photo is too blurry to identify symptoms. Please hold the camera "
+        "steady, tap the leaf to focus and retake it."
+    ),
+}
+
+# Blur is measured on a fixed-size grayscale copy so the threshold does not depend on upload size
+_PRESCREEN_EDGE = 512
+
+
+def _laplacian_variance(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian (low = few sharp edges = blur)."""
+    lap = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:]
+        - 4.0 * gray[1:-1, 1:-1]
+    )
+    return float(lap.var())
+
+
+def prescreen_image(image_bytes: ImageData) -> Optional[Dict[str, Any]]:
+    """
+    CPU-only quality check before a paid vision call.
+    Returns None when the image looks usable (or cannot be decoded - the
+    vision service reports that), otherwise a dict with "reason", "hint"
+    and the measured values.
+    """
+    if not settings.VISION_PRESCREEN_ENABLED:
+        return None
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+
+    try:
+        img = Image.open(io.BytesIO(image_bytes))
+        width, height = img.size
+        img.draft("L", (_PRESCREEN_EDGE, _PRESCREEN_EDGE))
+        img = img.convert("L")
+        img.thumbnail((_PRESCREEN_EDGE, _PRESCREEN_EDGE))
+        gray = np.asarray(img, dtype=np.float32)
+    except Exception:
+        return None
+
+    metrics = {
+        "width": width,
+        "height": height,
+        "luminance": round(float(gray.mean()), 1),
+        "contrast": round(float(gray.std()), 1),
+        "sharpness": round(_laplacian_variance(gray), 1) if min(gray.shape) >= 3 else 0.0,
+    }
+
+    if min(width, height) < settings.VISION_MIN_EDGE:
+        reason = "low_resolution"
+    elif metrics["luminance"] < settings.VISION_MIN_LUMINANCE:
+        reason = "too_dark"
+    elif metrics["luminance"] > settings.VISION_MAX_LUMINANCE:
+        reason = "overexposed"
+    elif metrics["contrast"] < settings.VISION_MIN_CONTRAST:
+        reason = "blank"
+    elif metrics["sharpness"] < settings.VISION_MIN_SHARPNESS:
+        reason = "blurry"
+    else:
+        return None
+
+    return {"reason": reason, "hint": RETAKE_HINTS[reason], **metrics}
+
+
 def _normalize_output(output: Any) -> str:
     if output is None:
         return ""
@@ -67,124 +179,291 @@ def _get_vision_system_prompt() -> str:
         )
 
 
+def _empty_usage() -> Dict[str, int]:
+    return {"input_tokens": 0, "output_tokens": 0}
+
+
+def _build_vision_messages(
+    image_path: Optional[str],
+    prompt: str,
+    image_bytes: Optional[ImageData] = None,
+) -> Tuple[Optional[str], List[dict]]:
+    """
+    Validate the image and build the chat messages for the vision model.
+    The image comes from image_bytes when given, otherwise from image_path.
+    Returns (error_message, messages); error_message is set when the call must not be made.
+    """
+    if image_bytes is None:
+        error, image_bytes = _read_image(image_path)
+        if error:
+            return error, []
+
+    if not len(image_bytes):
+        return "The image file appears to be empty.", []
+
+    if len(image_bytes) > MAX_IMAGE_BYTES:
+        return "The image is too large. Please upload an image under 8MB.", []
+
+    mime = sniff_image_mime(image_bytes)
+    if mime not in ("image/png", "image/jpeg", "image/webp"):
+        return "Unsupported image format. Please upload a PNG or JPG image.", []
+
+    if not isinstance(prompt, str):
+        prompt = ""
+
+    if len(prompt) > MAX_VISION_PROMPT_CHARS:
+        prompt = prompt[:MAX_VISION_PROMPT_CHARS] + " [Prompt truncated]"
+
+    image_b64 = base64.b64encode(image_bytes).decode("ascii")
+    image_url = f"data:{mime};base64,{image_b64}"
+
+    messages = [
+        {"role": "system", "content": _get_vision_system_prompt()},
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": prompt.strip()},
+                {"type": "image_url", "image_url": {"url": image_url}},
+            ],
+        },
+    ]
+    return None, messages
+
+
+def _estimate_cost(messages: List[dict]) -> int:
+    texts = [messages[0]["content"]] + [p["text"] for p in messages[1]["content"] if p.get("type") == "text"]
+    return estimate_tokens(*texts) + IMAGE_TOKEN_ESTIMATE
+
+
+def _handle_completion(
+    completion: Any,
+    request_id: Optional[str],
+    session_id: Optional[str],
+) -> Tuple[str, Dict[str, Any]]:
+    """Extract content and record token usage from a vision completion."""
+    if not completion.choices:
+        raise ValueError("No completion choices returned")
+    first = completion.choices[0]
+    msg = getattr(first, "message", None)
+    content = getattr(msg, "content", None) if msg else None
+    result = _normalize_output(content)
+
+    input_tok = 0
+    output_tok = 0
+    if hasattr(completion, "usage") and completion.usage:
+        input_tok = getattr(completion.usage, "input_tokens", 0) or 0
+        output_tok = getattr(completion.usage, "output_tokens", 0) or 0
+
+    if request_id or session_id:
+        token_tracker.record(
+            input_tokens=input_tok,
+            output_tokens=output_tok,
+            model=settings.VISION_MODEL_NAME,
+            request_id=request_id,
+            session_id=session_id,
+        )
+
+    usage = {"input_tokens": input_tok, "output_tokens": output_tok, "model": settings.VISION_MODEL_NAME}
+
+    if not result or len(result) < 5:
+        return _UNCLEAR_MSG, usage
+
+    return result, usage
+
+
+_VISION_PARAMS = {
+    "max_tokens": 900,
+    "temperature": 0.3,
+    "top_p": 1.0,
+}
+
+_UNAVAILABLE_MSG = (
+    "The image could not be analyzed at this time. Please try again later."
+)
+
+_UNCLEAR_MSG = (
+    "The image could not be analyzed clearly. "
+    "Please upload a clearer image."
+)
+
+_VISION_CACHE: Optional[VisionCache] = None
+
+
+def _get_vision_cache() -> Optional[VisionCache]:
+    """Lazily build the vision result cache."""
+    global _VISION_CACHE
+    if not settings.VISION_CACHE_ENABLED:
+        return None
+    if _VISION_CACHE is None:
+        disk_dir = settings.VISION_CACHE_DIR or str(DEFAULT_DISK_DIR)
+        _VISION_CACHE = VisionCache(
+            name="vision",
+            max_entries=settings.VISION_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.VISION_CACHE_TTL_SECONDS,
+            backend=str(settings.VISION_CACHE_BACKEND).strip().lower(),
+            disk_dir=disk_dir,
+            phash_enabled=settings.VISION_CACHE_PHASH,
+            phash_max_distance=settings.VISION_CACHE_PHASH_DISTANCE,
+        )
+    return _VISION_CACHE
+
+
+def _vision_partition(prompt: str) -> str:
+    return VisionCache.make_partition(settings.VISION_MODEL_NAME, _get_vision_system_prompt(), prompt)
+
+
+def _cache_lookup(
+    image_bytes: ImageData,
+    prompt: str,
+) -> Tuple[Optional[str], Optional[Tuple[str, str, Optional[int]]]]:
+    """
+    Returns (cached_content, store_handle). store_handle is passed to
+    _cache_store on a miss; both are None when the cache is disabled.
+    """
+    cache = _get_vision_cache()
+    if cache is None:
+        return None, None
+    partition = _vision_partition(prompt)
+    value, key, phash = cache.lookup(image_bytes, partition)
+    if value is not None:
+        return str(value.get("content", "")), None
+    return None, (key, partition, phash)
+
+
+def _cache_store(handle: Optional[Tuple[str, str, Optional[int]]], content: str) -> None:
+    cache = _get_vision_cache()
+    if cache is None or handle is None or content in (_UNAVAILABLE_MSG, _UNCLEAR_MSG):
+        return
+    key, partition, phash = handle
+    cache.store(key, {"content": content}, partition, phash)
+
+
 def query_groq_image(
-    image_path: str,
+    image_path: Optional[str],
     prompt: str,
     request_id: Optional[str] = None,
     session_id: Optional[str] = None,
+    image_bytes: Optional[ImageData] = None,
 ) -> Tuple[str, Dict[str, int]]:
     """
-    Vision model inference. Returns (content, usage_dict).
+    Vision model inference on image_bytes (or the file at image_path).
+    Re-uploads of a cached image skip the model call (usage is then zero).
+    Returns (content, usage_dict).
     """
 
-    if not image_path or not os.path.exists(image_path):
-        return "The image file was not found.", {"input_tokens": 0, "output_tokens": 0}
+    if image_bytes is None:
+        error, image_bytes = _read_image(image_path)
+        if error:
+            return error, _empty_usage()
 
-    if os.path.getsize(image_path) > MAX_IMAGE_BYTES:
-        return "The image is too large. Please upload an image under 8MB.", {
-            "input_tokens": 0,
-            "output_tokens": 0,
-        }
-
-    mime = _detect_mime(image_path)
-    if mime not in ("image/png", "image/jpeg"):
-        return "Unsupported image format. Please upload a PNG or JPG image.", {
-            "input_tokens": 0,
-            "output_tokens": 0,
-        }
+    cached, handle = _cache_lookup(image_bytes, prompt)
+    if cached is not None:
+        return cached, _empty_usage()
+
+    error, messages = _build_vision_messages(None, prompt, image_bytes)
+    if error:
+        return error, _empty_usage()
+
+    client = get_groq_client()
 
     try:
-        with open(image_path, "rb") as f:
-            raw_bytes = f.read()
-    except Exception:
-        return "The image could not be read.", {"input_tokens": 0, "output_tokens": 0}
+        completion = call_with_resilience(
+            lambda: client.chat.completions.create(
+                model=settings.VISION_MODEL_NAME,
+                messages=messages,
+                **_VISION_PARAMS,
+            ),
+            settings.VISION_MODEL_NAME,
+            label="VISION_SERVICE",
+            cost_tokens=_estimate_cost(messages),
+        )
+        result = _handle_completion(completion, request_id, session_id)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"[VISION_SERVICE] Giving up: {type(e).__name__}: {str(e)[:200]}")
+        return _UNAVAILABLE_MSG, _empty_usage()
 
-    if not raw_bytes:
-        return "The image file appears to be empty.", {
-            "input_tokens": 0,
-            "output_tokens": 0,
-        }
+    _cache_store(handle, result[0])
+    return result
 
-    if not isinstance(prompt, str):
-        prompt = ""
 
-    if len(prompt) > MAX_VISION_PROMPT_CHARS:
-        prompt = prompt[:MAX_VISION_PROMPT_CHARS] + " [Prompt truncated]"
+_VISION_FLIGHT = SingleFlight("groq_vision")
 
-    image_b64 = base64.b64encode(raw_bytes).decode("utf-8")
-    image_url = f"data:{mime};base64,{image_b64}"
 
-    system_prompt = _get_vision_system_prompt()
+def _vision_flight_key(messages: List[dict]) -> str:
+    """Hash model, system prompt, user prompt and the image data URL."""
+    h = hashlib.sha256(settings.VISION_MODEL_NAME.encode("utf-8"))
+    h.update(str(messages[0]["content"]).encode("utf-8"))
+    for part in messages[1]["content"]:
+        if part.get("type") == "text":
+            h.update(part["text"].encode("utf-8"))
+        else:
+            h.update(part["image_url"]["url"].encode("ascii"))
+    return h.hexdigest()
 
-    client = Groq(
-        api_key=settings.GROQ_API_KEY,
-        timeout=30,
-    )
 
-    for attempt in range(MAX_RETRIES):
-        try:
-            completion = client.chat.completions.create(
+async def aquery_groq_image(
+    image_path: Optional[str],
+    prompt: str,
+    request_id: Optional[str] = None,
+    session_id: Optional[str] = None,
+    image_bytes: Optional[ImageData] = None,
+) -> Tuple[str, Dict[str, int]]:
+    """
+    Async variant of query_groq_image using the shared AsyncGroq client.
+    Cached images skip the call; identical concurrent uploads (same bytes
+    and prompt) share one call.
+    """
+
+    if image_bytes is None:
+        error, image_bytes = await asyncio.to_thread(_read_image, image_path)
+        if error:
+            return error, _empty_usage()
+
+    cached, handle = await asyncio.to_thread(_cache_lookup, image_bytes, prompt)
+    if cached is not None:
+        return cached, _empty_usage()
+
+    error, messages = await asyncio.to_thread(_build_vision_messages, None, prompt, image_bytes)
+    if error:
+        return error, _empty_usage()
+
+    async def _call() -> Tuple[str, Dict[str, int]]:
+        result = await _acreate_with_retry(messages, request_id, session_id)
+        await asyncio.to_thread(_cache_store, handle, result[0])
+        return result
+
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        return await _call()
+
+    key = await asyncio.to_thread(_vision_flight_key, messages)
+    result, shared = await _VISION_FLIGHT.do(key, _call, shareable=lambda r: r[0] != _UNAVAILABLE_MSG)
+    if shared:
+        token_tracker.record_coalesced(result[1], request_id)
+    return result
+
+
+async def _acreate_with_retry(
+    messages: List[dict],
+    request_id: Optional[str],
+    session_id: Optional[str],
+) -> Tuple[str, Dict[str, int]]:
+    client = get_async_groq_client()
+    try:
+        completion = await acall_with_resilience(
+            lambda: client.chat.completions.create(
                 model=settings.VISION_MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt.strip()},
-                            {"type": "image_url", "image_url": {"url": image_url}},
-                        ],
-                    },
-                ],
-                max_tokens=900,
-                temperature=0.3,
-                top_p=1.0,
-            )
-
-            if not completion.choices:
-                raise ValueError("No completion choices returned")
-            first = completion.choices[0]
-            msg = getattr(first, "message", None)
-            content = getattr(msg, "content", None) if msg else None
-            result = _normalize_output(content)
-
-            input_tok = 0
-            output_tok = 0
-            if hasattr(completion, "usage") and completion.usage:
-                input_tok = getattr(completion.usage, "input_tokens", 0) or 0
-                output_tok = getattr(completion.usage, "output_tokens", 0) or 0
-
-            if request_id or session_id:
-                token_tracker.record(
-                    input_tokens=input_tok,
-                    output_tokens=output_tok,
-                    model=settings.VISION_MODEL_NAME,
-                    request_id=request_id,
-                    session_id=session_id,
-                )
-
-            usage = {"input_tokens": input_tok, "output_tokens": output_tok}
-
-            if not result or len(result) < 5:
-                return (
-                    "The image could not be analyzed clearly. "
-                    "Please upload a clearer image.",
-                    usage,
-                )
-
-            return result, usage
-
-        except Exception as e:
-            if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_BACKOFF[attempt])
-                continue
-
-            return (
-                "The image could not be analyzed at this time. "
-                "Please try again later.",
-                {"input_tokens": 0, "output_tokens": 0},
-            )
-
-    return (
-        "The image could not be analyzed at this time. Please try again later.",
-        {"input_tokens": 0, "output_tokens": 0},
-    )
+                messages=messages,
+                **_VISION_PARAMS,
+            ),
+            settings.VISION_MODEL_NAME,
+            label="VISION_SERVICE",
+            cost_tokens=_estimate_cost(messages),
+        )
+        return _handle_completion(completion, request_id, session_id)
+    except DeadlineExceeded:
+        raise  # the pipeline degrades instead of returning a fallback text
+    except Exception as e:
+        print(f"[VISION_SERVICE] Giving up: {type(e).__name__}: {str(e)[:200]}")
+        return _UNAVAILABLE_MSG, _empty_usage()
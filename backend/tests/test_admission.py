@@ -0,0 +1,79 @@
+"""Tests for /ask admission control (in-flight limit + wait queue)."""
+import asyncio
+
+import pytest
+from backend.core.admission import AdmissionController, AdmissionRejected
+
+
+def test_admits_up_to_limit_then_sheds_when_queue_full():
+    async def run():
+        c = AdmissionController("text", max_in_flight=2, max_queue=0)
+        await c.acquire()
+        await c.acquire()
+        with pytest.raises(AdmissionRejected) as exc:
+            await c.acquire()
+        return c, exc.value
+
+    c, err = asyncio.run(run())
+    assert err.status_code == 429
+    assert err.retry_after >= 1
+    assert c.stats()["in_flight"] == 2
+    assert c.stats()["shed_queue_full"] == 1
+
+
+def test_queued_request_gets_released_slot_in_fifo_order():
+    async def run():
+        c = AdmissionController("text", max_in_flight=1, max_queue=2, queue_timeout=1.0)
+        await c.acquire()
+        order = []
+
+        async def waiter(n):
+            await c.acquire()
+            order.append(n)
+
+        tasks = [asyncio.create_task(waiter(n)) for n in (1, 2)]
+        await asyncio.sleep(0.01)
+        assert c.stats()["queue_depth"] == 2
+        c.release(0.1)
+        await asyncio.sleep(0.01)
+        c.release(0.1)
+        await asyncio.gather(*tasks)
+        return c, order
+
+    c, order = asyncio.run(run())
+    assert order == [1, 2]
+    stats = c.stats()
+    assert stats["in_flight"] == 1
+    assert stats["queued"] == 2
+    assert stats["max_wait_ms"] > 0
+
+
+def test_queue_timeout_returns_503():
+    async def run():
+        c = AdmissionController("image", max_in_flight=1, max_queue=1, queue_timeout=0.02)
+        await c.acquire()
+        with pytest.raises(AdmissionRejected) as exc:
+            await c.acquire()
+        return c, exc.value
+
+    c, err = asyncio.run(run())
+    assert err.status_code == 503
+    assert c.stats()["queue_depth"] == 0
+    assert c.stats()["shed_queue_timeout"] == 1
+
+
+def test_cancelled_waiter_does_not_leak_slot():
+    async def run():
+        c = AdmissionController("text", max_in_flight=1, max_queue=1, queue_timeout=5)
+        await c.acquire()
+        task = asyncio.create_task(c.acquire())
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        c.release()
+        return c
+
+    c = asyncio.run(run())
+    assert c.stats()["in_flight"] == 0
+    assert c.stats()["queue_depth"] == 0
@@ -84,3 +84,284 @@ def test_metrics_feedback_post(client):
     data = r.json()
     assert data.get("status") == "recorded"
     assert data.get("request_id") == "test-resume-001"
+
+
+# --- Streaming ---
+
+
+def test_ask_stream_rejects_empty_query(client):
+    r = client.post("/ask/stream", data={"query": "   "})
+    assert r.status_code == 400
+
+
+def test_metrics_cache(client):
+    r = client.get("/metrics/cache")
+    assert r.status_code == 200
+    assert "caches" in r.json()
+
+
+def test_metrics_cache_purge_unknown(client):
+    r = client.delete("/metrics/cache", params={"name": "no-such-cache"})
+    assert r.status_code == 404
+
+
+def test_metrics_cache_purge_before_the_cache_is_built(client, monkeypatch):
+    from backend.core import semantic_cache
+
+    purged = []
+    monkeypatch.setitem(semantic_cache._STORES, "answer", lambda: purged.append("answer"))
+    r = client.delete("/metrics/cache", params={"name": "answer"})
+    assert r.status_code == 200
+    assert r.json()["removed"] == {"answer": 0}
+    assert purged == ["answer"]
+
+
+# --- Uploads ---
+
+
+def test_ask_image_rejects_oversized_body(client):
+    """Declared oversized bodies are refused before the upload is spooled."""
+    big = b"\xFF\xD8" + b"\0" * (9 * 1024 * 1024)
+    r = client.post("/ask/image", files={"file": ("leaf.jpg", big, "image/jpeg")})
+    assert r.status_code == 413
+
+
+def test_ask_image_cuts_off_streamed_body(client):
+    """Chunked bodies without Content-Length are cut off once they cross the limit."""
+    def body():
+        yield (
+            b'--b\r\nContent-Disposition: form-data; name="file"; filename="leaf.jpg"\r\n'
+            b"Content-Type: image/jpeg\r\n\r\n\xFF\xD8"
+        )
+        for _ in range(200):
+            yield b"\0" * 65536
+        yield b"\r\n--b--\r\n"
+
+    r = client.post("/ask/image", content=body(), headers={"content-type": "multipart/form-data; boundary=b"})
+    assert r.status_code == 413
+
+
+def test_ask_image_sniffs_magic_bytes(client):
+    """A non-image body is refused even when the declared content type is JPEG."""
+    r = client.post("/ask/image", files={"file": ("leaf.jpg", b"GIF89a" + b"\0" * 64, "image/jpeg")})
+    assert r.status_code == 415
+
+
+# --- Admission control ---
+
+
+def test_metrics_admission(client):
+    r = client.get("/metrics/admission")
+    assert r.status_code == 200
+    assert "classes" in r.json()
+
+
+def test_ask_image_sheds_load_with_retry_after(client, monkeypatch):
+    """With every slot busy and no queue room the request is shed with 429 + Retry-After."""
+    from backend.core.admission import AdmissionController
+    from backend.routes import ask_router
+
+    busy = AdmissionController("image", max_in_flight=1, max_queue=0)
+    busy._in_flight = 1
+    monkeypatch.setattr(ask_router, "get_controller", lambda kind: busy)
+
+    r = client.post("/ask/image", files={"file": ("leaf.jpg", b"\xFF\xD8" + b"\0" * 64, "image/jpeg")})
+    assert r.status_code == 429
+    assert int(r.headers["retry-after"]) >= 1
+    assert busy.stats()["shed_queue_full"] == 1
+
+
+# --- Batch ---
+
+
+def test_ask_batch_rejects_malformed_body(client):
+    r = client.post("/ask/batch", content=b"{not json", headers={"content-type": "application/json"})
+    assert r.status_code == 400
+    r = client.post("/ask/batch", json=[])
+    assert r.status_code == 400
+
+
+def test_ask_batch_streams_results_and_summary(client, monkeypatch):
+    import json
+    import sys
+    import types
+    from backend.core.token_tracker import token_tracker
+
+    seen = []
+
+    async def fake_route(query, image_path=None, session_id=None, request_id=None, **kwargs):
+        seen.append((session_id, query))
+        token_tracker.record(100, 50, "llama-3.3-70b-versatile", request_id=request_id)
+        return f"advice for {query}", {"agents_used": ["CropAgent"]}
+
+    monkeypatch.setitem(sys.modules, "backend.agents.master_agent", types.SimpleNamespace(aroute_query=fake_route))
+    from backend.core.config import settings
+    monkeypatch.setattr(settings, "BATCH_QUERIES_PER_MINUTE", 0)
+
+    body = "\n".join([
+        json.dumps({"id": "a", "query": "wheat sowing", "session_id": "farm-1"}),
+        json.dumps("rice pests"),
+        json.dumps({"id": "c", "query": "  "}),
+        json.dumps({"id": "d", "query": "wheat irrigation", "session_id": "farm-1"}),
+    ])
+    r = client.post("/ask/batch", content=body, headers={"content-type": "application/x-ndjson"})
+    assert r.status_code == 200
+    lines = [json.loads(line) for line in r.text.splitlines()]
+    results = {line["index"]: line for line in lines if line["type"] == "result"}
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[0]["analysis"] == "advice for wheat sowing"
+    assert results[2]["status"] == "error"
+
+    summary = lines[-1]
+    assert summary["type"] == "summary"
+    assert (summary["succeeded"], summary["failed"]) == (3, 1)
+    assert summary["token_usage"]["total_tokens"] == 450
+    # Same-session queries keep their submission order
+    farm = [q for s, q in seen if s == "farm-1"]
+    assert farm == ["wheat sowing", "wheat irrigation"]
+
+    from backend.core.admission import get_controller
+    assert get_controller("text").stats()["in_flight"] == 0
+
+
+
+def test_batch_pacer_spaces_query_starts(monkeypatch):
+    import asyncio
+    from backend.routes import ask_router
+
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(round(seconds, 1))
+
+    monkeypatch.setattr(ask_router.asyncio, "sleep", fake_sleep)
+    pacer = ask_router._BatchPacer(per_minute=6)
+
+    async def main():
+        for _ in range(3):
+            await pacer.wait()
+
+    asyncio.run(main())
+    assert sleeps == [10.0, 20.0]
+    assert ask_router._BatchPacer(per_minute=0).interval == 0.0
+
+
+# --- Jobs ---
+
+
+def test_jobs_unknown_id_is_404(client):
+    r = client.get("/jobs/does-not-exist")
+    assert r.status_code == 404
+
+
+def test_jobs_submit_and_poll(monkeypatch):
+    import sys
+    import time
+    import types
+    from backend.core import job_queue
+    from backend.main import app
+
+    async def fake_route(query=None, image_bytes=None, session_id=None, request_id=None, on_event=None, **kwargs):
+        await on_event("routed", {"agents": [{"agent": "CropAgent", "role": "primary", "score": 90}]})
+        await on_event("agent_done", {"agent": "CropAgent", "role": "primary", "content": "Sow after the first rains."})
+        return "Sow after the first rains.", {"format_path": "normalize"}
+
+    monkeypatch.setitem(sys.modules, "backend.agents.master_agent", types.SimpleNamespace(aroute_query=fake_route))
+    monkeypatch.setattr(job_queue, "_QUEUE", job_queue.MemoryJobQueue(workers=1, max_pending=10, ttl=60))
+
+    with TestClient(app) as client:
+        r = client.post("/jobs", data={"query": "When should I sow maize?"})
+        assert r.status_code == 202
+        job_id = r.json()["job_id"]
+        assert r.headers["location"] == f"/jobs/{job_id}"
+
+        for _ in range(100):
+            job = client.get(f"/jobs/{job_id}").json()
+            if job["status"] == "succeeded":
+                break
+            time.sleep(0.01)
+
+    assert job["status"] == "succeeded"
+    assert job["partial"][0]["content"] == "Sow after the first rains."
+    assert job["result"]["analysis"] == "Sow after the first rains."
+    assert job["agents"][0]["agent"] == "CropAgent"
+
+
+# --- WebSocket chat ---
+
+
+def test_ws_chat_keeps_history_on_the_connection(client, monkeypatch):
+    import sys
+    import types
+    from backend.core import memory_manager
+
+    seen_history = []
+
+    async def fake_route(query=None, image_bytes=None, session_id=None, request_id=None,
+                         on_event=None, chat_history=None, save_history=True, **kwargs):
+        assert save_history is False
+        seen_history.append([m["content"] for m in chat_history])
+        await on_event("token", {"text": f"answer {len(seen_history)}"})
+        return f"answer {len(seen_history)}", {"format_path": "normalize"}
+
+    monkeypatch.setitem(sys.modules, "backend.agents.master_agent", types.SimpleNamespace(aroute_query=fake_route))
+    loads = []
+    real_get = memory_manager.get_chat_history
+    monkeypatch.setattr(memory_manager, "get_chat_history", lambda sid: loads.append(sid) or real_get(sid))
+
+    with client.websocket_connect("/ws/chat?session_id=ws-test-kiosk") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_text("Which wheat variety suits clay soil?")
+        frames = [ws.receive_json() for _ in range(3)]
+        assert [f["type"] for f in frames] == ["start", "token", "final"]
+        assert frames[-1]["analysis"] == "answer 1"
+
+        ws.send_json({"query": "And when should I sow it?"})
+        while ws.receive_json()["type"] != "final":
+            pass
+
+        ws.send_json({"query": ""})
+        assert ws.receive_json() == {"type": "error", "detail": "Query cannot be empty"}
+
+    assert seen_history == [[], ["Which wheat variety suits clay soil?", "answer 1"]]
+    assert loads == ["ws-test-kiosk"]  # history is read once per connection
+    stored = [m["content"] for m in memory_manager.get_chat_history("ws-test-kiosk")]
+    assert stored[-2:] == ["And when should I sow it?", "answer 2"]
+
+
+def test_ws_chat_keeps_the_question_when_the_turn_fails(client, monkeypatch):
+    import sys
+    import types
+    from backend.core import memory_manager
+
+    async def failing_route(**kwargs):
+        raise RuntimeError("formatter timed out")
+
+    monkeypatch.setitem(sys.modules, "backend.agents.master_agent", types.SimpleNamespace(aroute_query=failing_route))
+
+    with client.websocket_connect("/ws/chat?session_id=ws-test-failed-turn") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_text("Why are my tomato leaves curling?")
+        assert ws.receive_json()["type"] == "start"
+        assert ws.receive_json()["type"] == "error"
+
+    stored = [m["content"] for m in memory_manager.get_chat_history("ws-test-failed-turn")]
+    assert stored[-1:] == ["Why are my tomato leaves curling?"]
+
+
+def test_ws_chat_answers_binary_frames_with_an_error(client, monkeypatch):
+    import sys
+    import types
+
+    async def no_route(**kwargs):
+        raise AssertionError("invalid frames must not be routed")
+
+    monkeypatch.setitem(sys.modules, "backend.agents.master_agent", types.SimpleNamespace(aroute_query=no_route))
+    with client.websocket_connect("/ws/chat?session_id=ws-test-binary") as ws:
+        assert ws.receive_json()["type"] == "ready"
+        ws.send_bytes(b"\xff\xd8\xff\xe0 raw jpeg")
+        frame = ws.receive_json()
+        assert frame["type"] == "error"
+        assert "UTF-8" in frame["detail"]
+        ws.send_bytes("   ".encode("utf-8"))
+        assert ws.receive_json() == {"type": "error", "detail": "Query cannot be empty"}
@@ -0,0 +1,101 @@
+"""Tests for request deadlines and their effect on the resilience layer."""
+import asyncio
+
+import pytest
+from backend.core import deadline, resilience
+from backend.core.deadline import DeadlineExceeded, await_within, deadline_scope, record_cut
+from backend.core.resilience import RetryPolicy, acall_with_resilience, get_breaker
+
+
+def test_no_deadline_outside_scope():
+    assert deadline.remaining() is None
+    assert deadline.has_time(1e9)
+    deadline.check("anything")
+
+
+def test_nested_scope_only_tightens():
+    with deadline_scope(10):
+        with deadline_scope(60):
+            assert deadline.remaining() <= 10
+        with deadline_scope(1):
+            assert deadline.remaining() <= 1
+        with deadline_scope(0):
+            assert 1 < deadline.remaining() <= 10
+    assert deadline.remaining() is None
+
+
+def test_await_within_cuts_slow_work():
+    async def _run():
+        with deadline_scope(0.05):
+            await await_within(asyncio.sleep(5), stage="agent")
+
+    with pytest.raises(DeadlineExceeded) as exc:
+        asyncio.run(_run())
+    assert exc.value.stage == "agent"
+
+
+def test_await_within_keeps_reserve_and_skips_when_spent():
+    async def _run():
+        with deadline_scope(0.2):
+            with pytest.raises(DeadlineExceeded):
+                await await_within(asyncio.sleep(0), reserve=1.0)
+            return await await_within(asyncio.sleep(0, result="ok"), reserve=0.1)
+
+    assert asyncio.run(_run()) == "ok"
+
+
+def test_await_within_passes_through_inner_timeouts():
+    async def _inner_timeout():
+        raise TimeoutError("socket")
+
+    async def _run():
+        with deadline_scope(5):
+            await await_within(_inner_timeout())
+
+    with pytest.raises(TimeoutError) as exc:
+        asyncio.run(_run())
+    assert not isinstance(exc.value, DeadlineExceeded)
+
+
+def test_resilience_gives_up_instead_of_sleeping_past_deadline(monkeypatch):
+    monkeypatch.setattr(resilience, "backoff_delay", lambda *a: 10.0)
+    calls = []
+
+    async def _flaky():
+        calls.append(1)
+        raise ConnectionError("reset")
+
+    async def _run():
+        with deadline_scope(0.05):
+            await acall_with_resilience(
+                _flaky,
+                "deadline-test-backoff",
+                policy=RetryPolicy(max_attempts=5),
+            )
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(_run())
+    assert len(calls) == 1
+
+
+def test_deadline_cut_does_not_trip_breaker():
+    async def _slow():
+        await asyncio.sleep(5)
+
+    async def _run():
+        with deadline_scope(0.05):
+            await acall_with_resilience(_slow, "deadline-test-breaker")
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(_run())
+    snap = get_breaker("deadline-test-breaker").snapshot()
+    assert snap["state"] == "closed"
+    assert snap["failures"] == 0
+
+
+def test_record_cut_deduplicates():
+    trace = {}
+    record_cut(trace, "formatter")
+    record_cut(trace, "formatter")
+    record_cut(None, "router")
+    assert trace == {"cut_stages": ["formatter"]}
@@ -0,0 +1,92 @@
+"""Tests for FormatterAgent single-agent fast path."""
+import asyncio
+
+import pytest
+from backend.agents import formatter_agent
+from backend.agents.formatter_agent import FormatterAgent, normalize_markdown
+
+
+def test_normalize_markdown_bullets_and_blank_lines():
+    raw = "Use NPK.\r\n\r\n\r\n\r\n• Apply 50 kg/acre   \n* Split doses\n### Timing\nAt sowing."
+    out = normalize_markdown(raw)
+    assert "- Apply 50 kg/acre\n- Split doses" in out
+    assert "\n\n\n" not in out
+    assert "Split doses\n\n### Timing" in out
+
+
+def test_fast_path_skips_llm_for_single_agent(monkeypatch):
+    monkeypatch.setattr(formatter_agent.settings, "FORMATTER_FAST_PATH", "passthrough")
+    monkeypatch.setattr(FormatterAgent, "record", lambda self, **kw: None)
+
+    async def _no_llm(*args, **kwargs):
+        raise AssertionError("formatter LLM must not be called")
+
+    monkeypatch.setattr(formatter_agent, "aquery_groq_text", _no_llm)
+
+    trace = {}
+    payload = {
+        "user_query": "rice fertilizer",
+        "routing_mode": "text_only",
+        "agent_results": [
+            {"agent": "CropAgent", "role": "primary", "content": "Use urea."},
+            {"agent": "YieldAgent", "role": "supporting", "content": "  "},
+        ],
+    }
+    out = asyncio.run(FormatterAgent().ahandle_query(payload, trace=trace))
+    assert out == "Use urea."
+    assert trace["format_path"] == "passthrough"
+
+
+def _two_agent_payload():
+    return {
+        "user_query": "rice fertilizer",
+        "routing_mode": "text_only",
+        "agent_results": [
+            {"agent": "YieldAgent", "role": "supporting", "content": "Expect 5 t/ha."},
+            {"agent": "CropAgent", "role": "primary", "content": "• Use urea."},
+        ],
+    }
+
+
+def test_skip_llm_merges_results_locally(monkeypatch):
+    monkeypatch.setattr(FormatterAgent, "record", lambda self, **kw: None)
+
+    async def _no_llm(*args, **kwargs):
+        raise AssertionError("formatter LLM must not be called")
+
+    monkeypatch.setattr(formatter_agent, "aquery_groq_text", _no_llm)
+
+    trace = {}
+    out = asyncio.run(FormatterAgent().ahandle_query(_two_agent_payload(), trace=trace, skip_llm=True))
+    assert out == "- Use urea.\n\nExpect 5 t/ha."
+    assert trace["format_path"] == "normalize"
+    assert trace["cut_stages"] == ["formatter"]
+
+
+def test_deadline_during_formatting_falls_back_to_local_merge(monkeypatch):
+    monkeypatch.setattr(formatter_agent.settings, "FORMATTER_FAST_PATH", "off")
+    monkeypatch.setattr(FormatterAgent, "record", lambda self, **kw: None)
+
+    async def _late(*args, **kwargs):
+        raise formatter_agent.DeadlineExceeded("TEXT_SERVICE")
+
+    monkeypatch.setattr(formatter_agent, "aquery_groq_text", _late)
+
+    trace = {}
+    out = asyncio.run(FormatterAgent().ahandle_query(_two_agent_payload(), trace=trace))
+    assert "[PRIMARY" not in out
+    assert out.startswith("- Use urea.")
+    assert trace["cut_stages"] == ["formatter"]
+
+
+def test_skip_llm_is_not_a_cut_when_the_fast_path_applies(monkeypatch):
+    monkeypatch.setattr(formatter_agent.settings, "FORMATTER_FAST_PATH", "passthrough")
+    monkeypatch.setattr(FormatterAgent, "record", lambda self, **kw: None)
+
+    payload = _two_agent_payload()
+    payload["agent_results"] = payload["agent_results"][1:]
+    trace = {}
+    out = asyncio.run(FormatterAgent().ahandle_query(payload, trace=trace, skip_llm=True))
+    assert out == "• Use urea."
+    assert trace["format_path"] == "passthrough"
+    assert "cut_stages" not in trace
@@ -0,0 +1,124 @@
+"""Tests for hedged LLM requests."""
+import asyncio
+
+import pytest
+from backend.core import hedging
+from backend.core.hedging import HedgeBudget, LatencyTracker, ahedged
+
+
+@pytest.fixture
+def hedge_on(monkeypatch):
+    monkeypatch.setattr(hedging.settings, "HEDGE_ENABLED", True)
+    monkeypatch.setattr(hedging.settings, "HEDGE_MIN_SAMPLES", 5)
+    monkeypatch.setattr(hedging.settings, "HEDGE_MIN_DELAY_SECONDS", 0.0)
+    monkeypatch.setattr(hedging, "_BUDGET", HedgeBudget(ratio=0.5, burst=1.0))
+    monkeypatch.setattr(hedging, "_TRACKERS", {})
+
+
+def _warm(name, seconds=0.02, n=10):
+    tracker = hedging._get_tracker(name)
+    for _ in range(n):
+        tracker.record(seconds)
+
+
+def test_percentile_nearest_rank():
+    t = LatencyTracker(window=100)
+    assert t.percentile(95) is None
+    for v in range(1, 101):
+        t.record(v / 100)
+    assert t.percentile(50) == 0.5
+    assert t.percentile(99) == 0.99
+
+
+def test_budget_caps_hedges():
+    b = HedgeBudget(ratio=0.5, burst=1.0)
+    assert b.try_spend()
+    assert not b.try_spend()
+    b.earn()
+    b.earn()
+    assert b.try_spend()
+
+
+def test_disabled_calls_once():
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        return "ok"
+
+    assert asyncio.run(ahedged(fn, "test:disabled")) == "ok"
+    assert calls == [1]
+
+
+def test_slow_first_call_is_hedged_and_cancelled(hedge_on):
+    _warm("test:slow")
+    started, cancelled = [], []
+
+    async def fn():
+        n = len(started)
+        started.append(n)
+        try:
+            await asyncio.sleep(5 if n == 0 else 0.01)
+        except asyncio.CancelledError:
+            cancelled.append(n)
+            raise
+        return f"call-{n}"
+
+    async def run():
+        result = await ahedged(fn, "test:slow")
+        await asyncio.sleep(0)
+        return result
+
+    assert asyncio.run(run()) == "call-1"
+    assert cancelled == [0]
+    stats = hedging.hedge_stats()
+    assert stats["hedge_wins"] >= 1
+
+
+def test_no_hedge_without_budget(hedge_on, monkeypatch):
+    monkeypatch.setattr(hedging, "_BUDGET", HedgeBudget(ratio=0.0, burst=1.0))
+    hedging._BUDGET.try_spend()
+    _warm("test:budget")
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "only"
+
+    assert asyncio.run(ahedged(fn, "test:budget")) == "only"
+    assert len(calls) == 1
+
+
+def test_failed_hedge_does_not_mask_success(hedge_on):
+    _warm("test:fail")
+    started = []
+
+    async def fn():
+        n = len(started)
+        started.append(n)
+        if n == 1:
+            raise ConnectionError("hedge failed")
+        await asyncio.sleep(0.1)
+        return "primary"
+
+    assert asyncio.run(ahedged(fn, "test:fail")) == "primary"
+
+
+def test_no_hedge_without_rate_capacity(hedge_on, monkeypatch):
+    from backend.core.rate_governor import RateGovernor
+
+    governor = RateGovernor("test-model", rpm=1, tpm=0)
+    governor.try_reserve(0)  # the primary call took the only slot
+    monkeypatch.setattr(hedging, "get_governor", lambda model: governor)
+    _warm("test:rate")
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return "only"
+
+    assert asyncio.run(ahedged(fn, "test:rate", "test-model", 100)) == "only"
+    assert len(calls) == 1
+    assert hedging._BUDGET.tokens >= 1.0  # the unused hedge is refunded
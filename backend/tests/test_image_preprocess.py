@@ -0,0 +1,54 @@
+"""Tests for image preprocessing ahead of vision inference."""
+import io
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+
+from backend.core.config import settings
+from backend.services.image_preprocess import prepare_image
+
+
+def _photo(size, fmt="JPEG", orientation=None, mode="RGB"):
+    img = Image.effect_noise(size, 64).convert(mode)
+    out = io.BytesIO()
+    kwargs = {"quality": 95} if fmt == "JPEG" else {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        kwargs["exif"] = exif
+    img.save(out, format=fmt, **kwargs)
+    return out.getvalue()
+
+
+def test_large_photo_is_downscaled_and_smaller():
+    data = _photo((3000, 2000))
+    out, stats = prepare_image(data)
+    assert stats["preprocessed"] is True
+    assert max(stats["size"]) == settings.IMAGE_MAX_EDGE
+    assert stats["bytes_saved"] == len(data) - len(out) > 0
+    assert Image.open(io.BytesIO(out)).format == "JPEG"
+
+
+def test_exif_orientation_applied_and_stripped():
+    data = _photo((2000, 1000), orientation=6)  # rotate 90 on display
+    out, stats = prepare_image(data)
+    img = Image.open(io.BytesIO(out))
+    assert img.height > img.width
+    assert not img.getexif()
+
+
+def test_png_with_alpha_is_flattened():
+    data = _photo((1600, 1600), fmt="PNG", mode="RGBA")
+    out, stats = prepare_image(data)
+    assert stats["format"] == "image/jpeg"
+    assert Image.open(io.BytesIO(out)).mode == "RGB"
+
+
+def test_undecodable_bytes_pass_through():
+    data = b"\x89PNG not really"
+    out, stats = prepare_image(data)
+    assert out == data
+    assert stats["preprocessed"] is False
+    assert stats["bytes_saved"] == 0
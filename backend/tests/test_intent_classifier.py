@@ -0,0 +1,50 @@
+"""Tests for the local nearest-centroid intent classifier."""
+import pytest
+from backend.core.intent_classifier import IntentClassifier, build_training_samples
+
+_VOCAB = ["water", "irrigation", "drip", "pest", "aphids", "leaf", "subsidy", "scheme"]
+
+
+def _embed(texts):
+    return [[float(w in t.lower()) for w in _VOCAB] for t in texts]
+
+
+def test_build_training_samples_filters_and_dedupes():
+    descriptions = [{"name": "PestAgent", "description": "pest and leaf problems"}]
+    log = [
+        {"agent": "PestAgent", "query": "Aphids on leaf", "type": "text"},
+        {"agent": "PestAgent", "query": "aphids on leaf?", "type": "text"},
+        {"agent": "PestAgent", "query": "Image-based symptom observation", "type": "multimodal"},
+        {"agent": "FormatterAgent", "query": "aphids", "type": "text"},
+    ]
+    samples = build_training_samples(descriptions, log, ["PestAgent", "CropAgent"])
+    assert samples == {"PestAgent": ["pest and leaf problems", "aphids on leaf"]}
+
+
+def test_training_uses_only_llm_routed_records():
+    descriptions = [{"name": "PestAgent", "description": "pest and leaf problems"}]
+    log = [
+        {"agent": "PestAgent", "query": "aphids", "type": "text"},  # pre-trace entry
+        {"agent": "PestAgent", "query": "leaf spots", "type": "text", "routing_mode": "text_only", "router_source": "llm"},
+        {"agent": "PestAgent", "query": "subsidy for drip", "type": "text", "routing_mode": "text_only", "router_source": "local"},
+        {"agent": "PestAgent", "query": "mites", "type": "text", "routing_mode": "text_only", "router_source": "cache"},
+        {"agent": "PestAgent", "query": "whiteflies", "type": "text", "routing_mode": "text_only"},
+    ]
+    samples = build_training_samples(descriptions, log, ["PestAgent"])
+    assert samples == {"PestAgent": ["pest and leaf problems", "leaf spots", "aphids"]}
+
+
+def test_classify_confident_and_ambiguous():
+    clf = IntentClassifier(_embed)
+    clf.fit({
+        "IrrigationAgent": ["drip irrigation water"],
+        "PestAgent": ["pest aphids"],
+        "SubsidyAgent": ["subsidy scheme"],
+    })
+    result, similarity = clf.classify("aphids pest on my plants")
+    assert result.agents[0].agent == "PestAgent"
+    assert result.agents[0].score >= 75
+    assert similarity > 0.5
+
+    mixed, _ = clf.classify("subsidy to control aphids")
+    assert mixed.agents[0].score < 75
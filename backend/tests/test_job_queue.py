@@ -0,0 +1,102 @@
+"""Tests for the in-process job queue behind /jobs."""
+import asyncio
+
+import pytest
+from backend.core.job_queue import QUEUED, SUCCEEDED, MemoryJobQueue, QueueFull, new_job
+
+
+def test_memory_queue_runs_jobs_and_keeps_partial_results(tmp_path):
+    async def runner(queue, job, image):
+        job["partial"].append({"agent": "CropAgent", "role": "primary", "content": "sow in rows"})
+        await queue.save(job)
+        job.update(status=SUCCEEDED, result={"analysis": f"done: {job['query']} ({len(image)} bytes)"})
+        await queue.save(job)
+
+    async def scenario():
+        queue = MemoryJobQueue(workers=2, max_pending=10, ttl=60, runner=runner, image_dir=tmp_path)
+        job = new_job("wheat sowing", "farm-1", has_image=True)
+        await queue.submit(job, b"\xff\xd8img")
+        assert (await queue.get(job["job_id"]))["status"] in (QUEUED, SUCCEEDED)
+        for _ in range(50):
+            stored = await queue.get(job["job_id"])
+            if stored["status"] == SUCCEEDED:
+                break
+            await asyncio.sleep(0.01)
+        await queue.aclose()
+        return stored
+
+    stored = asyncio.run(scenario())
+    assert stored["result"]["analysis"] == "done: wheat sowing (5 bytes)"
+    assert stored["partial"][0]["agent"] == "CropAgent"
+    assert stored["mode"] == "multimodal"
+
+
+def test_memory_queue_rejects_when_backlog_is_full():
+    release = None
+
+    async def runner(queue, job, image):
+        await release.wait()
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        queue = MemoryJobQueue(workers=1, max_pending=1, ttl=60, runner=runner)
+        await queue.submit(new_job("a", None, False))
+        await asyncio.sleep(0)  # the single worker picks up the first job
+        await queue.submit(new_job("b", None, False))
+        with pytest.raises(QueueFull):
+            await queue.submit(new_job("c", None, False))
+        release.set()
+        await queue.aclose()
+
+    asyncio.run(scenario())
+
+
+def test_images_wait_on_disk_within_a_byte_cap(tmp_path):
+    release = None
+    seen = []
+
+    async def runner(queue, job, image):
+        seen.append(image)
+        await release.wait()
+
+    async def scenario():
+        nonlocal release
+        release = asyncio.Event()
+        queue = MemoryJobQueue(workers=1, max_pending=10, ttl=60, runner=runner, max_image_bytes=10, image_dir=tmp_path)
+        await queue.submit(new_job("a", None, True), b"x" * 6)
+        await asyncio.sleep(0.05)  # the worker takes the first image off disk
+        assert seen == [b"x" * 6] and list(tmp_path.iterdir()) == []
+
+        await queue.submit(new_job("b", None, True), b"y" * 8)
+        assert len(list(tmp_path.iterdir())) == 1
+        assert queue.stats()["pending_image_bytes"] == 8
+        with pytest.raises(QueueFull):
+            await queue.submit(new_job("c", None, True), b"z" * 3)
+        await queue.submit(new_job("d", None, False))  # text jobs are not held to the image cap
+
+        await queue.aclose()
+        assert list(tmp_path.iterdir()) == []
+
+    asyncio.run(scenario())
+
+
+def test_crashed_runner_does_not_stop_the_worker():
+    async def runner(queue, job, image):
+        if job["query"] == "boom":
+            raise RuntimeError("worker bug")
+        job["status"] = SUCCEEDED
+
+    async def scenario():
+        queue = MemoryJobQueue(workers=1, max_pending=10, ttl=60, runner=runner)
+        first, second = new_job("boom", None, False), new_job("ok", None, False)
+        await queue.submit(first)
+        await queue.submit(second)
+        for _ in range(50):
+            if (await queue.get(second["job_id"]))["status"] == SUCCEEDED:
+                break
+            await asyncio.sleep(0.01)
+        await queue.aclose()
+        return await queue.get(second["job_id"])
+
+    assert asyncio.run(scenario())["status"] == SUCCEEDED
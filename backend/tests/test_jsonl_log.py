@@ -0,0 +1,75 @@
+"""Tests for the append-only JSONL interaction log and its legacy migrator."""
+import json
+from datetime import datetime
+
+import pytest
+from backend.core.jsonl_log import JsonlLog, read_jsonl
+from backend.scripts.migrate_query_log import migrate
+
+
+def test_append_and_read_in_order(tmp_path):
+    log = JsonlLog(tmp_path, "q", fsync="never")
+    log.append({"i": 0})
+    log.append_many([{"i": 1}, {"i": 2, "text": "धान"}])
+    log.close()
+
+    assert [r["i"] for r in log.read()] == [0, 1, 2]
+    assert log.read()[2]["text"] == "धान"
+    assert len(log.segments()) == 1
+
+
+def test_rotates_by_size_and_prunes_old_segments(tmp_path, monkeypatch):
+    clock = iter(range(1_700_000_000, 1_700_001_000))
+    monkeypatch.setattr("backend.core.jsonl_log.time.time", lambda: float(next(clock)))
+    log = JsonlLog(tmp_path, "q", max_bytes=20, max_age=0, max_segments=2, fsync="never")
+    for i in range(5):
+        log.append({"i": i, "pad": "x" * 10})
+    log.close()
+
+    assert len(log.segments()) == 2
+    assert [r["i"] for r in log.read()] == [3, 4]
+
+
+def test_read_skips_torn_lines_and_old_segments(tmp_path):
+    log = JsonlLog(tmp_path, "q", fsync="never")
+    old = log.segment_path(datetime(2025, 1, 1))
+    new = log.segment_path(datetime(2025, 3, 1))
+    old.write_text('{"i": 0}\n', encoding="utf-8")
+    new.write_text('{"i": 1}\n{"i": 2, "tru\n[1]\n\n{"i": 3}\n', encoding="utf-8")
+
+    assert [r["i"] for r in read_jsonl(new)] == [1, 3]
+    assert [r["i"] for r in log.read()] == [0, 1, 3]
+    assert [r["i"] for r in log.read(since=datetime(2025, 4, 1))] == [1, 3]
+
+
+def test_migrator_moves_legacy_entries_before_new_segments(tmp_path):
+    legacy = tmp_path / "query_log.json"
+    legacy.write_text(json.dumps([
+        {"timestamp": "2025-11-29T18:00:05", "agent": "CropAgent", "query": "help me"},
+        {"timestamp": "2025-11-30T09:00:00", "agent": "PestAgent", "query": "aphids"},
+    ]), encoding="utf-8")
+    log = JsonlLog(tmp_path / "query_log", "query_log", fsync="never")
+    log.append({"timestamp": "2026-01-01T00:00:00", "agent": "CropAgent", "query": "new"})
+
+    assert migrate(log, [tmp_path / "missing.json", legacy]) == 2
+    assert [r["query"] for r in log.read()] == ["help me", "aphids", "new"]
+    assert not legacy.exists() and (tmp_path / "query_log.json.migrated").exists()
+    assert migrate(log, [legacy]) == 0
+    log.close()
+
+
+def test_feedback_is_appended_and_queued_entries_are_visible(tmp_path, monkeypatch):
+    from backend.services import feedback_service
+
+    legacy = tmp_path / "feedback_log.json"
+    legacy.write_text('[{"request_id": "old", "feedback": "positive"}, {"trunc', encoding="utf-8")
+    monkeypatch.setattr(feedback_service, "LEGACY_FEEDBACK_PATH", legacy)
+    monkeypatch.setattr(feedback_service, "_log", JsonlLog(tmp_path / "feedback_log", "feedback_log", fsync="never"))
+    monkeypatch.setattr(feedback_service, "_pending", [])
+
+    feedback_service._pending.append({"request_id": "queued", "feedback": "negative"})
+    feedback_service._write_feedback([{"request_id": "r1", "feedback": "positive"}])
+
+    # A corrupt legacy file no longer blocks writes; queued entries are counted once
+    assert [e["request_id"] for e in feedback_service.get_feedback_log()] == ["r1", "queued"]
+    feedback_service.close_feedback_log()
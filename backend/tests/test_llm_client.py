@@ -0,0 +1,46 @@
+"""Tests for the pooled LLM client registry."""
+import asyncio
+
+import pytest
+from backend.core.llm_client import get_llm, get_async_http_client, get_http_client, llm_pool_stats, run_sync
+
+
+def test_same_config_reuses_client():
+    a = get_llm()
+    b = get_llm()
+    assert a is b
+    assert get_llm(temperature=0.0) is not a
+    assert get_llm(max_tokens=256) is not a
+
+
+def test_clients_share_http_pool():
+    a = get_llm()
+    b = get_llm(temperature=0.0)
+    assert a.http_client is b.http_client is get_http_client()
+
+
+def test_async_pool_is_per_event_loop():
+    async def grab():
+        return get_async_http_client(), get_llm()
+
+    first_pool, first_llm = asyncio.run(grab())
+    second_pool, second_llm = asyncio.run(grab())
+    assert first_pool is not second_pool
+    assert first_llm is not second_llm
+
+
+def test_run_sync_closes_the_loops_async_pool():
+    async def grab():
+        return get_async_http_client()
+
+    pool = run_sync(grab())
+    assert pool.is_closed
+    assert not get_http_client().is_closed
+
+
+def test_pool_stats_shape():
+    get_llm()
+    stats = llm_pool_stats()
+    assert stats["llm_clients"] >= 1
+    assert stats["llm_reused"] >= 0
+    assert isinstance(stats["http2"], bool)
@@ -0,0 +1,54 @@
+"""Tests for the background batched log writer."""
+import threading
+
+import pytest
+from backend.core.log_writer import POLICY_BLOCK, BatchedLogWriter
+
+
+def test_batches_by_size_and_drains_the_rest():
+    batches = []
+    writer = BatchedLogWriter("t", batches.append, max_queue=100, batch_size=3, flush_interval=5.0)
+    for i in range(7):
+        assert writer.put({"i": i})
+
+    assert writer.drain(timeout=2.0)
+    assert [r["i"] for batch in batches for r in batch] == list(range(7))
+    assert all(len(batch) <= 3 for batch in batches)
+    stats = writer.stats()
+    assert stats["written"] == 7 and stats["queue_depth"] == 0 and not stats["running"]
+    assert not writer.put({"i": 7})  # closed writers refuse new records
+
+
+def test_flushes_a_partial_batch_after_the_interval():
+    flushed = threading.Event()
+    writer = BatchedLogWriter("t", lambda batch: flushed.set(), batch_size=100, flush_interval=0.05)
+    writer.put({"i": 0})
+
+    assert flushed.wait(2.0)
+    writer.drain(timeout=2.0)
+
+
+@pytest.mark.parametrize("policy", ["drop", POLICY_BLOCK])
+def test_full_queue_drops_and_counts(policy):
+    release = threading.Event()
+    writer = BatchedLogWriter(
+        "t", lambda batch: release.wait(2.0), max_queue=2, batch_size=1, flush_interval=0.0,
+        policy=policy, block_timeout=0.05,
+    )
+    results = [writer.put({"i": i}) for i in range(10)]
+    release.set()
+
+    assert results.count(False) >= 1
+    assert writer.stats()["dropped"] == results.count(False)
+    assert writer.drain(timeout=2.0)
+    assert writer.stats()["written"] == results.count(True)
+
+
+def test_sink_errors_are_counted_not_raised():
+    def sink(batch):
+        raise OSError("disk full")
+
+    writer = BatchedLogWriter("t", sink, batch_size=10, flush_interval=0.0)
+    writer.put({"i": 0})
+    assert writer.drain(timeout=2.0)
+    assert writer.stats()["failed"] == 1
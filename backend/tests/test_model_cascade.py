@@ -0,0 +1,76 @@
+"""Tests for per-call-site model cascades (fallback on degraded / slow models)."""
+import asyncio
+
+import pytest
+from backend.core import resilience
+from backend.core.config import settings
+from backend.core.llm_client import AGENT, ModelCascade, ROUTER, get_cascade
+from backend.core.resilience import acall_with_cascade, get_breaker
+from backend.core.token_tracker import token_tracker
+
+
+def test_default_cascades(monkeypatch):
+    monkeypatch.setattr(settings, "CASCADE_ROUTER_MODELS", "")
+    monkeypatch.setattr(settings, "CASCADE_AGENT_MODELS", "")
+    router = get_cascade(ROUTER)
+    assert router.models == (settings.TEXT_MODEL_NAME, settings.FALLBACK_TEXT_MODEL_NAME)
+    assert get_cascade(AGENT).models == (settings.TEXT_MODEL_NAME,)
+
+    monkeypatch.setattr(settings, "CASCADE_AGENT_MODELS", "big, small ,big")
+    assert get_cascade(AGENT).models == ("big", "small")
+    monkeypatch.setattr(settings, "CASCADE_ENABLED", False)
+    assert get_cascade(ROUTER).models == (settings.TEXT_MODEL_NAME,)
+
+
+def test_open_breaker_falls_back_to_next_model():
+    breaker = get_breaker("cascade-open-primary")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    cascade = ModelCascade("test-open", ("cascade-open-primary", "cascade-open-small"))
+    calls = []
+
+    async def _call(model):
+        calls.append(model)
+        return f"answer from {model}"
+
+    result, model = asyncio.run(acall_with_cascade(_call, cascade))
+    assert (result, model) == ("answer from cascade-open-small", "cascade-open-small")
+    assert calls == ["cascade-open-small"]
+    stats = resilience.cascade_stats()["test-open"]
+    assert stats == {"answered_by": {"cascade-open-small": 1}, "fallbacks": 1}
+
+
+def test_latency_budget_moves_to_next_model():
+    cascade = ModelCascade("test-slow", ("cascade-slow-primary", "cascade-slow-small"), latency_budget=0.05)
+
+    async def _call(model):
+        if model == "cascade-slow-primary":
+            await asyncio.sleep(1)
+        return model
+
+    _, model = asyncio.run(acall_with_cascade(_call, cascade))
+    assert model == "cascade-slow-small"
+    # A budget overrun says nothing about the primary's health
+    assert get_breaker("cascade-slow-primary").snapshot()["failures"] == 0
+
+
+def test_non_transient_error_is_not_masked():
+    cascade = ModelCascade("test-bad", ("cascade-bad-primary", "cascade-bad-small"))
+
+    async def _call(model):
+        raise ValueError("malformed request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(acall_with_cascade(_call, cascade))
+
+
+def test_token_summary_reports_answering_model():
+    token_tracker.record(1000, 500, "llama-3.3-70b-versatile", request_id="cascade-req", session_id="cascade-s")
+    token_tracker.record(1000, 500, "llama-3.1-8b-instant", request_id="cascade-req", session_id="cascade-s")
+    summary = token_tracker.get_request_summary("cascade-req")
+    assert set(summary["by_model"]) == {"llama-3.3-70b-versatile", "llama-3.1-8b-instant"}
+    small = summary["by_model"]["llama-3.1-8b-instant"]["estimated_cost_usd"]
+    assert small < summary["by_model"]["llama-3.3-70b-versatile"]["estimated_cost_usd"]
+    session = token_tracker.get_session_summary("cascade-s")
+    assert session["total_tokens"] == 3000
+    assert session["estimated_cost_usd"] == summary["estimated_cost_usd"]
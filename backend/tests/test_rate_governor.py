@@ -0,0 +1,81 @@
+"""Tests for the per-model RPM/TPM rate-limit governor (in-process buckets)."""
+import asyncio
+
+import pytest
+from backend.core import rate_governor
+from backend.core.deadline import deadline_scope
+from backend.core.rate_governor import RateBudgetExceeded, RateGovernor, estimate_tokens
+
+
+@pytest.fixture(autouse=True)
+def no_redis(monkeypatch):
+    monkeypatch.setattr(rate_governor, "get_redis", lambda: None)
+
+
+def test_requests_queue_once_rpm_bucket_is_empty():
+    g = RateGovernor("m", rpm=60, tpm=0)
+    waits = [g.reserve(0) for _ in range(61)]
+    assert waits[:60] == [0.0] * 60
+    assert 0.9 < waits[60] <= 1.0
+    assert g.stats()["waited"] == 1
+
+
+def test_tokens_per_minute_bound_the_wait():
+    g = RateGovernor("m", rpm=0, tpm=600)
+    assert g.reserve(600) == 0.0
+    # 600 TPM refills 10 tokens/s: 50 more tokens need ~5s
+    assert 4.9 < g.reserve(50) <= 5.0
+
+
+def test_rejects_when_wait_exceeds_max_and_keeps_capacity():
+    g = RateGovernor("m", rpm=60, tpm=0, max_wait=0.5)
+    for _ in range(60):
+        g.reserve(0)
+    with pytest.raises(RateBudgetExceeded):
+        g.reserve(0)
+    assert g.stats()["rejected"] == 1
+    assert g.stats()["reserved"] == 60
+
+
+def test_deadline_caps_queueing_time():
+    g = RateGovernor("m", rpm=60, tpm=0, max_wait=30)
+    for _ in range(60):
+        g.reserve(0)
+    with deadline_scope(0.2):
+        with pytest.raises(RateBudgetExceeded):
+            g.reserve(0)
+
+
+def test_throttle_pauses_all_callers():
+    g = RateGovernor("m", rpm=600, tpm=0)
+    g.throttle(2.0)
+    assert 1.9 < g.reserve(0) <= 2.2
+
+
+def test_disabled_governor_never_waits():
+    g = RateGovernor("m", rpm=0, tpm=0)
+    asyncio.run(g.acquire(10**6))
+    assert g.stats()["reserved"] == 0
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("x" * 400, output_tokens=0) == 100
+    assert estimate_tokens("abcd", None, output_tokens=50) == 51
+
+
+def test_unreachable_redis_is_backed_off(monkeypatch):
+    connects = []
+    monkeypatch.setattr(rate_governor.settings, "REDIS_URL", "redis://unreachable:6379")
+    monkeypatch.setattr(rate_governor, "_redis_down_until", 0.0)
+    monkeypatch.setattr(rate_governor, "get_redis", lambda: connects.append(1))
+
+    g = RateGovernor("m", rpm=60, tpm=0)
+
+    async def main():
+        await g.acquire(0)
+        await g.acquire(0)
+        g.throttle(1.0)
+
+    asyncio.run(main())
+    assert connects == [1]
+    assert g.stats()["backend"] == "memory"
@@ -0,0 +1,53 @@
+"""Tests for per-request trace records in the interaction log."""
+from datetime import datetime
+
+import pytest
+from backend.agents import agri_agent_base
+from backend.agents.agri_agent_base import AgriAgentBase
+from backend.core.request_trace import trace_scope
+from backend.routes import metrics_router
+from backend.services.history_service import _sanitize_entry
+
+
+class _EchoAgent(AgriAgentBase):
+    name = "EchoAgent"
+
+    async def ahandle_query(self, query=None, image_path=None, **kwargs):
+        return await self.arespond_and_record(query, f"echo: {query}", image_path, meta={"k": 1})
+
+
+def test_agents_log_into_the_active_trace_only(monkeypatch):
+    logged = []
+    monkeypatch.setattr(agri_agent_base, "log_interaction", logged.append)
+    agent = _EchoAgent()
+
+    trace = {}
+    with trace_scope(trace):
+        assert agent.handle_query("maize") == "echo: maize"
+    assert logged == []
+    assert trace["captured"]["EchoAgent"] == {"image_path": None, "meta": {"k": 1}}
+
+    agent.handle_query("maize")
+    assert logged[0]["agent"] == "EchoAgent" and logged[0]["meta"] == {"k": 1}
+
+
+def test_sanitize_keeps_nested_structures():
+    clean = _sanitize_entry({"routing": [{"agent": "CropAgent", "score": 90}], "tokens": None, "t": datetime(2026, 1, 1)})
+    assert clean["routing"] == [{"agent": "CropAgent", "score": 90}]
+    assert clean["tokens"] is None
+    assert clean["t"] == "2026-01-01 00:00:00"
+
+
+def test_usage_counts_every_agent_of_a_trace_record(monkeypatch):
+    now = datetime.utcnow().isoformat()
+    logs = [
+        {"timestamp": now, "request_id": "r1", "agent": "CropAgent", "agents": ["CropAgent", "SubsidyAgent"], "type": "text"},
+        {"timestamp": now, "request_id": "r2", "agents": [], "type": "text", "routing_mode": "cache"},
+        {"timestamp": now, "agent": "PestAgent", "type": "image"},  # pre-trace entry
+    ]
+    monkeypatch.setattr(metrics_router, "_load_query_log", lambda since=None: logs)
+
+    usage = metrics_router.get_usage_metrics(days=7)
+    assert usage["total_requests"] == 3
+    assert usage["by_agent"] == {"CropAgent": 1, "SubsidyAgent": 1, "PestAgent": 1}
+    assert usage["by_type"] == {"text": 2, "image": 1}
@@ -0,0 +1,95 @@
+"""Tests for the shared retry / circuit-breaker layer."""
+import asyncio
+
+import groq
+import httpx
+import pytest
+from backend.core.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryPolicy,
+    acall_with_resilience,
+    backoff_delay,
+    get_breaker,
+    is_retryable,
+    retry_after_seconds,
+)
+
+FAST = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.002)
+
+
+def _status_error(status, headers=None):
+    request = httpx.Request("POST", "https://api.groq.com/openai/v1/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    cls = groq.RateLimitError if status == 429 else groq.APIStatusError
+    return cls("error", response=response, body=None)
+
+
+def test_classification_by_type():
+    assert is_retryable(_status_error(429))
+    assert is_retryable(_status_error(503))
+    assert not is_retryable(_status_error(400))
+    assert is_retryable(httpx.ConnectTimeout("slow"))
+    assert not is_retryable(ValueError("500 in the message is not enough"))
+
+
+def test_retry_after_is_honoured():
+    err = _status_error(429, {"retry-after": "3"})
+    assert retry_after_seconds(err) == 3.0
+    assert backoff_delay(0, RetryPolicy(max_retry_after=2.0), err) == 2.0
+    assert 0.0 <= backoff_delay(2, RetryPolicy(base_delay=1.0, max_delay=3.0)) <= 3.0
+
+
+def test_retries_transient_then_succeeds():
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _status_error(503)
+        return "ok"
+
+    assert asyncio.run(acall_with_resilience(flaky, "test-model-retry", policy=FAST)) == "ok"
+    assert len(calls) == 3
+
+
+def test_non_retryable_raises_immediately():
+    calls = []
+
+    async def bad_request():
+        calls.append(1)
+        raise _status_error(400)
+
+    with pytest.raises(groq.APIStatusError):
+        asyncio.run(acall_with_resilience(bad_request, "test-model-400", policy=FAST))
+    assert len(calls) == 1
+    assert get_breaker("test-model-400").snapshot()["state"] == "closed"
+
+
+def test_breaker_opens_then_half_open_probe_closes(monkeypatch):
+    breaker = CircuitBreaker("test-breaker", failure_threshold=2, recovery_timeout=10.0)
+    clock = [100.0]
+    monkeypatch.setattr("backend.core.resilience.time.monotonic", lambda: clock[0])
+
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.snapshot()["state"] == "open"
+    assert breaker.allow()[0] is False
+
+    clock[0] += 11
+    assert breaker.allow()[0] is True    # the single half-open probe
+    assert breaker.allow()[0] is False   # others wait for the probe
+    breaker.record_success()
+    assert breaker.snapshot()["state"] == "closed"
+
+
+def test_open_breaker_short_circuits_calls():
+    breaker = get_breaker("test-model-open")
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    async def never():
+        raise AssertionError("must not be called")
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(acall_with_resilience(never, "test-model-open", policy=FAST))
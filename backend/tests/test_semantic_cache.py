@@ -0,0 +1,93 @@
+"""Tests for the embedding-keyed semantic cache."""
+import pytest
+from backend.core.semantic_cache import SemanticCache, normalize_text, cache_stats
+
+
+def _bag_of_words(text):
+    vocab = ["pm-kisan", "eligibility", "tomato", "leaf", "curl", "for", "what", "is"]
+    return [float(w in text.split()) for w in vocab]
+
+
+def _cache(name, **kw):
+    return SemanticCache(name=name, embed_fn=_bag_of_words, use_redis=False, **kw)
+
+
+def test_normalize_text():
+    assert normalize_text("  PM-Kisan   Eligibility? ") == "pm-kisan eligibility"
+
+
+def test_exact_and_semantic_hit():
+    cache = _cache("test-hit", threshold=0.7)
+    value, vec = cache.lookup("PM-Kisan eligibility", "p1")
+    assert value is None
+    cache.store("PM-Kisan eligibility", {"agents": []}, "p1", vec)
+
+    assert cache.lookup("pm-kisan eligibility?", "p1")[0] == {"agents": []}
+    assert cache.lookup("what is PM-Kisan eligibility", "p1")[0] == {"agents": []}
+    assert cache.lookup("tomato leaf curl", "p1")[0] is None
+
+
+def test_partitions_are_isolated():
+    cache = _cache("test-partition")
+    cache.store("tomato leaf curl", "a", "v1")
+    assert cache.lookup("tomato leaf curl", "v2")[0] is None
+
+
+def test_lru_and_ttl_eviction():
+    cache = _cache("test-evict", max_entries=1)
+    cache.store("tomato leaf curl", "a")
+    cache.store("pm-kisan eligibility", "b")
+    assert cache.lookup("tomato leaf curl")[0] is None
+
+    expired = _cache("test-ttl", ttl_seconds=-1)
+    expired.store("tomato leaf curl", "a")
+    assert expired.lookup("tomato leaf curl")[0] is None
+
+
+def test_stats_report_hit_ratio_and_saved_latency():
+    cache = _cache("test-stats")
+    cache.lookup("tomato leaf curl")
+    cache.record_miss_latency(800)
+    cache.store("tomato leaf curl", "a")
+    cache.lookup("tomato leaf curl")
+    stats = cache_stats()["test-stats"]
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
+    assert stats["saved_latency_ms"] == 800
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key) or 0) + 1
+        return self.data[key]
+
+    def scan_iter(self, match, count=None):
+        return [k for k in self.data if k.startswith(match.rstrip("*"))]
+
+    def delete(self, *keys):
+        for k in keys:
+            self.data.pop(k, None)
+
+
+def test_purge_reaches_other_workers(monkeypatch):
+    from backend.core import semantic_cache
+
+    redis = _FakeRedis()
+    monkeypatch.setattr(semantic_cache, "get_redis", lambda: redis)
+    monkeypatch.setattr(semantic_cache, "_GENERATION_CHECK_SECONDS", 0.0)
+    worker_a, worker_b = _cache("test-generation", threshold=0.7), _cache("test-generation", threshold=0.7)
+    worker_b.store("tomato leaf curl", {"agents": ["PestAgent"]}, "p")
+    assert worker_b.lookup("what is tomato leaf curl", "p")[0] is not None
+
+    worker_a.purge()
+    assert worker_b.lookup("what is tomato leaf curl", "p")[0] is None
+    assert worker_b.stats()["entries"] == 0
@@ -0,0 +1,140 @@
+"""Tests for single-flight request coalescing (in-process)."""
+import asyncio
+
+import pytest
+from backend.core.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight("test-share", use_redis=False)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ("answer", {"input_tokens": 1})
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", work) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert len(calls) == 1
+    assert all(r[0] == ("answer", {"input_tokens": 1}) for r in results)
+    assert sum(1 for r in results if r[1]) == 4
+    assert flight.stats()["local_followers"] == 4
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_different_keys_run_separately_and_errors_propagate():
+    flight = SingleFlight("test-keys", use_redis=False)
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("groq down")
+
+    async def ok():
+        return "fine"
+
+    async def main():
+        return await asyncio.gather(
+            flight.do("a", boom), flight.do("a", boom), flight.do("b", ok),
+            return_exceptions=True,
+        )
+
+    a1, a2, b = asyncio.run(main())
+    assert isinstance(a1, ValueError) and isinstance(a2, ValueError)
+    assert b == ("fine", False)
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    flight = SingleFlight("test-cancel", use_redis=False)
+
+    async def work():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == ("done", True)
+
+
+def test_follower_waits_only_as_long_as_its_own_deadline():
+    from backend.core.deadline import DeadlineExceeded, deadline_scope
+
+    flight = SingleFlight("test-follower-deadline", use_redis=False)
+
+    async def slow():
+        await asyncio.sleep(0.5)
+        return "late"
+
+    async def follower():
+        await asyncio.sleep(0.01)
+        with deadline_scope(0.05):
+            return await flight.do("k", slow)
+
+    async def main():
+        leader = asyncio.create_task(flight.do("k", slow))
+        started = asyncio.get_running_loop().time()
+        try:
+            await follower()
+        except DeadlineExceeded:
+            waited = asyncio.get_running_loop().time() - started
+        await leader
+        return waited
+
+    assert asyncio.run(main()) < 0.3
+
+
+def test_deadline_cut_results_are_not_shared():
+    from backend.core.deadline import DeadlineExceeded
+
+    flight = SingleFlight("test-unshared", use_redis=False)
+    calls = []
+
+    async def work(label):
+        calls.append(label)
+        await asyncio.sleep(0.05)
+        if label == "leader":
+            raise DeadlineExceeded("leader budget")
+        return label
+
+    async def main():
+        leader = asyncio.create_task(flight.do("k", lambda: work("leader")))
+        await asyncio.sleep(0.01)
+        follower = await flight.do("k", lambda: work("follower"))
+        degraded = await asyncio.gather(
+            flight.do("d", lambda: work("degraded"), shareable=lambda r: False),
+            flight.do("d", lambda: work("own"), shareable=lambda r: False),
+        )
+        return follower, degraded, await asyncio.gather(leader, return_exceptions=True)
+
+    follower, degraded, (leader,) = asyncio.run(main())
+    assert isinstance(leader, DeadlineExceeded)
+    assert follower == ("follower", False)
+    assert degraded == [("degraded", False), ("own", False)]
+    assert flight.stats()["unshared"] == 2
+
+
+def test_unreachable_redis_is_backed_off(monkeypatch):
+    from backend.core import single_flight
+
+    connects = []
+    monkeypatch.setattr(single_flight.settings, "REDIS_URL", "redis://unreachable:6379")
+    monkeypatch.setattr(single_flight, "get_redis", lambda: connects.append(1))
+    flight = SingleFlight("test-redis-down")
+
+    async def work():
+        return "answer"
+
+    async def main():
+        return [await flight.do("k", work) for _ in range(3)]
+
+    assert asyncio.run(main()) == [("answer", False)] * 3
+    assert connects == [1]
+    assert flight.stats()["redis_failures"] == 1
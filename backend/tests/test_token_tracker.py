@@ -19,3 +19,21 @@ def test_token_tracker_record():
     assert summary["input_tokens"] == 100
     assert summary["output_tokens"] == 50
     assert summary["total_tokens"] == 150
+
+
+def test_coalesced_usage_counts_tokens_but_not_cost():
+    token_tracker.record(100, 50, "llama-3.3-70b-versatile", request_id="leader-1")
+    token_tracker.record_coalesced(
+        {"input_tokens": 100, "output_tokens": 50, "model": "llama-3.3-70b-versatile"}, "follower-1"
+    )
+    token_tracker.copy_coalesced("leader-1", "follower-2")
+
+    leader = token_tracker.get_request_summary("leader-1")
+    for rid in ("follower-1", "follower-2"):
+        follower = token_tracker.get_request_summary(rid)
+        assert follower["total_tokens"] == 150
+        assert follower["coalesced_calls"] == 1
+        assert follower["estimated_cost_usd"] == 0
+    batch = token_tracker.get_requests_summary(["leader-1", "follower-1"])
+    assert batch["total_tokens"] == 300
+    assert batch["estimated_cost_usd"] == leader["estimated_cost_usd"]
@@ -0,0 +1,72 @@
+"""Tests for the content-hash vision result cache."""
+import io
+
+import pytest
+from backend.core.semantic_cache import cache_stats, purge_caches
+from backend.core.vision_cache import VisionCache, dhash
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+
+
+def _jpeg(quality=90, size=(256, 192)):
+    img = Image.linear_gradient("L").resize(size).convert("RGB")
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality)
+    return out.getvalue()
+
+
+def test_exact_hit_and_partition_isolation():
+    cache = VisionCache(name="test-vision-exact")
+    data = _jpeg()
+    part = VisionCache.make_partition("model", "system", "prompt")
+
+    value, key, phash = cache.lookup(data, part)
+    assert value is None
+    cache.store(key, {"content": "leaf spots"}, part, phash)
+
+    assert cache.lookup(data, part)[0] == {"content": "leaf spots"}
+    other = VisionCache.make_partition("model", "system", "other prompt")
+    assert cache.lookup(data, other)[0] is None
+
+    stats = cache.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_phash_matches_reencoded_image():
+    cache = VisionCache(name="test-vision-phash", phash_enabled=True)
+    part = VisionCache.make_partition("model", "prompt")
+    original, reencoded = _jpeg(quality=90), _jpeg(quality=60)
+    assert original != reencoded
+    assert dhash(original) is not None
+
+    _, key, phash = cache.lookup(original, part)
+    cache.store(key, {"content": "rust"}, part, phash)
+
+    value, _, _ = cache.lookup(reencoded, part)
+    assert value == {"content": "rust"}
+    assert cache.stats()["phash_hits"] == 1
+
+
+def test_lru_bound_and_disk_persistence(tmp_path):
+    cache = VisionCache(name="test-vision-disk", max_entries=2, backend="disk", disk_dir=str(tmp_path))
+    part = "p"
+    keys = []
+    for i in range(3):
+        _, key, _ = cache.lookup(bytes([i]) * 10, part)
+        cache.store(key, {"content": f"r{i}"}, part)
+        keys.append(key)
+    assert cache.stats()["entries"] == 2
+
+    # Evicted from memory, still served from disk
+    value, _, _ = cache.lookup(bytes([0]) * 10, part)
+    assert value == {"content": "r0"}
+    assert cache.stats()["persistent_hits"] == 1
+
+
+def test_registered_for_metrics_and_purge():
+    cache = VisionCache(name="test-vision-registry")
+    _, key, _ = cache.lookup(b"abc", "p")
+    cache.store(key, {"content": "x"}, "p")
+    assert "test-vision-registry" in cache_stats()
+    assert purge_caches("test-vision-registry") == {"test-vision-registry": 1}
@@ -0,0 +1,75 @@
+"""Tests for vision message building from in-memory image bytes."""
+import pytest
+from backend.services.vision_service import _build_vision_messages
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\0" * 32
+
+
+def test_memoryview_builds_data_url():
+    error, messages = _build_vision_messages(None, "describe", memoryview(PNG))
+    assert error is None
+    url = messages[1]["content"][1]["image_url"]["url"]
+    assert url.startswith("data:image/png;base64,")
+
+
+def test_bytes_and_path_produce_same_messages(tmp_path):
+    path = tmp_path / "leaf.png"
+    path.write_bytes(PNG)
+    _, from_bytes = _build_vision_messages(None, "describe", PNG)
+    _, from_path = _build_vision_messages(str(path), "describe")
+    assert from_bytes == from_path
+
+
+def test_rejects_unknown_format_and_empty():
+    error, _ = _build_vision_messages(None, "describe", b"GIF89a....")
+    assert error and "Unsupported" in error
+    error, _ = _build_vision_messages(None, "describe", b"")
+    assert error and "empty" in error
+
+
+def _encoded(img, fmt="JPEG"):
+    import io
+    out = io.BytesIO()
+    img.save(out, format=fmt)
+    return out.getvalue()
+
+
+def _leaf_photo(size=(800, 600)):
+    from PIL import Image, ImageDraw
+    img = Image.new("RGB", size, (60, 120, 50))
+    draw = ImageDraw.Draw(img)
+    for i in range(0, size[0], 16):
+        draw.line([(i, 0), (size[0] - i, size[1])], fill=(200, 180, 40), width=2)
+    return img
+
+
+def test_prescreen_accepts_sharp_photo():
+    pytest.importorskip("PIL")
+    from backend.services.vision_service import prescreen_image
+    assert prescreen_image(_encoded(_leaf_photo())) is None
+
+
+@pytest.mark.parametrize("reason", ["blurry", "too_dark", "blank", "low_resolution"])
+def test_prescreen_rejects_with_hint(reason):
+    pytest.importorskip("PIL")
+    from PIL import Image, ImageFilter, ImageEnhance
+    from backend.services.vision_service import RETAKE_HINTS, prescreen_image
+
+    img = _leaf_photo()
+    if reason == "blurry":
+        img = img.filter(ImageFilter.GaussianBlur(6))
+    elif reason == "too_dark":
+        img = ImageEnhance.Brightness(img).enhance(0.1)
+    elif reason == "blank":
+        img = Image.new("RGB", (800, 600), (90, 140, 60))
+    else:
+        img = img.resize((120, 90))
+
+    result = prescreen_image(_encoded(img))
+    assert result["reason"] == reason
+    assert result["hint"] == RETAKE_HINTS[reason]
+
+
+def test_prescreen_ignores_undecodable_bytes():
+    from backend.services.vision_service import prescreen_image
+    assert prescreen_image(PNG) is None
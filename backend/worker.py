@@ -0,0 +1,130 @@
+"""
+Job worker - runs queued /jobs requests through the agent pipeline.
+
+With JOB_BACKEND=redis, start one or more worker processes next to the API:
+
+    python -m backend.worker
+
+Each process reads the Redis job stream with JOB_WORKERS concurrent
+consumers. With the memory backend the API process runs run_job on
+in-process tasks instead (see core.job_queue).
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import time
+from typing import Any, Dict, Optional
+
+from backend.core.admission import IMAGE, TEXT, AdmissionRejected, get_controller
+from backend.core.config import settings
+from backend.core.deadline import deadline_scope
+from backend.core.job_queue import FAILED, RUNNING, SUCCEEDED, RedisJobQueue, get_job_queue
+
+
+async def _admit_job(kind: str) -> Optional[Any]:
+    """Take an admission slot of `kind` for a job, waiting out rejections instead of failing."""
+    if not settings.ADMISSION_ENABLED:
+        return None
+    controller = get_controller(kind)
+    while True:
+        try:
+            await controller.acquire()
+            return controller
+        except AdmissionRejected as e:
+            # The job stays queued; /ask traffic is not starved by background work
+            await asyncio.sleep(e.retry_after)
+
+
+async def run_job(queue: Any, job: Dict[str, Any], image: Optional[bytes]) -> None:
+    """Execute one job, saving routing, each finished agent and the outcome as they happen."""
+    controller = await _admit_job(IMAGE if image is not None else TEXT)
+    try:
+        await _run_job(queue, job, image)
+    finally:
+        if controller is not None:
+            controller.release(job["finished_at"] - job["started_at"] if job.get("finished_at") else None)
+
+
+async def _run_job(queue: Any, job: Dict[str, Any], image: Optional[bytes]) -> None:
+    from backend.agents.master_agent import aroute_query
+    from backend.routes.ask_router import _build_response
+
+    start = time.time()
+    job.update(status=RUNNING, started_at=start)
+    await queue.save(job)
+
+    async def on_event(event: str, data: Dict[str, Any]) -> None:
+        if event == "routed":
+            job["agents"] = data.get("agents", [])
+        elif event == "agent_done":
+            job["partial"].append({
+                "agent": data.get("agent"),
+                "role": data.get("role"),
+                "content": str(data.get("content") or ""),
+            })
+        else:
+            return  # formatter tokens are not persisted
+        await queue.save(job)
+
+    try:
+        with deadline_scope(settings.JOB_DEADLINE_SECONDS):
+            response, meta = await aroute_query(
+                query=job.get("query") or None,
+                image_bytes=image,
+                session_id=job.get("session_id"),
+                request_id=job["request_id"],
+                on_event=on_event,
+            )
+        extra: Dict[str, Any] = {"mode": job["mode"], **meta}
+        if job.get("query"):
+            extra["query"] = job["query"]
+        if image is not None:
+            extra["image_uploaded"] = True
+        job["result"] = _build_response(
+            job["request_id"], start, response, session_id=job.get("session_id"), **extra
+        )
+        job["status"] = SUCCEEDED
+    except Exception as e:
+        job["status"] = FAILED
+        job["error"] = f"Error: {str(e)}"
+
+    job["finished_at"] = time.time()
+    await queue.save(job)
+
+
+async def _consume(queue: RedisJobQueue, consumer: str) -> None:
+    # A job unacknowledged for twice its deadline belonged to a worker that died
+    reclaim_ms = int(settings.JOB_DEADLINE_SECONDS * 2 * 1000)
+    while True:
+        try:
+            claimed = await asyncio.to_thread(queue.claim, consumer, 5000, reclaim_ms)
+        except Exception as e:
+            print(f"[WORKER] {consumer}: Redis error: {e}")
+            await asyncio.sleep(1.0)
+            continue
+        if claimed is None:
+            continue
+        entry_id, job, image = claimed
+        print(f"[WORKER] {consumer}: job {job['job_id']} ({job['mode']})")
+        try:
+            await run_job(queue, job, image)
+        finally:
+            await asyncio.to_thread(queue.ack, entry_id, job["job_id"])
+
+
+async def main() -> int:
+    queue = get_job_queue()
+    if not isinstance(queue, RedisJobQueue):
+        print("[WORKER] Needs JOB_BACKEND=redis and a reachable REDIS_URL")
+        return 1
+    queue.ensure_group()
+    name = f"{socket.gethostname()}-{os.getpid()}"
+    print(f"[WORKER] {name}: {settings.JOB_WORKERS} consumers on the job stream")
+    await asyncio.gather(*(_consume(queue, f"{name}-{i}") for i in range(max(1, settings.JOB_WORKERS))))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(asyncio.run(main()))